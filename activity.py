@@ -0,0 +1,295 @@
+"""The trainer's activity stream: client portal events, kept and compacted.
+
+log_activity() records one event per portal write, in the caller's
+transaction. Which trainer and name a client has is kept in a small
+in-process cache rather than read from clients on every write. Renames
+and deletes call forget_client(), and entries expire after
+ACTIVITY_OWNER_TTL seconds so another worker's stale name can't linger.
+
+Reads are a range over idx_activity_log_trainer_created. created_at
+values are ISO timestamps, so a day range is a string range on the raw
+column: '2024-05-06' <= created_at < '2024-05-13'.
+
+activity_log keeps every event for ACTIVITY_RETENTION_DAYS. After that,
+compact_activity_log() folds old events into activity_daily, one row per
+(trainer, day, client, category, action) with a count, and deletes them.
+Rollups are dropped after ACTIVITY_ROLLUP_RETENTION_DAYS (None keeps them
+forever). Compaction only runs from tools/compact_activity_log.py, which
+is meant for a daily cron job; the app never compacts on its own.
+
+Live updates: /api/activity/live streams new events to the trainer as
+Server-Sent Events, via activity_events(). Each open stream subscribes to
+its trainer in this process. log_activity() wakes that trainer's streams
+once the request that logged it has finished (the route has committed by
+then), and each stream reads what's new from activity_log. Reading from
+the table means a stream never sends an event that was rolled back. A
+stream also re-checks every LIVE_POLL_SECONDS, which picks up events
+logged by other worker processes with no broker in between. Streams close
+after LIVE_MAX_SECONDS. EventSource reconnects on its own with
+Last-Event-ID, so nothing is missed, and a sync worker isn't tied up
+indefinitely.
+
+An open stream holds a server thread for as long as it runs, so each
+process serves at most LIVE_MAX_STREAMS at once. Past that,
+/api/activity/live answers 503 with a `retry:` line, and
+static/js/activity_live.js tries again after it. Keep LIVE_MAX_STREAMS
+below the threads per worker process so ordinary requests always have one
+left. A server with a single thread per process (the default on
+PythonAnywhere) has none to spare: set it to 0 there, which turns live
+updates off and leaves the pages as they render.
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import g, has_app_context
+
+from db import get_db
+from dashboard import invalidate_dashboard
+
+ACTIVITY_RETENTION_DAYS = 90
+ACTIVITY_ROLLUP_RETENTION_DAYS = 2 * 365
+ACTIVITY_OWNER_TTL = 5 * 60
+LIVE_POLL_SECONDS = 15
+LIVE_MAX_SECONDS = 5 * 60
+LIVE_MAX_STREAMS = 2
+
+EVENTS_IN_RANGE_SQL = '''
+    SELECT id, client_id, client_name, category, action, detail, created_at
+    FROM activity_log
+    WHERE trainer_id = ? AND created_at >= ? AND created_at < ?
+    ORDER BY created_at DESC
+'''
+
+# Events after a (created_at, id) position, oldest first.
+EVENTS_AFTER_SQL = '''
+    SELECT id, client_id, client_name, category, action, detail, created_at
+    FROM activity_log
+    WHERE trainer_id = ? AND created_at >= ? AND (created_at, id) > (?, ?)
+    ORDER BY created_at, id
+    LIMIT 100
+'''
+
+ROLLUPS_IN_RANGE_SQL = '''
+    SELECT day, client_id, client_name, category, action, events
+    FROM activity_daily
+    WHERE trainer_id = ? AND day BETWEEN ? AND ?
+'''
+
+OWNER_SQL = 'SELECT trainer_id, name FROM clients WHERE id = ?'
+
+_owners_lock = threading.Lock()
+# client_id -> (trainer_id, client name, monotonic time loaded)
+_owners = {}
+
+_listeners_lock = threading.Lock()
+# trainer_id -> {threading.Event of each open live stream}
+_listeners = {}
+# Streams claimed with claim_live_stream() and not yet released.
+_open_streams = 0
+
+
+def _owner(conn, client_id):
+    """(trainer_id, client name) for a client, or None if there's no such
+    client."""
+    now = time.monotonic()
+    with _owners_lock:
+        cached = _owners.get(client_id)
+    if cached and now - cached[2] <= ACTIVITY_OWNER_TTL:
+        return cached[:2]
+    row = conn.execute(OWNER_SQL, (client_id,)).fetchone()
+    if not row:
+        return None
+    with _owners_lock:
+        _owners[client_id] = (row['trainer_id'], row['name'], now)
+    return row['trainer_id'], row['name']
+
+
+def forget_client(client_id):
+    """Drop a client's cached trainer and name. Call after a rename or a
+    delete."""
+    with _owners_lock:
+        _owners.pop(client_id, None)
+
+
+def log_activity(conn, client_id, category, action, detail=''):
+    """Insert one activity-stream event using the caller's open connection so it
+    shares the same transaction (the calling route commits).
+
+    Never raises — activity logging must not break the underlying action.
+    """
+    try:
+        owner = _owner(conn, client_id)
+        if not owner or not owner[0]:
+            return
+        trainer_id, client_name = owner
+        conn.execute('''
+            INSERT INTO activity_log
+            (id, trainer_id, client_id, client_name, category, action, detail, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (str(uuid.uuid4()), trainer_id, client_id, client_name,
+              category, action, detail, datetime.utcnow()))
+        invalidate_dashboard(trainer_id)
+        if has_app_context():
+            g.setdefault('_activity_logged', set()).add(trainer_id)
+        else:
+            _wake(trainer_id)
+    except Exception as e:
+        print(f"[activity] log_activity failed: {e}")
+
+
+def _wake(trainer_id):
+    with _listeners_lock:
+        for event in _listeners.get(trainer_id, ()):
+            event.set()
+
+
+def _wake_logged(exc=None):
+    """teardown_appcontext hook: wake the live streams of every trainer
+    this request logged activity for."""
+    for trainer_id in g.pop('_activity_logged', ()):
+        _wake(trainer_id)
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def claim_live_stream():
+    """Reserve a stream slot in this process. False if all
+    LIVE_MAX_STREAMS are taken; otherwise call release_live_stream() once
+    the response has closed."""
+    global _open_streams
+    with _listeners_lock:
+        if _open_streams >= LIVE_MAX_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_live_stream():
+    global _open_streams
+    with _listeners_lock:
+        _open_streams -= 1
+
+
+def streams_busy():
+    """SSE text for a stream refused for want of a slot: only how long to
+    wait before trying again."""
+    return f'retry: {LIVE_POLL_SECONDS * 1000}\n\n'
+
+
+def activity_events(trainer_id, last_event_id=None):
+    """Generator of SSE text: this trainer's new activity_log events as
+    they're logged, for LIVE_MAX_SECONDS.
+
+    `last_event_id` is the Last-Event-ID a reconnecting EventSource sends
+    ("<created_at>|<id>"); without one, the stream starts from now. Takes a
+    pooled connection only for each read, so an idle stream holds none.
+    """
+    created_at, _, event_id = (last_event_id or '').partition('|')
+    if not created_at:
+        created_at = str(datetime.utcnow())
+    wake = threading.Event()
+    with _listeners_lock:
+        _listeners.setdefault(trainer_id, set()).add(wake)
+    deadline = time.monotonic() + LIVE_MAX_SECONDS
+    try:
+        yield f'retry: {LIVE_POLL_SECONDS * 1000}\n\n'
+        while time.monotonic() < deadline:
+            wake.clear()
+            conn = get_db()
+            try:
+                rows = conn.execute(EVENTS_AFTER_SQL, (trainer_id, created_at, created_at, event_id)).fetchall()
+            finally:
+                conn.close()
+            for row in rows:
+                created_at, event_id = str(row['created_at']), row['id']
+                yield _sse('activity', dict(row), f'{created_at}|{event_id}')
+            if len(rows) == 100:
+                continue
+            if not wake.wait(min(LIVE_POLL_SECONDS, max(0, deadline - time.monotonic()))):
+                # A comment line; lets proxies and the server notice a
+                # closed connection.
+                yield ': keep-alive\n\n'
+    finally:
+        with _listeners_lock:
+            streams = _listeners.get(trainer_id)
+            if streams is not None:
+                streams.discard(wake)
+                if not streams:
+                    del _listeners[trainer_id]
+
+
+def activity_by_day(conn, trainer_id, start, end):
+    """{'YYYY-MM-DD': [events, newest first]} from start to end inclusive.
+
+    Days that have been compacted get one entry per rollup row instead,
+    with `events` set to how many it stands for and no created_at.
+    """
+    days = {(start + timedelta(days=i)).isoformat(): [] for i in range((end - start).days + 1)}
+    for row in conn.execute(EVENTS_IN_RANGE_SQL, (trainer_id, start.isoformat(),
+                                                  (end + timedelta(days=1)).isoformat())):
+        event = dict(row)
+        event['events'] = 1
+        days.setdefault(str(row['created_at'])[:10], []).append(event)
+    for row in conn.execute(ROLLUPS_IN_RANGE_SQL, (trainer_id, start.isoformat(), end.isoformat())):
+        rollup = dict(row)
+        rollup.update(id=None, detail='', created_at=None)
+        days.setdefault(row['day'], []).append(rollup)
+    return days
+
+
+def compact_activity_log(conn, now=None):
+    """Roll events older than ACTIVITY_RETENTION_DAYS up into
+    activity_daily and delete them, then drop rollups past
+    ACTIVITY_ROLLUP_RETENTION_DAYS. Commits. Returns (events compacted,
+    rollups dropped)."""
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=ACTIVITY_RETENTION_DAYS)).date().isoformat()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Counts add to whatever an earlier run already rolled up for the
+        # same day. MAX() keeps one name for the group.
+        conn.execute('''
+            INSERT INTO activity_daily (trainer_id, day, client_id, category, action, client_name, events)
+            SELECT trainer_id, substr(created_at, 1, 10), client_id, category, action,
+                   MAX(client_name), COUNT(*)
+            FROM activity_log
+            WHERE created_at < ?
+            GROUP BY trainer_id, substr(created_at, 1, 10), client_id, category, action
+            ON CONFLICT (trainer_id, day, client_id, category, action)
+            DO UPDATE SET events = events + excluded.events
+        ''', (cutoff,))
+        compacted = conn.execute('DELETE FROM activity_log WHERE created_at < ?', (cutoff,)).rowcount
+        dropped = 0
+        if ACTIVITY_ROLLUP_RETENTION_DAYS is not None:
+            horizon = (now - timedelta(days=ACTIVITY_ROLLUP_RETENTION_DAYS)).date().isoformat()
+            dropped = conn.execute('DELETE FROM activity_daily WHERE day < ?', (horizon,)).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return compacted, dropped
+
+
+def register_activity_log(app):
+    """Set retention and live-stream timing from app config
+    (ACTIVITY_RETENTION_DAYS, ACTIVITY_ROLLUP_RETENTION_DAYS,
+    ACTIVITY_OWNER_TTL, LIVE_POLL_SECONDS, LIVE_MAX_SECONDS,
+    LIVE_MAX_STREAMS) and install the teardown hook that wakes live
+    streams."""
+    global ACTIVITY_RETENTION_DAYS, ACTIVITY_ROLLUP_RETENTION_DAYS, ACTIVITY_OWNER_TTL
+    global LIVE_POLL_SECONDS, LIVE_MAX_SECONDS, LIVE_MAX_STREAMS
+    ACTIVITY_RETENTION_DAYS = app.config.get('ACTIVITY_RETENTION_DAYS', ACTIVITY_RETENTION_DAYS)
+    ACTIVITY_ROLLUP_RETENTION_DAYS = app.config.get('ACTIVITY_ROLLUP_RETENTION_DAYS',
+                                                    ACTIVITY_ROLLUP_RETENTION_DAYS)
+    ACTIVITY_OWNER_TTL = app.config.get('ACTIVITY_OWNER_TTL', ACTIVITY_OWNER_TTL)
+    LIVE_POLL_SECONDS = app.config.get('LIVE_POLL_SECONDS', LIVE_POLL_SECONDS)
+    LIVE_MAX_SECONDS = app.config.get('LIVE_MAX_SECONDS', LIVE_MAX_SECONDS)
+    LIVE_MAX_STREAMS = app.config.get('LIVE_MAX_STREAMS', LIVE_MAX_STREAMS)
+    app.teardown_appcontext(_wake_logged)
@@ -1,20 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, send_file
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import BadRequest
 import os
+import multiprocessing
 from datetime import datetime, timedelta
 import uuid
-import json
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 from openpyxl import load_workbook
 import csv
 import io
-import zipfile
 
 # Shared helpers split out of this file
-from db import get_db
+from db import get_db, register_db_teardown
+from workout_sets import load_sets
+from records import exercise_key, record_to_dict
+from workouts import (BULK_ASSIGN_MAX_CLIENTS, workout_type_from, exercises_from_form, exercises_from_json,
+                      workout_exists, clients_with_workout, insert_workout, insert_workouts, edit_workout,
+                      remove_workout, copy_workout)
+from client_metrics import refresh_latest_weight
+from exports import build_client_export_workbook, build_all_clients_workbook, list_photo_files, save_workbook
+from export_jobs import enqueue_export, job_status, finished_artifact, purge_expired_jobs, register_export_jobs
+from dashboard import dashboard_summary, invalidate_dashboard, register_dashboard_cache
+from template_catalog import trainer_templates, template_listing, invalidate_templates, register_template_cache
+from template_versions import (version_exercises, trainer_template_version, save_template_version,
+                               delete_template_versions)
 from auth_utils import login_required, client_login_required
+from pagination import keyset_page, wants_next_page, next_page_response
+from search import KINDS, CLIENT_IDS_SQL, fts_query, search_all
+from exercise_index import suggest_exercises, register_exercise_index
+from calendar_feed import (parse_range, month_grid, sessions_in_range, sessions_by_day,
+                           calendar_validators, not_modified, with_validators)
+from recurrence import (merge_upcoming, virtual_session, materialize, skip_occurrence, remove_session,
+                        get_series, series_rule, create_series, end_series)
+from conflicts import find_conflicts, series_slots
+from activity import (activity_by_day, activity_events, claim_live_stream, release_live_stream, streams_busy,
+                      forget_client, register_activity_log)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-this'
@@ -29,6 +49,12 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# One pooled connection per request, returned to the pool at teardown.
+register_db_teardown(app)
+register_export_jobs(app)
+register_dashboard_cache(app)
+register_template_cache(app)
+
 
 @app.errorhandler(413)
 def file_too_large(e):
@@ -41,119 +67,6 @@ def file_too_large(e):
     return redirect(request.referrer or url_for('dashboard'))
 
 
-def init_template_client_column():
-    """Add a nullable client_id column to workout_templates if missing.
-
-    NULL  = universal template (any client).
-    value = template that belongs to one specific client.
-    Idempotent; safe to run on every startup (also under WSGI).
-    """
-    conn = get_db()
-    try:
-        conn.execute('ALTER TABLE workout_templates ADD COLUMN client_id TEXT')
-        conn.commit()
-        print('[templates] added client_id column to workout_templates')
-    except Exception:
-        pass
-    finally:
-        conn.close()
-
-
-def init_workout_type_column():
-    """Add a workout_type column to workout_logs if missing.
-
-    'weightlifting' or 'cardio'. Existing rows (logged before this column
-    existed) are backfilled to 'weightlifting' so they keep showing up
-    exactly where they did before. A weightlifting and a cardio workout
-    can now coexist on the same (client_id, workout_date) without
-    overriding or merging with each other — every query that used to key
-    on date alone now keys on (date, workout_type) too.
-    Idempotent; safe to run on every startup (also under WSGI).
-    """
-    conn = get_db()
-    try:
-        conn.execute("ALTER TABLE workout_logs ADD COLUMN workout_type TEXT NOT NULL DEFAULT 'weightlifting'")
-        conn.commit()
-        print('[workouts] added workout_type column to workout_logs')
-    except Exception:
-        pass
-    finally:
-        conn.close()
-
-
-def init_template_type_column():
-    """Add a workout_type column to workout_templates if missing.
-
-    Same idea as workout_logs' workout_type — existing templates are
-    weightlifting (sets are weight/reps), backfilled accordingly. Cardio
-    templates store distance/duration sets instead.
-    Idempotent; safe to run on every startup (also under WSGI).
-    """
-    conn = get_db()
-    try:
-        conn.execute("ALTER TABLE workout_templates ADD COLUMN workout_type TEXT NOT NULL DEFAULT 'weightlifting'")
-        conn.commit()
-        print('[templates] added workout_type column to workout_templates')
-    except Exception:
-        pass
-    finally:
-        conn.close()
-
-
-def init_progress_photos_table():
-    """Create the progress_photos table, one row per dated photo entry.
-
-    Mirrors weight_logs: one entry per (client_id, date), photo_url points
-    into static/uploads same as client profile photos.
-    """
-    conn = get_db()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS progress_photos (
-            id          TEXT PRIMARY KEY,
-            client_id   TEXT NOT NULL,
-            date        TEXT NOT NULL,
-            photo_url   TEXT NOT NULL,
-            notes       TEXT,
-            created_at  TIMESTAMP NOT NULL,
-            updated_at  TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-
-def init_body_measurements_table():
-    """Create the body_measurements table, one row per dated entry.
-
-    Every measurement column is nullable — the only requirement enforced at
-    the route level is that at least one of them is filled in. Values are
-    stored in inches, matching this app's existing imperial convention
-    (weight is tracked in lbs throughout).
-    """
-    conn = get_db()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS body_measurements (
-            id          TEXT PRIMARY KEY,
-            client_id   TEXT NOT NULL,
-            date        TEXT NOT NULL,
-            neck        REAL,
-            shoulders   REAL,
-            chest       REAL,
-            waist       REAL,
-            hips        REAL,
-            bicep       REAL,
-            forearm     REAL,
-            thigh       REAL,
-            calf        REAL,
-            notes       TEXT,
-            created_at  TIMESTAMP NOT NULL,
-            updated_at  TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -247,59 +160,29 @@ def update_theme():
 @login_required
 def dashboard():
     conn = get_db()
-    trainer_id = session['user_id']
+    # One aggregate query, cached per trainer until a write invalidates it;
+    # see dashboard.py.
+    summary = dashboard_summary(conn, session['user_id'])
+    conn.close()
 
-    today = datetime.now().date()
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-
-    # Get client counts
-    total_clients = \
-        conn.execute('SELECT COUNT(*) as count FROM clients WHERE trainer_id = ?', (trainer_id,)).fetchone()[
-            'count']
-    active_clients = conn.execute('SELECT COUNT(*) as count FROM clients WHERE trainer_id = ? AND status = "active"',
-                                  (trainer_id,)).fetchone()['count']
-
-    # Sessions scheduled for today (excluding cancelled)
-    today_session_count = conn.execute('''
-        SELECT COUNT(*) as count FROM sessions
-        WHERE trainer_id = ? AND session_date = ? AND status != 'cancelled'
-    ''', (trainer_id, today.isoformat())).fetchone()['count']
-
-    # Sessions scheduled for the rest of this week (excluding cancelled)
-    week_session_count = conn.execute('''
-        SELECT COUNT(*) as count FROM sessions
-        WHERE trainer_id = ? AND session_date BETWEEN ? AND ? AND status != 'cancelled'
-    ''', (trainer_id, week_start.isoformat(), week_end.isoformat())).fetchone()['count']
-
-    # Get upcoming sessions for the "Upcoming Sessions" card
-    recent_sessions = conn.execute('''
-        SELECT s.*, c.name as client_name
-        FROM sessions s
-        JOIN clients c ON s.client_id = c.id
-        WHERE s.trainer_id = ? AND s.session_date >= date('now') AND s.status != 'cancelled'
-        ORDER BY s.session_date, s.start_time
-        LIMIT 5
-    ''', (trainer_id,)).fetchall()
-
-    # Recent client-portal activity (workouts, weight, sleep, nutrition logs)
-    recent_activity = conn.execute('''
-        SELECT id, client_id, client_name, category, action, detail, created_at
-        FROM activity_log
-        WHERE trainer_id = ?
-        ORDER BY created_at DESC
-        LIMIT 8
-    ''', (trainer_id,)).fetchall()
+    return render_template('dashboard/index.html', **summary)
 
-    conn.close()
 
-    return render_template('dashboard/index.html',
-                           total_clients=total_clients,
-                           active_clients=active_clients,
-                           today_session_count=today_session_count,
-                           week_session_count=week_session_count,
-                           recent_sessions=recent_sessions,
-                           recent_activity=recent_activity)
+# latest_weight is a column on clients now, kept current by every
+# weight-log write (see client_metrics.py).
+CLIENTS_SQL = '''
+    SELECT c.*
+    FROM clients c
+    WHERE c.trainer_id = ?
+'''
+
+# Whitelist the sort options — never interpolate raw user input into SQL.
+# Each ends in c.id so the page cursor is unique.
+CLIENT_SORT_ORDERS = {
+    'name_asc':  [('c.name COLLATE NOCASE', 'name', 'ASC'), ('c.id', 'id', 'ASC')],
+    'name_desc': [('c.name COLLATE NOCASE', 'name', 'DESC'), ('c.id', 'id', 'DESC')],
+}
+CLIENTS_DEFAULT_ORDER = [('c.created_at', 'created_at', 'DESC'), ('c.id', 'id', 'DESC')]
 
 
 @app.route('/clients')
@@ -311,33 +194,28 @@ def clients():
 
     conn = get_db()
 
-    query = '''
-        SELECT c.*,
-               (SELECT weight FROM weight_logs WHERE client_id = c.id ORDER BY date DESC LIMIT 1) as latest_weight
-        FROM clients c
-        WHERE c.trainer_id = ?
-    '''
+    query = CLIENTS_SQL
     params = [session['user_id']]
 
-    if search:
-        query += ' AND (c.name LIKE ? OR c.email LIKE ?)'
-        params.extend([f'%{search}%', f'%{search}%'])
+    # Name, email, phone and notes (theirs and client_notes), through the
+    # full-text index in search.py.
+    match = fts_query(search)
+    if match:
+        query += f' AND c.id IN ({CLIENT_IDS_SQL})'
+        params.extend([match, session['user_id']])
 
     if status_filter:
         query += ' AND c.status = ?'
         params.append(status_filter)
 
-    # Whitelist the sort options — never interpolate raw user input into SQL.
-    sort_clauses = {
-        'name_asc':  ' ORDER BY c.name COLLATE NOCASE ASC',
-        'name_desc': ' ORDER BY c.name COLLATE NOCASE DESC',
-    }
-    query += sort_clauses.get(sort, ' ORDER BY c.created_at DESC')
+    order = CLIENT_SORT_ORDERS.get(sort, CLIENTS_DEFAULT_ORDER)
 
-    clients = conn.execute(query, params).fetchall()
+    clients, next_cursor = keyset_page(conn, query, params, order, request.args.get('cursor'))
     conn.close()
 
-    return render_template('dashboard/clients.html', clients=clients,
+    if wants_next_page():
+        return next_page_response('dashboard/_client_cards.html', next_cursor, clients=clients)
+    return render_template('dashboard/clients.html', clients=clients, next_cursor=next_cursor,
                            search=search, status_filter=status_filter, sort=sort)
 
 
@@ -373,6 +251,7 @@ def new_client():
         ''', (client_id, session['user_id'], name, email, phone, age, gender, weight, height, status, notes, photo_url,
               datetime.now()))
         conn.commit()
+        invalidate_dashboard(session['user_id'])
 
         generate_portal = request.form.get('generate_portal_code')
         if generate_portal:
@@ -398,6 +277,53 @@ def new_client():
     return render_template('dashboard/clients/new.html')
 
 
+UPCOMING_SESSIONS_SQL = '''
+    SELECT id, session_date, start_time, end_time, session_type, notes, status
+    FROM sessions
+    WHERE client_id = ? AND session_date >= ? AND status != 'completed'
+    ORDER BY session_date, start_time
+    LIMIT 5
+'''
+
+RECENT_WORKOUTS_SQL = '''
+    SELECT workout_date, COUNT(*) as exercise_count
+    FROM workout_logs
+    WHERE client_id = ?
+    GROUP BY workout_date
+    ORDER BY workout_date DESC
+    LIMIT 5
+'''
+
+WEIGHT_HISTORY_SQL = '''
+    SELECT id, date, weight, notes
+    FROM weight_logs
+    WHERE client_id = ?
+    ORDER BY date DESC
+    LIMIT 10
+'''
+
+LATEST_WEIGHT_SQL = '''
+    SELECT weight, date
+    FROM weight_logs
+    WHERE client_id = ?
+    ORDER BY date DESC
+    LIMIT 1
+'''
+
+RECENT_NOTES_SQL = '''
+    SELECT id, note_text, created_at
+    FROM client_notes
+    WHERE client_id = ?
+    ORDER BY created_at DESC
+    LIMIT 5
+'''
+
+PORTAL_ACCOUNT_SQL = '''
+    SELECT access_code, is_active, last_login
+    FROM client_accounts WHERE client_id = ?
+'''
+
+
 @app.route('/clients/<client_id>')
 @login_required
 def client_detail(client_id):
@@ -410,41 +336,19 @@ def client_detail(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    upcoming_sessions = conn.execute('''
-        SELECT id, session_date, start_time, end_time, session_type, notes, status
-        FROM sessions
-        WHERE client_id = ? AND session_date >= date('now') AND status != 'completed'
-        ORDER BY session_date, start_time
-        LIMIT 5
-    ''', (client_id,)).fetchall()
+    # Local date, the same clock merge_upcoming() expands series from.
+    today = datetime.now().date()
+    upcoming_sessions = conn.execute(UPCOMING_SESSIONS_SQL, (client_id, today.isoformat())).fetchall()
+    upcoming_sessions = merge_upcoming(conn, upcoming_sessions, 5, client_id=client_id, today=today)
 
     # Get recent workouts
-    recent_workouts = conn.execute('''
-        SELECT workout_date, COUNT(*) as exercise_count
-        FROM workout_logs
-        WHERE client_id = ?
-        GROUP BY workout_date
-        ORDER BY workout_date DESC
-        LIMIT 5
-    ''', (client_id,)).fetchall()
-
-    weight_history_rows = conn.execute('''
-        SELECT id, date, weight, notes
-        FROM weight_logs
-        WHERE client_id = ?
-        ORDER BY date DESC
-        LIMIT 10
-    ''', (client_id,)).fetchall()
+    recent_workouts = conn.execute(RECENT_WORKOUTS_SQL, (client_id,)).fetchall()
+
+    weight_history_rows = conn.execute(WEIGHT_HISTORY_SQL, (client_id,)).fetchall()
 
     weight_history = [dict(row) for row in weight_history_rows]
 
-    latest_weight_row = conn.execute('''
-        SELECT weight, date
-        FROM weight_logs
-        WHERE client_id = ?
-        ORDER BY date DESC
-        LIMIT 1
-    ''', (client_id,)).fetchone()
+    latest_weight_row = conn.execute(LATEST_WEIGHT_SQL, (client_id,)).fetchone()
 
     app.logger.info(f"[v0] Latest weight query for client {client_id}")
     app.logger.info(f"[v0] Latest weight row type: {type(latest_weight_row)}")
@@ -459,18 +363,9 @@ def client_detail(client_id):
         latest_weight = None
         app.logger.info(f"[v0] No weight logs found for client {client_id}")
 
-    client_notes = conn.execute('''
-        SELECT id, note_text, created_at
-        FROM client_notes
-        WHERE client_id = ?
-        ORDER BY created_at DESC
-        LIMIT 5
-    ''', (client_id,)).fetchall()
+    client_notes = conn.execute(RECENT_NOTES_SQL, (client_id,)).fetchall()
 
-    portal_account_row = conn.execute('''
-        SELECT access_code, is_active, last_login
-        FROM client_accounts WHERE client_id = ?
-    ''', (client_id,)).fetchone()
+    portal_account_row = conn.execute(PORTAL_ACCOUNT_SQL, (client_id,)).fetchone()
     portal_account = dict(portal_account_row) if portal_account_row else None
 
     conn.close()
@@ -530,6 +425,8 @@ def edit_client(client_id):
         ''', (name, email, phone, age, gender, height, status, notes, photo_url,
               client_id, session['user_id']))
         conn.commit()
+        invalidate_dashboard(session['user_id'])
+        forget_client(client_id)
         conn.close()
 
         return redirect(url_for('client_detail', client_id=client_id))
@@ -544,10 +441,7 @@ def edit_client(client_id):
     latest_weight = latest_weight_log['weight'] if latest_weight_log else None
     latest_weight_date = latest_weight_log['date'] if latest_weight_log else None
 
-    portal_account_row = conn.execute('''
-        SELECT access_code, is_active, last_login
-        FROM client_accounts WHERE client_id = ?
-    ''', (client_id,)).fetchone()
+    portal_account_row = conn.execute(PORTAL_ACCOUNT_SQL, (client_id,)).fetchone()
     portal_account = dict(portal_account_row) if portal_account_row else None
 
     conn.close()
@@ -624,25 +518,45 @@ def delete_client(client_id):
             'UPDATE workout_templates SET client_id = NULL, name = ? WHERE id = ?',
             (new_name, tmpl['id'])
         )
+    if client_templates:
+        invalidate_templates(session['user_id'])
 
     # Delete all data that is genuinely bound to this client.
     conn.execute('DELETE FROM weight_logs WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM workout_logs WHERE client_id = ?', (client_id,))
+    conn.execute('DELETE FROM personal_records WHERE client_id = ?', (client_id,))
+    conn.execute('DELETE FROM rep_records WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM sleep_logs WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM nutrition_logs WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM body_measurements WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM progress_photos WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM sessions WHERE client_id = ?', (client_id,))
+    conn.execute('''
+        DELETE FROM session_series_exceptions
+        WHERE series_id IN (SELECT id FROM session_series WHERE client_id = ?)
+    ''', (client_id,))
+    conn.execute('DELETE FROM session_series WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM client_notes WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM client_accounts WHERE client_id = ?', (client_id,))
     conn.execute('DELETE FROM clients WHERE id = ? AND trainer_id = ?', (client_id, session['user_id']))
 
     conn.commit()
+    invalidate_dashboard(session['user_id'])
+    forget_client(client_id)
     conn.close()
 
     return jsonify({'success': True}), 200
 
 
+WORKOUT_HISTORY_SQL = '''
+    SELECT workout_date, workout_type, COUNT(*) as exercise_count
+    FROM workout_logs
+    WHERE client_id = ?
+    GROUP BY workout_date, workout_type
+    ORDER BY workout_date DESC, workout_type
+'''
+
+
 @app.route('/clients/<client_id>/workouts', methods=['GET', 'POST'])
 @login_required
 def client_workouts(client_id):
@@ -657,124 +571,31 @@ def client_workouts(client_id):
 
     if request.method == 'POST':
         workout_date = request.form['date']
-        workout_type = request.form.get('workout_type', 'weightlifting')
-        if workout_type not in ('weightlifting', 'cardio'):
-            workout_type = 'weightlifting'
-        exercises = request.form.getlist('exercise_name[]')
-        notes_list = request.form.getlist('exercise_notes[]')
-        workout_tags = request.form.get('workout_tags', '')
+        workout_type = workout_type_from(request.form.get('workout_type'))
         override = request.form.get('override', 'false') == 'true'
+        try:
+            exercises = exercises_from_form(request.form, workout_type)
+        except ValueError:
+            conn.close()
+            return jsonify({'error': 'Sets must be numbers'}), 400
 
-        # Cardio workouts always carry a "Cardio" tag that can't be removed
-        # from the form — it's added here server-side regardless of what was
-        # submitted, so the only way to get rid of it is deleting the workout.
-        if workout_type == 'cardio':
-            tag_list = [t.strip() for t in workout_tags.split(',') if t.strip()]
-            if 'Cardio' not in tag_list:
-                tag_list.append('Cardio')
-            workout_tags = ','.join(tag_list)
-
-        if not override:
-            existing = conn.execute(
-                'SELECT 1 FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ? LIMIT 1',
-                (client_id, workout_date, workout_type)
-            ).fetchone()
-            if existing:
-                conn.close()
-                return jsonify({'conflict': True}), 409
-
-        for i, exercise in enumerate(exercises):
-            if exercise.strip():  # Only save non-empty exercises
-                if workout_type == 'cardio':
-                    distances = request.form.getlist(f'exercise_{i}_distance[]')
-                    distance_units = request.form.getlist(f'exercise_{i}_distance_unit[]')
-                    durations = request.form.getlist(f'exercise_{i}_duration[]')
-                    duration_units = request.form.getlist(f'exercise_{i}_duration_unit[]')
-                    speeds = request.form.getlist(f'exercise_{i}_speed[]')
-                    speed_units = request.form.getlist(f'exercise_{i}_speed_unit[]')
-                    inclines = request.form.getlist(f'exercise_{i}_incline[]')
-                    set_notes = request.form.getlist(f'exercise_{i}_set_notes[]')
-
-                    exercise_sets = []
-                    set_count = max(len(distances), len(durations), 1)
-                    for j in range(set_count):
-                        distance = distances[j] if j < len(distances) and distances[j] else None
-                        duration = durations[j] if j < len(durations) and durations[j] else None
-                        speed = speeds[j] if j < len(speeds) and speeds[j] else None
-                        incline = inclines[j] if j < len(inclines) and inclines[j] else None
-                        exercise_sets.append({
-                            'distance': float(distance) if distance else None,
-                            'distance_unit': distance_units[j] if j < len(distance_units) and distance_units[j] else None,
-                            'duration': float(duration) if duration else None,
-                            'duration_unit': duration_units[j] if j < len(duration_units) and duration_units[j] else None,
-                            'speed': float(speed) if speed else None,
-                            'speed_unit': speed_units[j] if j < len(speed_units) and speed_units[j] else None,
-                            'incline': float(incline) if incline else None,
-                            'notes': set_notes[j] if j < len(set_notes) and set_notes[j] else None,
-                        })
-                    if not exercise_sets:
-                        exercise_sets = [{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-
-                    total_sets = len(exercise_sets)
-                    conn.execute('''
-                        INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise.strip(),
-                          total_sets, None, None,
-                          notes_list[i] if i < len(notes_list) else '',
-                          workout_date, json.dumps(exercise_sets), workout_tags, workout_type, datetime.now()))
-                else:
-                    # Get sets for this specific exercise using the new field naming
-                    exercise_weights = request.form.getlist(f'exercise_{i}_weight[]')
-                    exercise_reps = request.form.getlist(f'exercise_{i}_reps[]')
-                    # RPE (rate of perceived exertion) is an optional 1-10 per-set
-                    # rating that lives inside sets_data alongside weight/reps. No
-                    # DB column — weightlifting sets just gain an extra nullable key.
-                    exercise_rpes = request.form.getlist(f'exercise_{i}_rpe[]')
-
-                    # Build sets data for this exercise
-                    exercise_sets = []
-                    for j in range(len(exercise_weights)):
-                        weight = exercise_weights[j] if j < len(exercise_weights) and exercise_weights[j] else None
-                        reps = exercise_reps[j] if j < len(exercise_reps) and exercise_reps[j] else None
-                        rpe = exercise_rpes[j] if j < len(exercise_rpes) and exercise_rpes[j] else None
-
-                        exercise_sets.append({
-                            'weight': float(weight) if weight else None,
-                            'reps': int(reps) if reps else None,
-                            'rpe': float(rpe) if rpe else None
-                        })
-
-                    # If no sets data, create a default set
-                    if not exercise_sets:
-                        exercise_sets = [{'weight': None, 'reps': None, 'rpe': None}]
-
-                    # Calculate totals for backward compatibility
-                    total_sets = len(exercise_sets)
-                    avg_reps = sum(s['reps'] for s in exercise_sets if s['reps']) // len(
-                        [s for s in exercise_sets if s['reps']]) if any(s['reps'] for s in exercise_sets) else None
-                    avg_weight = sum(s['weight'] for s in exercise_sets if s['weight']) / len(
-                        [s for s in exercise_sets if s['weight']]) if any(s['weight'] for s in exercise_sets) else None
-
-                    conn.execute('''
-                        INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise.strip(),
-                          total_sets, avg_reps, avg_weight,
-                          notes_list[i] if i < len(notes_list) else '',
-                          workout_date, json.dumps(exercise_sets), workout_tags, workout_type, datetime.now()))
+        if not override and workout_exists(conn, client_id, workout_date, workout_type):
+            conn.close()
+            return jsonify({'conflict': True}), 409
+
+        # Set by the import picker. Anything not one of this trainer's
+        # template versions is dropped rather than stored.
+        template_version_id = request.form.get('template_version_id') or None
+        if template_version_id and not trainer_template_version(conn, session['user_id'], template_version_id):
+            template_version_id = None
 
+        insert_workout(conn, client_id, session['user_id'], workout_date, workout_type,
+                       request.form.get('workout_tags', ''), exercises, template_version_id)
         conn.commit()
         conn.close()
         return jsonify({'success': True})
 
-    workouts = conn.execute('''
-        SELECT workout_date, workout_type, COUNT(*) as exercise_count
-        FROM workout_logs
-        WHERE client_id = ?
-        GROUP BY workout_date, workout_type
-        ORDER BY workout_date DESC, workout_type
-    ''', (client_id,)).fetchall()
+    workouts = conn.execute(WORKOUT_HISTORY_SQL, (client_id,)).fetchall()
 
     conn.close()
     return render_template('dashboard/clients/workouts.html', client=client, workouts=workouts)
@@ -793,49 +614,14 @@ def new_workout(client_id):
 
     if request.method == 'POST':
         workout_date = request.form['workout_date']
-        exercises = request.form.getlist('exercise_name[]')
-        notes_list = request.form.getlist('exercise_notes[]')
-
-        for i, exercise in enumerate(exercises):
-            if exercise.strip():  # Only save non-empty exercises
-                # Get sets for this specific exercise using the new field naming
-                exercise_weights = request.form.getlist(f'exercise_{i}_weight[]')
-                exercise_reps = request.form.getlist(f'exercise_{i}_reps[]')
-                # Optional per-set RPE (1-10), stored inside sets_data only.
-                exercise_rpes = request.form.getlist(f'exercise_{i}_rpe[]')
-
-                # Build sets data for this exercise
-                exercise_sets = []
-                for j in range(len(exercise_weights)):
-                    weight = exercise_weights[j] if j < len(exercise_weights) and exercise_weights[j] else None
-                    reps = exercise_reps[j] if j < len(exercise_reps) and exercise_reps[j] else None
-                    rpe = exercise_rpes[j] if j < len(exercise_rpes) and exercise_rpes[j] else None
-
-                    exercise_sets.append({
-                        'weight': float(weight) if weight else None,
-                        'reps': int(reps) if reps else None,
-                        'rpe': float(rpe) if rpe else None
-                    })
-
-                # If no sets data, create a default set
-                if not exercise_sets:
-                    exercise_sets = [{'weight': None, 'reps': None, 'rpe': None}]
-
-                # Calculate totals for backward compatibility
-                total_sets = len(exercise_sets)
-                avg_reps = sum(s['reps'] for s in exercise_sets if s['reps']) // len(
-                    [s for s in exercise_sets if s['reps']]) if any(s['reps'] for s in exercise_sets) else None
-                avg_weight = sum(s['weight'] for s in exercise_sets if s['weight']) / len(
-                    [s for s in exercise_sets if s['weight']]) if any(s['weight'] for s in exercise_sets) else None
-
-                conn.execute('''
-                    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise.strip(),
-                      total_sets, avg_reps, avg_weight,
-                      notes_list[i] if i < len(notes_list) else '',
-                      workout_date, json.dumps(exercise_sets), datetime.now()))
+        try:
+            exercises = exercises_from_form(request.form, 'weightlifting')
+        except ValueError:
+            conn.close()
+            flash('Weights, reps and RPE must be numbers')
+            return redirect(url_for('new_workout', client_id=client_id))
 
+        insert_workout(conn, client_id, session['user_id'], workout_date, 'weightlifting', None, exercises)
         conn.commit()
         conn.close()
 
@@ -849,74 +635,119 @@ def new_workout(client_id):
 @app.route('/api/exercises/search')
 @login_required
 def search_exercises():
-    query = request.args.get('q', '').lower()
+    # Answered from the in-process index (exercise_index.py): the catalogue
+    # plus this trainer's own logged exercises, most used first. The
+    # connection is only opened if the trainer's entry needs reloading.
+    conn = get_db()
+    exercises = suggest_exercises(conn, session['user_id'], request.args.get('q', ''))
+    conn.close()
+
+    return jsonify(exercises)
 
+
+@app.route('/api/search')
+@login_required
+def global_search():
+    """Search box results: the trainer's clients and notes, and catalogue
+    exercises, ranked. ?kind= (repeatable) narrows it to client, note or
+    exercise."""
+    kinds = [kind for kind in request.args.getlist('kind') if kind in KINDS]
     conn = get_db()
-    exercises = conn.execute('''
-        SELECT name, muscle_group, equipment
-        FROM exercises
-        WHERE LOWER(name) LIKE ?
-        ORDER BY name
-        LIMIT 10
-    ''', (f'%{query}%',)).fetchall()
+    results = search_all(conn, session['user_id'], request.args.get('q', ''), kinds)
     conn.close()
 
-    return jsonify([{
-        'name': ex['name'],
-        'muscle_group': ex['muscle_group'],
-        'equipment': ex['equipment']
-    } for ex in exercises])
+    for result in results:
+        if result['client_id']:
+            result['url'] = url_for('client_detail', client_id=result['client_id'])
+        if result['kind'] == 'note':
+            result['title'] = result['client_name']
+    return jsonify(results)
+
+
+CLIENT_DROPDOWN_SQL = 'SELECT id, name FROM clients WHERE trainer_id = ? ORDER BY name'
 
 
 @app.route('/calendar')
 @login_required
 def calendar():
-    # Get current week with offset
+    # ?view=week (default, paged by week_offset), month (paged by
+    # month_offset) or range (?start=&end=). Whatever the view, its sessions
+    # come from one range query (calendar_feed.py).
+    view = request.args.get('view', 'week')
     week_offset = request.args.get('week_offset', 0, type=int)
+    month_offset = request.args.get('month_offset', 0, type=int)
 
     today = datetime.now().date()
-    start_of_week = today - timedelta(days=today.weekday()) + timedelta(weeks=week_offset)
-    end_of_week = start_of_week + timedelta(days=6)
-
-    week_dates = []
-    for i in range(7):
-        week_dates.append(start_of_week + timedelta(days=i))
+    month_start = None
+    if view == 'month':
+        months = today.year * 12 + today.month - 1 + month_offset
+        month_start = today.replace(year=months // 12, month=months % 12 + 1, day=1)
+        start, end = month_grid(month_start)
+    elif view == 'range':
+        if request.args.get('start') or request.args.get('end'):
+            start, end = parse_range(request.args.get('start'), request.args.get('end'))
+        else:
+            start, end = today, today + timedelta(days=13)
+    else:
+        view = 'week'
+        start = today - timedelta(days=today.weekday()) + timedelta(weeks=week_offset)
+        end = start + timedelta(days=6)
 
     user_id = session['user_id']
 
     conn = get_db()
-    sessions_data = conn.execute('''
-        SELECT s.*, c.name as client_name
-        FROM sessions s
-        JOIN clients c ON s.client_id = c.id
-        WHERE s.trainer_id = ? AND s.session_date BETWEEN ? AND ?
-        ORDER BY s.session_date, s.start_time
-    ''', (user_id, start_of_week, end_of_week)).fetchall()
-
-    clients = conn.execute('SELECT id, name FROM clients WHERE trainer_id = ? ORDER BY name', (user_id,)).fetchall()
-
+    days = sessions_by_day(conn, user_id, start, end)
+    clients = conn.execute(CLIENT_DROPDOWN_SQL, (user_id,)).fetchall()
     conn.close()
 
-    # Organize sessions by day
-    week_sessions = {}
-    for i in range(7):
-        day = start_of_week + timedelta(days=i)
-        week_sessions[day.strftime('%Y-%m-%d')] = []
-
-    for session_item in sessions_data:
-        day_key = session_item['session_date']
-        if day_key in week_sessions:
-            week_sessions[day_key].append(session_item)
-
     return render_template('dashboard/calendar.html',
-                           week_sessions=week_sessions,
-                           week_dates=week_dates,
-                           week_start=start_of_week,
-                           week_end=end_of_week,
+                           view=view,
+                           today=today,
+                           days=days,
+                           range_start=start,
+                           range_end=end,
+                           month_start=month_start,
+                           month_offset=month_offset,
+                           week_sessions=days,
+                           week_dates=[start + timedelta(days=i) for i in range(7)],
+                           week_start=start,
+                           week_end=end,
                            week_offset=week_offset,
                            clients=clients)
 
 
+@app.route('/api/calendar/sessions')
+@login_required
+def calendar_sessions_feed():
+    """The trainer's sessions from ?start= to ?end= (YYYY-MM-DD, inclusive)
+    as JSON, with ETag / Last-Modified so an unchanged range is a 304."""
+    try:
+        start, end = parse_range(request.args.get('start'), request.args.get('end'))
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+
+    user_id = session['user_id']
+    conn = get_db()
+    # Validators are read before the sessions. A write landing in between
+    # pairs newer rows with the older ETag, which only costs the client one
+    # extra 200 next time — never a stale 304.
+    etag, last_modified = calendar_validators(conn, user_id, start, end)
+    unchanged = not_modified(request, etag, last_modified)
+    if unchanged:
+        conn.close()
+        return unchanged
+
+    sessions = sessions_in_range(conn, user_id, start, end)
+    conn.close()
+
+    response = jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'sessions': sessions,
+    })
+    return with_validators(response, etag, last_modified)
+
+
 @app.route('/activity-stream')
 @login_required
 def activity_stream():
@@ -932,47 +763,25 @@ def activity_stream():
     user_id = session['user_id']
     conn = get_db()
 
-    # Activity events for this trainer within the week.
-    # created_at is a full timestamp; compare on its date portion.
-    activity_rows = conn.execute('''
-        SELECT id, client_id, client_name, category, action, detail, created_at
-        FROM activity_log
-        WHERE trainer_id = ?
-          AND date(created_at) BETWEEN ? AND ?
-        ORDER BY created_at DESC
-    ''', (user_id, start_of_week.isoformat(), end_of_week.isoformat())).fetchall()
-
-    # Upcoming sessions in the same week (booked on the calendar).
-    session_rows = conn.execute('''
-        SELECT s.id, s.session_date, s.start_time, s.end_time, s.session_type,
-               s.status, c.name AS client_name
-        FROM sessions s
-        JOIN clients c ON s.client_id = c.id
-        WHERE s.trainer_id = ?
-          AND s.session_date BETWEEN ? AND ?
-        ORDER BY s.session_date, s.start_time
-    ''', (user_id, start_of_week.isoformat(), end_of_week.isoformat())).fetchall()
+    # Activity events for this trainer within the week, per day (see
+    # activity.py; compacted weeks come back as daily counts).
+    week_activity = activity_by_day(conn, user_id, start_of_week, end_of_week)
+
+    # Upcoming sessions in the same week (booked on the calendar, or
+    # occurrences of a recurring series).
+    session_rows = sessions_in_range(conn, user_id, start_of_week, end_of_week)
 
     conn.close()
 
-    # Group both into per-day buckets keyed by YYYY-MM-DD.
-    week_activity = {}
+    # Group sessions into per-day buckets keyed by YYYY-MM-DD.
     week_sessions = {}
     for d in week_dates:
-        key = d.strftime('%Y-%m-%d')
-        week_activity[key] = []
-        week_sessions[key] = []
-
-    for r in activity_rows:
-        # created_at may be 'YYYY-MM-DD HH:MM:SS(.ffffff)'
-        day_key = str(r['created_at'])[:10]
-        if day_key in week_activity:
-            week_activity[day_key].append(dict(r))
+        week_sessions[d.strftime('%Y-%m-%d')] = []
 
     for s in session_rows:
         day_key = s['session_date']
         if day_key in week_sessions:
-            week_sessions[day_key].append(dict(s))
+            week_sessions[day_key].append(s)
 
     return render_template('dashboard/activity_stream.html',
                            week_activity=week_activity,
@@ -983,6 +792,25 @@ def activity_stream():
                            week_offset=week_offset)
 
 
+@app.route('/api/activity/live')
+@login_required
+def activity_live():
+    """New client portal activity for this trainer as Server-Sent Events;
+    see activity.activity_events. 503 when this process already has
+    LIVE_MAX_STREAMS open."""
+    if not claim_live_stream():
+        return Response(streams_busy(), status=503, mimetype='text/event-stream')
+    # ?last_event_id= is how the page resumes after opening a new EventSource.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(activity_events(session['user_id'], last_event_id), mimetype='text/event-stream')
+    # Runs however the response ends, even if the stream never started.
+    response.call_on_close(release_live_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Don't let a fronting nginx buffer the stream.
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/sessions', methods=['POST'])
 @login_required
 def create_session():
@@ -994,16 +822,47 @@ def create_session():
     session_type = data.get('session_type', 'training')
     notes = data.get('notes', '')
 
-    session_id = str(uuid.uuid4())
-
     user_id = session['user_id']
 
+    # {"repeat": {...}} books a recurring series instead of one session;
+    # see recurrence.series_rule for the fields.
+    if data.get('repeat'):
+        try:
+            rule, until = series_rule(session_date, data['repeat'])
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid repeat rule: {e}'}), 400
+        slots = series_slots({'start_date': session_date, 'until': until, 'rrule': rule,
+                              'start_time': start_time, 'end_time': end_time})
+    else:
+        slots = [(session_date, start_time, end_time)]
+
     conn = get_db()
+    # Check and write in one IMMEDIATE transaction, so two requests for
+    # the same slot can't both pass the check.
+    conn.execute('BEGIN IMMEDIATE')
+    # Refuse a double booking unless the trainer has confirmed it.
+    if not data.get('allow_conflicts'):
+        conflicts = find_conflicts(conn, user_id, slots)
+        if conflicts:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'This overlaps existing sessions', 'conflicts': conflicts}), 409
+
+    if data.get('repeat'):
+        series_id = create_series(conn, user_id, client_id, session_date, start_time, end_time,
+                                  session_type, notes, rule, until)
+        conn.commit()
+        invalidate_dashboard(user_id)
+        conn.close()
+        return jsonify({'success': True, 'series_id': series_id})
+
+    session_id = str(uuid.uuid4())
     conn.execute('''
         INSERT INTO sessions (id, trainer_id, client_id, session_date, start_time, end_time, session_type, status, notes, created_at)
         VALUES (?, ?, ?, ?, ?, ?, ?, 'scheduled', ?, ?)
     ''', (session_id, user_id, client_id, session_date, start_time, end_time, session_type, notes, datetime.now()))
     conn.commit()
+    invalidate_dashboard(user_id)
     conn.close()
 
     return jsonify({'success': True, 'session_id': session_id})
@@ -1017,6 +876,9 @@ def get_session(session_id):
         SELECT * FROM sessions
         WHERE id = ? AND trainer_id = ?
     ''', (session_id, session['user_id'])).fetchone()
+    if not session_data:
+        # An occurrence of a series that hasn't been materialized yet.
+        session_data = virtual_session(conn, session_id, session['user_id'])
 
     if not session_data:
         conn.close()
@@ -1032,15 +894,29 @@ def update_session(session_id):
     data = request.json
 
     conn = get_db()
-    # Verify session belongs to current trainer
-    session_data = conn.execute('''
-        SELECT * FROM sessions
-        WHERE id = ? AND trainer_id = ?
-    ''', (session_id, session['user_id'])).fetchone()
+    # Check and write in one IMMEDIATE transaction, so two requests for
+    # the same slot can't both pass the check.
+    conn.execute('BEGIN IMMEDIATE')
+    # Verify session belongs to current trainer. A series occurrence is
+    # materialized into a sessions row first, and that row is updated.
+    session_data = materialize(conn, session_id, session['user_id'])
 
     if not session_data:
+        conn.rollback()
         conn.close()
         return jsonify({'error': 'Session not found'}), 404
+    session_id = session_data['id']
+
+    # Refuse a double booking unless the trainer has confirmed it. A
+    # session being cancelled can't conflict.
+    if data.get('status', 'scheduled') != 'cancelled' and not data.get('allow_conflicts'):
+        conflicts = find_conflicts(conn, session['user_id'],
+                                   [(data['session_date'], data['start_time'], data['end_time'])],
+                                   ignore_ids=[session_id])
+        if conflicts:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'This overlaps existing sessions', 'conflicts': conflicts}), 409
 
     conn.execute('''
         UPDATE sessions
@@ -1053,6 +929,7 @@ def update_session(session_id):
           session_id, session['user_id']))
 
     conn.commit()
+    invalidate_dashboard(session['user_id'])
     conn.close()
 
     return jsonify({'success': True})
@@ -1068,14 +945,15 @@ def delete_session(session_id):
         WHERE id = ? AND trainer_id = ?
     ''', (session_id, session['user_id'])).fetchone()
 
-    if not session_data:
+    if session_data:
+        remove_session(conn, session_data)
+    elif not skip_occurrence(conn, session_id, session['user_id']):
+        # Neither a session nor a live occurrence of one of their series.
         conn.close()
         return jsonify({'error': 'Session not found'}), 404
 
-    conn.execute('DELETE FROM sessions WHERE id = ? AND trainer_id = ?',
-                 (session_id, session['user_id']))
-
     conn.commit()
+    invalidate_dashboard(session['user_id'])
     conn.close()
 
     return jsonify({'success': True})
@@ -1085,15 +963,14 @@ def delete_session(session_id):
 @login_required
 def complete_session(session_id):
     conn = get_db()
-    # Verify session belongs to current trainer
-    session_data = conn.execute('''
-        SELECT * FROM sessions
-        WHERE id = ? AND trainer_id = ?
-    ''', (session_id, session['user_id'])).fetchone()
+    # Verify session belongs to current trainer. A series occurrence is
+    # materialized into a sessions row first, and that row is updated.
+    session_data = materialize(conn, session_id, session['user_id'])
 
     if not session_data:
         conn.close()
         return jsonify({'error': 'Session not found'}), 404
+    session_id = session_data['id']
 
     conn.execute('''
         UPDATE sessions
@@ -1102,6 +979,7 @@ def complete_session(session_id):
     ''', (datetime.now(), session_id, session['user_id']))
 
     conn.commit()
+    invalidate_dashboard(session['user_id'])
     conn.close()
 
     return jsonify({'success': True})
@@ -1111,15 +989,14 @@ def complete_session(session_id):
 @login_required
 def cancel_session(session_id):
     conn = get_db()
-    # Verify session belongs to current trainer
-    session_data = conn.execute('''
-        SELECT * FROM sessions
-        WHERE id = ? AND trainer_id = ?
-    ''', (session_id, session['user_id'])).fetchone()
+    # Verify session belongs to current trainer. A series occurrence is
+    # materialized into a sessions row first, and that row is updated.
+    session_data = materialize(conn, session_id, session['user_id'])
 
     if not session_data:
         conn.close()
         return jsonify({'error': 'Session not found'}), 404
+    session_id = session_data['id']
 
     conn.execute('''
         UPDATE sessions
@@ -1128,11 +1005,46 @@ def cancel_session(session_id):
     ''', (datetime.now(), session_id, session['user_id']))
 
     conn.commit()
+    invalidate_dashboard(session['user_id'])
     conn.close()
 
     return jsonify({'success': True})
 
 
+@app.route('/api/session-series/<series_id>', methods=['DELETE'])
+@login_required
+def delete_session_series(series_id):
+    """End a recurring series: no occurrences from ?from= (YYYY-MM-DD,
+    default today) on. From its first date or earlier, the series is
+    deleted. Occurrences already completed, cancelled or edited are kept."""
+    try:
+        from_date = datetime.strptime(request.args['from'], '%Y-%m-%d').date() \
+            if request.args.get('from') else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'from must be a YYYY-MM-DD date'}), 400
+
+    conn = get_db()
+    series = get_series(conn, series_id, session['user_id'])
+    if not series:
+        conn.close()
+        return jsonify({'error': 'Series not found'}), 404
+
+    end_series(conn, series, from_date)
+    conn.commit()
+    invalidate_dashboard(session['user_id'])
+    conn.close()
+
+    return jsonify({'success': True})
+
+
+SESSION_HISTORY_SQL = '''
+    SELECT * FROM sessions
+    WHERE client_id = ? AND trainer_id = ?
+'''
+SESSION_HISTORY_ORDER = [('session_date', 'session_date', 'DESC'), ('start_time', 'start_time', 'DESC'),
+                         ('id', 'id', 'DESC')]
+
+
 @app.route('/clients/<client_id>/sessions/history')
 @login_required
 def session_history(client_id):
@@ -1144,16 +1056,25 @@ def session_history(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    all_sessions = conn.execute('''
-        SELECT * FROM sessions
-        WHERE client_id = ? AND trainer_id = ?
-        ORDER BY session_date DESC, start_time DESC
-    ''', (client_id, session['user_id'])).fetchall()
+    all_sessions, next_cursor = keyset_page(conn, SESSION_HISTORY_SQL, (client_id, session['user_id']),
+                                            SESSION_HISTORY_ORDER, request.args.get('cursor'))
 
     conn.close()
 
+    if wants_next_page():
+        return next_page_response('dashboard/clients/_session_rows.html', next_cursor,
+                                  all_sessions=all_sessions)
     return render_template('dashboard/clients/session_history.html',
-                           client=client, all_sessions=all_sessions)
+                           client=client, all_sessions=all_sessions, next_cursor=next_cursor)
+
+
+# {type}: the optional workout_type filter.
+WORKOUT_DETAIL_SQL = '''
+    SELECT id, exercise_name, notes, tags, workout_type
+    FROM workout_logs
+    WHERE client_id = ? AND workout_date = ? AND trainer_id = ?{type}
+    ORDER BY created_at
+'''
 
 
 @app.route('/clients/<client_id>/workouts/<date>')
@@ -1172,36 +1093,22 @@ def workout_detail(client_id, date):
     # that predates workout_type and expects the old, unfiltered behavior).
     workout_type = request.args.get('type')
     if workout_type in ('weightlifting', 'cardio'):
-        exercises = conn.execute('''
-            SELECT id, exercise_name, sets_data, notes, tags, workout_type
-            FROM workout_logs
-            WHERE client_id = ? AND workout_date = ? AND trainer_id = ? AND workout_type = ?
-            ORDER BY created_at
-        ''', (client_id, date, session['user_id'], workout_type)).fetchall()
+        exercises = conn.execute(WORKOUT_DETAIL_SQL.format(type=' AND workout_type = ?'),
+                                 (client_id, date, session['user_id'], workout_type)).fetchall()
     else:
-        exercises = conn.execute('''
-            SELECT id, exercise_name, sets_data, notes, tags, workout_type
-            FROM workout_logs
-            WHERE client_id = ? AND workout_date = ? AND trainer_id = ?
-            ORDER BY created_at
-        ''', (client_id, date, session['user_id'])).fetchall()
+        exercises = conn.execute(WORKOUT_DETAIL_SQL.format(type=''),
+                                 (client_id, date, session['user_id'])).fetchall()
 
+    sets_by_log = load_sets(conn, exercises)
     conn.close()
 
     result = []
     for ex in exercises:
-        sets_data = None
-        if ex['sets_data']:
-            try:
-                sets_data = json.loads(ex['sets_data'])
-            except:
-                sets_data = None
-
         result.append({
             'id': ex['id'],
             'exercise_name': ex['exercise_name'],
             'notes': ex['notes'],
-            'sets_data': sets_data,
+            'sets_data': sets_by_log.get(ex['id']),
             'tags': ex['tags'] if ex['tags'] else '',
             'workout_type': ex['workout_type'] if 'workout_type' in ex.keys() else 'weightlifting'
         })
@@ -1209,6 +1116,17 @@ def workout_detail(client_id, date):
     return jsonify(result)
 
 
+# {exclude}: the optional exclude_date condition.
+EXERCISE_HISTORY_SQL = '''
+    SELECT id, exercise_name, notes, workout_date, workout_type
+    FROM workout_logs
+    WHERE client_id = ? AND trainer_id = ? AND workout_type = ?
+      AND exercise_key = ?{exclude}
+    ORDER BY workout_date DESC, created_at DESC
+    LIMIT 1
+'''
+
+
 @app.route('/api/clients/<client_id>/exercise-history')
 @login_required
 def exercise_history(client_id):
@@ -1236,41 +1154,88 @@ def exercise_history(client_id):
         conn.close()
         return jsonify({'error': 'Client not found'}), 404
 
-    params = [client_id, session['user_id'], workout_type, name.lower()]
+    params = [client_id, session['user_id'], workout_type, exercise_key(name)]
     exclude_clause = ''
     if exclude_date:
         exclude_clause = ' AND workout_date != ?'
         params.append(exclude_date)
 
-    row = conn.execute(f'''
-        SELECT exercise_name, sets_data, notes, workout_date
-        FROM workout_logs
-        WHERE client_id = ? AND trainer_id = ? AND workout_type = ?
-          AND LOWER(exercise_name) = ?{exclude_clause}
-        ORDER BY workout_date DESC, created_at DESC
-        LIMIT 1
-    ''', params).fetchone()
-    conn.close()
+    row = conn.execute(EXERCISE_HISTORY_SQL.format(exclude=exclude_clause), params).fetchone()
 
     if not row:
+        conn.close()
         return jsonify({'found': False}), 200
 
-    sets_data = None
-    if row['sets_data']:
-        try:
-            sets_data = json.loads(row['sets_data'])
-        except:
-            sets_data = None
+    sets_data = load_sets(conn, [row]).get(row['id'], [])
+    conn.close()
 
     return jsonify({
         'found': True,
         'exercise_name': row['exercise_name'],
         'workout_date': row['workout_date'],
         'notes': row['notes'] or '',
-        'sets_data': sets_data or []
+        'sets_data': sets_data
     })
 
 
+ALL_RECORDS_SQL = '''
+    SELECT * FROM personal_records WHERE client_id = ?
+    ORDER BY workout_type DESC, exercise_key
+'''
+
+RECORD_SQL = '''
+    SELECT * FROM personal_records
+    WHERE client_id = ? AND workout_type = ? AND exercise_key = ?
+'''
+
+REP_MAXES_SQL = '''
+    SELECT weight, reps, workout_date FROM rep_records
+    WHERE client_id = ? AND exercise_key = ? ORDER BY weight DESC
+'''
+
+
+@app.route('/api/clients/<client_id>/records')
+@login_required
+def exercise_records(client_id):
+    """Personal records for this client, read straight from personal_records.
+
+    With ?name= (and optional ?type=weightlifting|cardio) returns that one
+    exercise plus its best reps at each weight; without it, every exercise
+    the client has a record for.
+    """
+    name = (request.args.get('name') or '').strip()
+    workout_type = request.args.get('type', 'weightlifting')
+    if workout_type not in ('weightlifting', 'cardio'):
+        workout_type = 'weightlifting'
+
+    conn = get_db()
+    client = conn.execute('SELECT id FROM clients WHERE id = ? AND trainer_id = ?',
+                          (client_id, session['user_id'])).fetchone()
+    if not client:
+        conn.close()
+        return jsonify({'error': 'Client not found'}), 404
+
+    if not name:
+        rows = conn.execute(ALL_RECORDS_SQL, (client_id,)).fetchall()
+        conn.close()
+        return jsonify({'records': [record_to_dict(r) for r in rows]})
+
+    row = conn.execute(RECORD_SQL, (client_id, workout_type, exercise_key(name))).fetchone()
+    if not row:
+        conn.close()
+        return jsonify({'found': False}), 200
+
+    result = record_to_dict(row)
+    result['found'] = True
+    if workout_type == 'weightlifting':
+        reps = conn.execute(REP_MAXES_SQL, (client_id, exercise_key(name))).fetchall()
+        result['best_reps_by_weight'] = [
+            {'weight': r['weight'], 'reps': r['reps'], 'date': r['workout_date']} for r in reps
+        ]
+    conn.close()
+    return jsonify(result)
+
+
 @app.route('/api/update-workout/<client_id>/<date>', methods=['POST'])
 @login_required
 def update_workout(client_id, date):
@@ -1284,113 +1249,22 @@ def update_workout(client_id, date):
         return jsonify({'error': 'Client not found'}), 404
 
     new_date = request.args.get('new_date', date)
-    workout_type = request.form.get('workout_type', 'weightlifting')
-    if workout_type not in ('weightlifting', 'cardio'):
-        workout_type = 'weightlifting'
-
-    exercise_names = request.form.getlist('exercise_name[]')
-    notes_list = request.form.getlist('exercise_notes[]')
-    workout_tags = request.form.get('workout_tags', '')
-
-    if workout_type == 'cardio':
-        tag_list = [t.strip() for t in workout_tags.split(',') if t.strip()]
-        if 'Cardio' not in tag_list:
-            tag_list.append('Cardio')
-        workout_tags = ','.join(tag_list)
-
-    # Delete only this workout's own (date, type) pair — a weightlifting and
-    # a cardio workout on the same date are independent and must not affect
-    # each other when one of them is edited.
-    conn.execute('''
-        DELETE FROM workout_logs
-        WHERE client_id = ? AND workout_date = ? AND trainer_id = ? AND workout_type = ?
-    ''', (client_id, date, session['user_id'], workout_type))
-
-    for i, exercise_name in enumerate(exercise_names):
-        if exercise_name.strip():  # Only save non-empty exercises
-            if workout_type == 'cardio':
-                distances = request.form.getlist(f'exercise_{i}_distance[]')
-                distance_units = request.form.getlist(f'exercise_{i}_distance_unit[]')
-                durations = request.form.getlist(f'exercise_{i}_duration[]')
-                duration_units = request.form.getlist(f'exercise_{i}_duration_unit[]')
-                speeds = request.form.getlist(f'exercise_{i}_speed[]')
-                speed_units = request.form.getlist(f'exercise_{i}_speed_unit[]')
-                inclines = request.form.getlist(f'exercise_{i}_incline[]')
-                set_notes = request.form.getlist(f'exercise_{i}_set_notes[]')
-
-                exercise_sets = []
-                set_count = max(len(distances), len(durations), 1)
-                for j in range(set_count):
-                    distance = distances[j] if j < len(distances) and distances[j] else None
-                    duration = durations[j] if j < len(durations) and durations[j] else None
-                    speed = speeds[j] if j < len(speeds) and speeds[j] else None
-                    incline = inclines[j] if j < len(inclines) and inclines[j] else None
-                    exercise_sets.append({
-                        'distance': float(distance) if distance else None,
-                        'distance_unit': distance_units[j] if j < len(distance_units) and distance_units[j] else None,
-                        'duration': float(duration) if duration else None,
-                        'duration_unit': duration_units[j] if j < len(duration_units) and duration_units[j] else None,
-                        'speed': float(speed) if speed else None,
-                        'speed_unit': speed_units[j] if j < len(speed_units) and speed_units[j] else None,
-                        'incline': float(incline) if incline else None,
-                        'notes': set_notes[j] if j < len(set_notes) and set_notes[j] else None,
-                    })
-                if not exercise_sets:
-                    exercise_sets = [{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-
-                total_sets = len(exercise_sets)
-                notes_val = notes_list[i] if i < len(notes_list) else ''
-
-                conn.execute('''
-                    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise_name.strip(),
-                      total_sets, None, None, notes_val, new_date, json.dumps(exercise_sets), workout_tags,
-                      workout_type, datetime.now()))
-            else:
-                # Get sets for this specific exercise using the new field naming
-                exercise_weights = request.form.getlist(f'exercise_{i}_weight[]')
-                exercise_reps = request.form.getlist(f'exercise_{i}_reps[]')
-                # Optional per-set RPE (1-10), stored inside sets_data only.
-                exercise_rpes = request.form.getlist(f'exercise_{i}_rpe[]')
-
-                # Build sets data for this exercise
-                exercise_sets = []
-                for j in range(len(exercise_weights)):
-                    weight = exercise_weights[j] if j < len(exercise_weights) and exercise_weights[j] else None
-                    reps = exercise_reps[j] if j < len(exercise_reps) and exercise_reps[j] else None
-                    rpe = exercise_rpes[j] if j < len(exercise_rpes) and exercise_rpes[j] else None
-
-                    exercise_sets.append({
-                        'weight': float(weight) if weight else None,
-                        'reps': int(reps) if reps else None,
-                        'rpe': float(rpe) if rpe else None
-                    })
-
-                # If no sets data, create a default set
-                if not exercise_sets:
-                    exercise_sets = [{'weight': None, 'reps': None, 'rpe': None}]
-
-                # Calculate totals for backward compatibility
-                total_sets = len(exercise_sets)
-                avg_reps = sum(s['reps'] for s in exercise_sets if s['reps']) // len(
-                    [s for s in exercise_sets if s['reps']]) if any(s['reps'] for s in exercise_sets) else None
-                avg_weight = sum(s['weight'] for s in exercise_sets if s['weight']) / len(
-                    [s for s in exercise_sets if s['weight']]) if any(s['weight'] for s in exercise_sets) else None
-
-                notes_val = notes_list[i] if i < len(notes_list) else ''
-
-                conn.execute('''
-                    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise_name.strip(),
-                      total_sets, avg_reps, avg_weight, notes_val, new_date, json.dumps(exercise_sets), workout_tags,
-                      workout_type, datetime.now()))
+    workout_type = workout_type_from(request.form.get('workout_type'))
+    try:
+        exercises = exercises_from_form(request.form, workout_type)
+    except ValueError:
+        conn.close()
+        return jsonify({'error': 'Sets must be numbers'}), 400
 
+    # Touches only this workout's own (date, type) pair — a weightlifting
+    # and a cardio workout on the same date are independent and must not
+    # affect each other when one of them is edited.
+    changes = edit_workout(conn, client_id, session['user_id'], date, new_date, workout_type,
+                           request.form.get('workout_tags', ''), exercises)
     conn.commit()
     conn.close()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'changes': changes})
 
 
 @app.route('/api/delete-workout/<client_id>/<date>', methods=['DELETE'])
@@ -1409,15 +1283,8 @@ def delete_workout(client_id, date):
     # date can never also wipe out a different workout type logged the same
     # day. Falls back to 'weightlifting' only for any pre-existing caller
     # that predates this parameter.
-    workout_type = request.args.get('type', 'weightlifting')
-    if workout_type not in ('weightlifting', 'cardio'):
-        workout_type = 'weightlifting'
-
-    conn.execute('''
-        DELETE FROM workout_logs
-        WHERE client_id = ? AND workout_date = ? AND trainer_id = ? AND workout_type = ?
-    ''', (client_id, date, session['user_id'], workout_type))
-
+    workout_type = workout_type_from(request.args.get('type'))
+    remove_workout(conn, client_id, date, workout_type)
     conn.commit()
     conn.close()
 
@@ -1443,9 +1310,7 @@ def duplicate_workout(client_id):
     original_date = data.get('original_date')
     new_date = data.get('new_date')
     override = data.get('override', False)
-    workout_type = data.get('workout_type', 'weightlifting')
-    if workout_type not in ('weightlifting', 'cardio'):
-        workout_type = 'weightlifting'
+    workout_type = workout_type_from(data.get('workout_type'))
 
     app.logger.info(f"[v0] Duplicating {workout_type} workout from {original_date} to {new_date}")
 
@@ -1454,56 +1319,19 @@ def duplicate_workout(client_id):
         conn.close()
         return jsonify({'error': 'Missing date parameters'}), 400
 
-    if not override:
-        existing = conn.execute(
-            'SELECT 1 FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ? LIMIT 1',
-            (client_id, new_date, workout_type)
-        ).fetchone()
-        if existing:
-            conn.close()
-            return jsonify({'conflict': True}), 409
-
-    # Fetch all exercises from the original workout (same type only — a
-    # cardio "duplicate" button only ever duplicates the cardio entry for
-    # that date, never an unrelated weightlifting entry on the same day).
-    exercises = conn.execute('''
-        SELECT exercise_name, sets_data, notes, tags
-        FROM workout_logs
-        WHERE client_id = ? AND workout_date = ? AND trainer_id = ? AND workout_type = ?
-        ORDER BY created_at
-    ''', (client_id, original_date, session['user_id'], workout_type)).fetchall()
+    if not override and workout_exists(conn, client_id, new_date, workout_type):
+        conn.close()
+        return jsonify({'conflict': True}), 409
 
-    if not exercises:
+    # Same type only — a cardio "duplicate" button only ever duplicates the
+    # cardio entry for that date, never an unrelated weightlifting entry on
+    # the same day.
+    copied = copy_workout(conn, client_id, session['user_id'], original_date, new_date, workout_type)
+    if not copied:
         app.logger.warning(f"[v0] No {workout_type} workout found for date {original_date}")
         conn.close()
         return jsonify({'error': 'No workout found for that date'}), 404
 
-    app.logger.info(f"[v0] Found {len(exercises)} exercises to duplicate")
-
-    # Duplicate each exercise to the new date
-    default_sets = ([{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-                     if workout_type == 'cardio' else [{'weight': None, 'reps': None}])
-    for exercise in exercises:
-        sets_data = exercise['sets_data']
-        exercise_sets = json.loads(sets_data) if sets_data else default_sets
-        total_sets = len(exercise_sets)
-
-        if workout_type == 'cardio':
-            avg_reps = None
-            avg_weight = None
-        else:
-            avg_reps = sum(s['reps'] for s in exercise_sets if s.get('reps')) // len(
-                [s for s in exercise_sets if s.get('reps')]) if any(s.get('reps') for s in exercise_sets) else None
-            avg_weight = sum(s['weight'] for s in exercise_sets if s.get('weight')) / len(
-                [s for s in exercise_sets if s.get('weight')]) if any(s.get('weight') for s in exercise_sets) else None
-
-        conn.execute('''
-            INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (str(uuid.uuid4()), client_id, session['user_id'], exercise['exercise_name'],
-              total_sets, avg_reps, avg_weight, exercise['notes'], new_date, sets_data, exercise['tags'],
-              workout_type, datetime.now()))
-
     conn.commit()
     conn.close()
 
@@ -1555,6 +1383,7 @@ def add_weight_log():
                 INSERT INTO weight_logs (id, client_id, date, weight, notes, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (weight_id, client_id, date, weight, notes, datetime.now(), datetime.now()))
+        refresh_latest_weight(conn, client_id)
         conn.commit()
         conn.close()
         return jsonify({'success': True, 'id': weight_id})
@@ -1590,6 +1419,7 @@ def update_weight_log(weight_id):
             SET date = ?, weight = ?, notes = ?, updated_at = ?
             WHERE id = ?
         ''', (date, weight, notes, datetime.now(), weight_id))
+        refresh_latest_weight(conn, weight_log['client_id'])
         conn.commit()
         conn.close()
         return jsonify({'success': True})
@@ -1616,6 +1446,7 @@ def delete_weight_log(weight_id):
 
     try:
         conn.execute('DELETE FROM weight_logs WHERE id = ?', (weight_id,))
+        refresh_latest_weight(conn, weight_log['client_id'])
         conn.commit()
         conn.close()
         return jsonify({'success': True})
@@ -1743,6 +1574,19 @@ def upload_client_photo():
     return jsonify({'error': 'Invalid file'}), 400
 
 
+# How the weight, photo, measurement, nutrition and sleep log pages page:
+# newest first, id breaking ties within a day.
+LOG_PAGE_ORDER = [('date', 'date', 'DESC'), ('id', 'id', 'DESC')]
+
+WEIGHT_LOGS_SQL = '''
+    SELECT id, date, weight, notes
+    FROM weight_logs
+    WHERE client_id = ?
+'''
+
+WEIGHT_SERIES_SQL = 'SELECT date, weight FROM weight_logs WHERE client_id = ? ORDER BY date'
+
+
 @app.route('/clients/<client_id>/weight-logs')
 @login_required
 def client_weight_logs(client_id):
@@ -1754,20 +1598,34 @@ def client_weight_logs(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    weight_history_rows = conn.execute('''
-        SELECT id, date, weight, notes
-        FROM weight_logs
-        WHERE client_id = ?
-        ORDER BY date DESC
-    ''', (client_id,)).fetchall()
+    weight_history_rows, next_cursor = keyset_page(conn, WEIGHT_LOGS_SQL, (client_id,), LOG_PAGE_ORDER,
+                                                   request.args.get('cursor'))
 
     weight_history = [dict(row) for row in weight_history_rows]
 
+    if wants_next_page():
+        conn.close()
+        return next_page_response('dashboard/clients/_weight_rows.html', next_cursor,
+                                  weight_history=weight_history)
+
+    # The chart's "All Time" view still needs every entry, but only the
+    # columns it plots.
+    weight_series = [dict(row) for row in conn.execute(WEIGHT_SERIES_SQL, (client_id,))]
+
     conn.close()
 
     return render_template('dashboard/clients/weight_logs.html',
                            client=client,
-                           weight_history=weight_history)
+                           weight_history=weight_history,
+                           weight_series=weight_series,
+                           next_cursor=next_cursor)
+
+
+PHOTOS_SQL = '''
+    SELECT id, date, photo_url, notes
+    FROM progress_photos
+    WHERE client_id = ?
+'''
 
 
 @app.route('/clients/<client_id>/progress-photos')
@@ -1782,20 +1640,20 @@ def client_progress_photos(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    photo_rows = conn.execute('''
-        SELECT id, date, photo_url, notes
-        FROM progress_photos
-        WHERE client_id = ?
-        ORDER BY date DESC
-    ''', (client_id,)).fetchall()
+    photo_rows, next_cursor = keyset_page(conn, PHOTOS_SQL, (client_id,), LOG_PAGE_ORDER,
+                                          request.args.get('cursor'))
 
     photo_history = [dict(row) for row in photo_rows]
 
     conn.close()
 
+    if wants_next_page():
+        return next_page_response('dashboard/clients/_photo_rows.html', next_cursor,
+                                  photo_history=photo_history)
     return render_template('dashboard/clients/progress_photos.html',
                            client=client,
-                           photo_history=photo_history)
+                           photo_history=photo_history,
+                           next_cursor=next_cursor)
 
 
 @app.route('/api/progress-photo', methods=['POST'])
@@ -1928,6 +1786,13 @@ def delete_progress_photo(photo_id):
         return jsonify({'error': str(e)}), 500
 
 
+MEASUREMENTS_SQL = '''
+    SELECT id, date, neck, shoulders, chest, waist, hips, bicep, forearm, thigh, calf, notes
+    FROM body_measurements
+    WHERE client_id = ?
+'''
+
+
 @app.route('/clients/<client_id>/measurements')
 @login_required
 def client_measurements(client_id):
@@ -1940,20 +1805,21 @@ def client_measurements(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    measurement_rows = conn.execute('''
-        SELECT id, date, neck, shoulders, chest, waist, hips, bicep, forearm, thigh, calf, notes
-        FROM body_measurements
-        WHERE client_id = ?
-        ORDER BY date DESC
-    ''', (client_id,)).fetchall()
+    measurement_rows, next_cursor = keyset_page(conn, MEASUREMENTS_SQL, (client_id,), LOG_PAGE_ORDER,
+                                                request.args.get('cursor'))
 
     measurement_history = [dict(row) for row in measurement_rows]
 
     conn.close()
 
+    if wants_next_page():
+        return next_page_response('dashboard/clients/_measurement_rows.html', next_cursor,
+                                  measurement_history=measurement_history)
+
     return render_template('dashboard/clients/measurements.html',
                            client=client,
-                           measurement_history=measurement_history)
+                           measurement_history=measurement_history,
+                           next_cursor=next_cursor)
 
 
 MEASUREMENT_FIELDS = ['neck', 'shoulders', 'chest', 'waist', 'hips', 'bicep', 'forearm', 'thigh', 'calf']
@@ -2077,29 +1943,34 @@ def delete_measurement(measurement_id):
         return jsonify({'error': str(e)}), 500
 
 
+UNIVERSAL_TEMPLATES_SQL = '''
+    SELECT id, name, created_at, workout_type,
+           (SELECT exercise_count FROM template_versions WHERE id = workout_templates.version_id) as exercise_count
+    FROM workout_templates
+    WHERE trainer_id = ? AND client_id IS NULL
+    ORDER BY created_at DESC
+'''
+
+TEMPLATE_CLIENTS_SQL = '''
+    SELECT c.id, c.name, c.status, c.photo_url,
+           (SELECT COUNT(*) FROM workout_templates wt
+            WHERE wt.client_id = c.id AND wt.trainer_id = ?) as template_count
+    FROM clients c
+    WHERE c.trainer_id = ?
+    ORDER BY c.name COLLATE NOCASE
+'''
+
+
 @app.route('/templates')
 @login_required
 def workout_templates():
     conn = get_db()
 
     # Universal templates (client_id IS NULL)
-    universal_templates = conn.execute('''
-        SELECT id, name, created_at, workout_type,
-               (SELECT COUNT(*) FROM template_exercises WHERE template_id = workout_templates.id) as exercise_count
-        FROM workout_templates
-        WHERE trainer_id = ? AND client_id IS NULL
-        ORDER BY created_at DESC
-    ''', (session['user_id'],)).fetchall()
+    universal_templates = conn.execute(UNIVERSAL_TEMPLATES_SQL, (session['user_id'],)).fetchall()
 
     # Client cards, each with how many client-specific templates they have
-    clients = conn.execute('''
-        SELECT c.id, c.name, c.status, c.photo_url,
-               (SELECT COUNT(*) FROM workout_templates wt
-                WHERE wt.client_id = c.id AND wt.trainer_id = ?) as template_count
-        FROM clients c
-        WHERE c.trainer_id = ?
-        ORDER BY c.name COLLATE NOCASE
-    ''', (session['user_id'], session['user_id'])).fetchall()
+    clients = conn.execute(TEMPLATE_CLIENTS_SQL, (session['user_id'], session['user_id'])).fetchall()
 
     conn.close()
 
@@ -2108,6 +1979,15 @@ def workout_templates():
                            clients=clients)
 
 
+CLIENT_TEMPLATES_SQL = '''
+    SELECT id, name, created_at, workout_type,
+           (SELECT exercise_count FROM template_versions WHERE id = workout_templates.version_id) as exercise_count
+    FROM workout_templates
+    WHERE trainer_id = ? AND client_id = ?
+    ORDER BY created_at DESC
+'''
+
+
 @app.route('/templates/client/<client_id>')
 @login_required
 def specific_workout_templates(client_id):
@@ -2120,13 +2000,7 @@ def specific_workout_templates(client_id):
         flash('Client not found')
         return redirect(url_for('workout_templates'))
 
-    templates = conn.execute('''
-        SELECT id, name, created_at, workout_type,
-               (SELECT COUNT(*) FROM template_exercises WHERE template_id = workout_templates.id) as exercise_count
-        FROM workout_templates
-        WHERE trainer_id = ? AND client_id = ?
-        ORDER BY created_at DESC
-    ''', (session['user_id'], client_id)).fetchall()
+    templates = conn.execute(CLIENT_TEMPLATES_SQL, (session['user_id'], client_id)).fetchall()
 
     conn.close()
 
@@ -2149,338 +2023,6 @@ def exports():
     return render_template('dashboard/exports.html', clients=clients)
 
 
-def build_client_export_workbook(conn, client_id, trainer_id, export_workouts, export_weight_logs,
-                                  export_nutrition_logs, export_sleep_logs, export_measurements=False,
-                                  export_photos=False):
-    """Build one client's export workbook in memory, plus their progress
-    photo files if requested.
-
-    Returns (client_name, excel_bytes, photo_files) or None if the client
-    doesn't exist or doesn't belong to this trainer. photo_files is a list
-    of (filename, file_bytes) tuples — filename is just the entry's date
-    plus the original file's extension, since each client can only have one
-    photo entry per date.
-    """
-    client = conn.execute('''
-        SELECT name FROM clients
-        WHERE id = ? AND trainer_id = ?
-    ''', (client_id, trainer_id)).fetchone()
-
-    if not client:
-        return None
-
-    # Create Excel workbook for this client
-    wb = Workbook()
-    wb.remove(wb.active)  # Remove default sheet
-
-    # Export workout history
-    if export_workouts:
-        ws_workouts = wb.create_sheet('Workout History')
-
-        # Get all workouts for this client, ordered by date (oldest first)
-        workouts = conn.execute('''
-            SELECT workout_date, exercise_name, sets_data, notes, tags, workout_type
-            FROM workout_logs
-            WHERE client_id = ?
-            ORDER BY workout_date ASC, created_at ASC
-        ''', (client_id,)).fetchall()
-
-        # Helper function to populate a workout sheet
-        def populate_workout_sheet(ws, filtered_workouts, show_tags=True):  # Added show_tags parameter
-            current_row = 1
-            current_date = None
-
-            for workout in filtered_workouts:
-                is_cardio = workout['workout_type'] == 'cardio' if 'workout_type' in workout.keys() else False
-
-                # Add blank row between different workout dates
-                if current_date and current_date != workout['workout_date']:
-                    current_row += 1
-
-                # Add workout date header
-                if current_date != workout['workout_date']:
-                    ws.cell(row=current_row, column=1, value=workout['workout_date'])
-                    ws.cell(row=current_row, column=1).font = Font(bold=True, size=12)
-                    current_row += 1
-                    current_date = workout['workout_date']
-
-                # Add exercise name
-                ws.cell(row=current_row, column=1, value=workout['exercise_name'])
-                ws.cell(row=current_row, column=1).font = Font(bold=True)
-                current_row += 1
-
-                sets_data = json.loads(workout['sets_data']) if workout['sets_data'] else []
-
-                if is_cardio:
-                    # Add sets header (cardio: distance / duration / speed / incline / notes)
-                    ws.cell(row=current_row, column=1, value='Set')
-                    ws.cell(row=current_row, column=2, value='Distance')
-                    ws.cell(row=current_row, column=3, value='Duration')
-                    ws.cell(row=current_row, column=4, value='Speed')
-                    ws.cell(row=current_row, column=5, value='Incline')
-                    ws.cell(row=current_row, column=6, value='Set Notes')
-                    for col in range(1, 7):
-                        ws.cell(row=current_row, column=col).font = Font(bold=True)
-                    current_row += 1
-
-                    for set_num, set_info in enumerate(sets_data, 1):
-                        distance = set_info.get('distance')
-                        distance_unit = set_info.get('distance_unit') or ''
-                        duration = set_info.get('duration')
-                        duration_unit = set_info.get('duration_unit') or ''
-                        # Speed and incline are optional and only present on newer
-                        # entries; older cardio sets leave these blank.
-                        speed = set_info.get('speed')
-                        speed_unit = set_info.get('speed_unit') or 'mph'
-                        incline = set_info.get('incline')
-                        ws.cell(row=current_row, column=1, value=f'Set {set_num}')
-                        ws.cell(row=current_row, column=2,
-                                value=f'{distance} {distance_unit}'.strip() if distance is not None else '')
-                        ws.cell(row=current_row, column=3,
-                                value=f'{duration} {duration_unit}'.strip() if duration is not None else '')
-                        ws.cell(row=current_row, column=4,
-                                value=f'{speed} {speed_unit}'.strip() if speed is not None else '')
-                        ws.cell(row=current_row, column=5,
-                                value=f'{incline}%' if incline is not None else '')
-                        ws.cell(row=current_row, column=6, value=set_info.get('notes') or '')
-                        current_row += 1
-                else:
-                    # Add sets header (weightlifting: weight / reps / RPE)
-                    ws.cell(row=current_row, column=1, value='Set')
-                    ws.cell(row=current_row, column=2, value='Weight (lbs)')
-                    ws.cell(row=current_row, column=3, value='Reps')
-                    ws.cell(row=current_row, column=4, value='RPE')
-                    for col in range(1, 5):
-                        ws.cell(row=current_row, column=col).font = Font(bold=True)
-                    current_row += 1
-
-                    for set_num, set_info in enumerate(sets_data, 1):
-                        ws.cell(row=current_row, column=1, value=f'Set {set_num}')
-                        ws.cell(row=current_row, column=2, value=set_info.get('weight', ''))
-                        ws.cell(row=current_row, column=3, value=set_info.get('reps', ''))
-                        # RPE is optional and only present on newer entries; older
-                        # sets logged before RPE existed simply leave this blank.
-                        ws.cell(row=current_row, column=4, value=set_info.get('rpe') or '')
-                        current_row += 1
-
-                # Add notes if present
-                if workout['notes']:
-                    ws.cell(row=current_row, column=1, value=f"Notes: {workout['notes']}")
-                    ws.cell(row=current_row, column=1).font = Font(italic=True)
-                    current_row += 1
-
-                if show_tags and workout['tags']:
-                    ws.cell(row=current_row, column=1, value=f"Tags: {workout['tags']}")
-                    current_row += 1
-
-            # Adjust column widths (wide enough for either layout: weight/reps/RPE or distance/duration/speed/incline/notes)
-            ws.column_dimensions['A'].width = 25
-            ws.column_dimensions['B'].width = 18
-            ws.column_dimensions['C'].width = 18
-            ws.column_dimensions['D'].width = 14
-            ws.column_dimensions['E'].width = 12
-            ws.column_dimensions['F'].width = 30
-
-        populate_workout_sheet(ws_workouts, workouts)
-
-        muscle_groups = ['Chest', 'Back', 'Biceps', 'Triceps', 'Shoulders', 'Legs', 'Core']
-
-        for muscle_group in muscle_groups:
-            # Filter workouts that have this muscle group tag
-            # Group by workout_date to get unique workout dates first
-            workout_dates_with_tag = {}
-            for workout in workouts:
-                if workout['tags'] and muscle_group in workout['tags']:
-                    date = workout['workout_date']
-                    if date not in workout_dates_with_tag:
-                        workout_dates_with_tag[date] = []
-                    workout_dates_with_tag[date].append(workout)
-
-            # If there are workouts with this tag, create a sheet
-            if workout_dates_with_tag:
-                ws_muscle = wb.create_sheet(muscle_group)
-
-                # Flatten the workouts back into a list for population
-                filtered_workouts = []
-                for date in sorted(workout_dates_with_tag.keys()):
-                    filtered_workouts.extend(workout_dates_with_tag[date])
-
-                populate_workout_sheet(ws_muscle, filtered_workouts, show_tags=False)
-
-        # Cardio gets its own sheet too, same as the muscle groups above —
-        # filtered by workout_type (a real column) rather than tag text,
-        # since every cardio workout is guaranteed to have that type set
-        # even if its tags ever changed.
-        cardio_dates = {}
-        for workout in workouts:
-            is_cardio = workout['workout_type'] == 'cardio' if 'workout_type' in workout.keys() else False
-            if is_cardio:
-                date = workout['workout_date']
-                cardio_dates.setdefault(date, []).append(workout)
-
-        if cardio_dates:
-            ws_cardio = wb.create_sheet('Cardio')
-            filtered_cardio = []
-            for date in sorted(cardio_dates.keys()):
-                filtered_cardio.extend(cardio_dates[date])
-            populate_workout_sheet(ws_cardio, filtered_cardio, show_tags=False)
-
-    # Export weight logs
-    if export_weight_logs:
-        ws_weight = wb.create_sheet('Weight Logs')
-
-        # Add headers
-        ws_weight.cell(row=1, column=1, value='Date')
-        ws_weight.cell(row=1, column=2, value='Weight (lbs)')
-        ws_weight.cell(row=1, column=1).font = Font(bold=True)
-        ws_weight.cell(row=1, column=2).font = Font(bold=True)
-
-        # Get weight logs ordered by date (oldest first)
-        weight_logs = conn.execute('''
-            SELECT date, weight
-            FROM weight_logs
-            WHERE client_id = ?
-            ORDER BY date ASC
-        ''', (client_id,)).fetchall()
-
-        for idx, log in enumerate(weight_logs, start=2):
-            ws_weight.cell(row=idx, column=1, value=log['date'])
-            ws_weight.cell(row=idx, column=2, value=log['weight'])
-
-        # Adjust column widths
-        ws_weight.column_dimensions['A'].width = 15
-        ws_weight.column_dimensions['B'].width = 15
-
-    if export_nutrition_logs:
-        ws_nutrition = wb.create_sheet('Nutrition')
-
-        # Add headers
-        ws_nutrition.cell(row=1, column=1, value='Date')
-        ws_nutrition.cell(row=1, column=2, value='Diet')  # Added Diet column
-        ws_nutrition.cell(row=1, column=3, value='Calories')
-        ws_nutrition.cell(row=1, column=4, value='Sodium')
-        ws_nutrition.cell(row=1, column=5, value='Sat Fat')  # Renamed column
-        ws_nutrition.cell(row=1, column=6, value='Notes')  # Added Notes column
-        for col in range(1, 7):
-            ws_nutrition.cell(row=1, column=col).font = Font(bold=True)
-
-        # Get nutrition logs ordered by date (oldest first)
-        nutrition_logs = conn.execute('''
-            SELECT date, diet, estimated_calories, estimated_sodium, estimated_saturated_fat, notes
-            FROM nutrition_logs
-            WHERE client_id = ?
-            ORDER BY date ASC
-        ''', (client_id,)).fetchall()
-
-        for idx, log in enumerate(nutrition_logs, start=2):
-            ws_nutrition.cell(row=idx, column=1, value=log['date'])
-            ws_nutrition.cell(row=idx, column=2, value=log['diet'])
-            ws_nutrition.cell(row=idx, column=3,
-                              value=log['estimated_calories'] if log['estimated_calories'] else '')
-            ws_nutrition.cell(row=idx, column=4,
-                              value=log['estimated_sodium'] if log['estimated_sodium'] else '')
-            ws_nutrition.cell(row=idx, column=5,
-                              value=log['estimated_saturated_fat'] if log['estimated_saturated_fat'] else '')
-            ws_nutrition.cell(row=idx, column=6, value=log['notes'])
-
-        # Adjust column widths
-        ws_nutrition.column_dimensions['A'].width = 15
-        ws_nutrition.column_dimensions['B'].width = 30  # Adjusted width for Diet
-        ws_nutrition.column_dimensions['C'].width = 15
-        ws_nutrition.column_dimensions['D'].width = 15
-        ws_nutrition.column_dimensions['E'].width = 15
-        ws_nutrition.column_dimensions['F'].width = 40  # Adjusted width for Notes
-
-    if export_sleep_logs:
-        ws_sleep = wb.create_sheet('Sleep Logs')
-
-        # Add headers
-        ws_sleep.cell(row=1, column=1, value='Date')
-        ws_sleep.cell(row=1, column=2, value='Hours')
-        ws_sleep.cell(row=1, column=3, value='Notes')
-        ws_sleep.cell(row=1, column=1).font = Font(bold=True)
-        ws_sleep.cell(row=1, column=2).font = Font(bold=True)
-        ws_sleep.cell(row=1, column=3).font = Font(bold=True)
-
-        # Get sleep logs ordered by date (oldest first)
-        sleep_logs = conn.execute('''
-            SELECT date, hours, notes
-            FROM sleep_logs
-            WHERE client_id = ?
-            ORDER BY date ASC
-        ''', (client_id,)).fetchall()
-
-        for idx, log in enumerate(sleep_logs, start=2):
-            ws_sleep.cell(row=idx, column=1, value=log['date'])
-            ws_sleep.cell(row=idx, column=2, value=log['hours'])
-            ws_sleep.cell(row=idx, column=3, value=log['notes'] if log['notes'] else '')
-
-        # Adjust column widths
-        ws_sleep.column_dimensions['A'].width = 15
-        ws_sleep.column_dimensions['B'].width = 15
-        ws_sleep.column_dimensions['C'].width = 40
-
-    if export_measurements:
-        ws_measurements = wb.create_sheet('Measurements')
-
-        measurement_cols = ['neck', 'shoulders', 'chest', 'waist', 'hips', 'bicep', 'forearm', 'thigh', 'calf']
-        headers = ['Date'] + [c.capitalize() for c in measurement_cols] + ['Notes']
-        for col, header in enumerate(headers, start=1):
-            ws_measurements.cell(row=1, column=col, value=header)
-            ws_measurements.cell(row=1, column=col).font = Font(bold=True)
-
-        measurement_logs = conn.execute(f'''
-            SELECT date, {", ".join(measurement_cols)}, notes
-            FROM body_measurements
-            WHERE client_id = ?
-            ORDER BY date ASC
-        ''', (client_id,)).fetchall()
-
-        for idx, log in enumerate(measurement_logs, start=2):
-            ws_measurements.cell(row=idx, column=1, value=log['date'])
-            for col_offset, field in enumerate(measurement_cols, start=2):
-                value = log[field]
-                ws_measurements.cell(row=idx, column=col_offset, value=value if value is not None else '')
-            ws_measurements.cell(row=idx, column=len(measurement_cols) + 2, value=log['notes'] or '')
-
-        # Adjust column widths
-        ws_measurements.column_dimensions['A'].width = 15
-        for col_offset in range(2, len(measurement_cols) + 2):
-            ws_measurements.column_dimensions[ws_measurements.cell(row=1, column=col_offset).column_letter].width = 12
-        ws_measurements.column_dimensions[
-            ws_measurements.cell(row=1, column=len(measurement_cols) + 2).column_letter
-        ].width = 40
-
-    # Collect progress photo files (exported separately as actual image
-    # files, not spreadsheet rows — named by entry date since a client can
-    # only have one photo per date).
-    photo_files = []
-    if export_photos:
-        photo_rows = conn.execute('''
-            SELECT date, photo_url
-            FROM progress_photos
-            WHERE client_id = ?
-            ORDER BY date ASC
-        ''', (client_id,)).fetchall()
-
-        for row in photo_rows:
-            disk_path = os.path.join('static', row['photo_url'])
-            if not os.path.exists(disk_path):
-                continue  # File missing on disk — skip rather than fail the whole export
-            ext = os.path.splitext(row['photo_url'])[1] or '.jpg'
-            with open(disk_path, 'rb') as f:
-                photo_files.append((f"{row['date']}{ext}", f.read()))
-
-    # Save workbook to bytes
-    excel_buffer = io.BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
-
-    # Clean filename
-    safe_name = "".join(c for c in client['name'] if c.isalnum() or c in (' ', '-', '_')).strip()
-    return (safe_name, excel_buffer.read(), photo_files)
-
-
 @app.route('/exports/generate', methods=['POST'])
 @login_required
 def generate_export():
@@ -2501,24 +2043,23 @@ def generate_export():
         flash('Please select at least one export option')
         return redirect(url_for('exports'))
 
-    conn = get_db()
+    # The same client ticked twice would otherwise land in the zip twice.
+    client_ids = list(dict.fromkeys(client_ids))
+    flags = (export_workouts, export_weight_logs, export_nutrition_logs, export_sleep_logs,
+             export_measurements, export_photos)
 
-    # Build each client's workbook (+ photo files); client_ids that don't
-    # belong to this trainer (or no longer exist) are silently skipped,
-    # same as before.
-    built = []
-    for client_id in client_ids:
-        result = build_client_export_workbook(
-            conn, client_id, session['user_id'],
-            export_workouts, export_weight_logs, export_nutrition_logs, export_sleep_logs,
-            export_measurements, export_photos
-        )
-        if result:
-            built.append(result)
+    conn = get_db()
 
-    conn.close()
+    # client_ids that don't belong to this trainer (or no longer exist) are
+    # silently skipped, same as before.
+    owned = {row['id'] for row in conn.execute(
+        f'SELECT id FROM clients WHERE trainer_id = ? AND id IN ({", ".join("?" for _ in client_ids)})',
+        [session['user_id'], *client_ids]
+    )}
+    client_ids = [cid for cid in client_ids if cid in owned]
 
-    if not built:
+    if not client_ids:
+        conn.close()
         flash('No matching clients found to export')
         return redirect(url_for('exports'))
 
@@ -2527,32 +2068,63 @@ def generate_export():
     # The moment photos are involved (even for one client), a flat file
     # can't represent a "spreadsheet + photos folder" pair, so it always
     # needs a zip from that point on.
-    if len(built) == 1 and not built[0][2]:
-        safe_name, excel_bytes, _ = built[0]
+    if len(client_ids) == 1 and not (export_photos and list_photo_files(conn, client_ids[0])):
+        safe_name, wb, _ = build_client_export_workbook(conn, client_ids[0], session['user_id'], *flags)
+        conn.close()
         return send_file(
-            io.BytesIO(excel_bytes),
+            save_workbook(wb),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=f'{safe_name}.xlsx'
         )
 
-    # Every client gets their own folder inside the zip: {name}/{name}.xlsx
-    # plus {name}/photos/{date}.{ext} for each progress photo, so the
-    # spreadsheet and the photo files are clearly grouped per client instead
-    # of dumped together in one flat list.
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for safe_name, excel_bytes, photo_files in built:
-            zip_file.writestr(f'{safe_name}/{safe_name}.xlsx', excel_bytes)
-            for photo_filename, photo_bytes in photo_files:
-                zip_file.writestr(f'{safe_name}/photos/{photo_filename}', photo_bytes)
-    zip_buffer.seek(0)
+    # Anything bigger is zipped in the background (see export_jobs.py) so
+    # it can't tie up this worker or run into its timeout. The page polls
+    # the status URL and downloads the zip once it's done.
+    job_id = enqueue_export(conn, session['user_id'], client_ids, flags)
+    conn.close()
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('export_job_status', job_id=job_id)
+    }), 202
+
+
+@app.route('/exports/jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    conn = get_db()
+    purge_expired_jobs(conn)
+    conn.commit()
+    job = job_status(conn, job_id, session['user_id'])
+    conn.close()
+
+    if not job:
+        return jsonify({'error': 'Export not found'}), 404
+
+    if job['status'] == 'done':
+        job['download_url'] = url_for('download_export_job', job_id=job_id)
+    return jsonify(job)
 
+
+@app.route('/exports/jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    conn = get_db()
+    purge_expired_jobs(conn)
+    conn.commit()
+    artifact = finished_artifact(conn, job_id, session['user_id'])
+    conn.close()
+
+    if not artifact:
+        flash('That export is no longer available — please generate it again')
+        return redirect(url_for('exports'))
+
+    disk_path, filename = artifact
     return send_file(
-        zip_buffer,
+        os.path.abspath(disk_path),
         mimetype='application/zip',
         as_attachment=True,
-        download_name=f'client_exports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        download_name=filename
     )
 
 
@@ -2560,80 +2132,15 @@ def generate_export():
 @login_required
 def export_all_clients():
     conn = get_db()
-
-    clients = conn.execute('''
-        SELECT c.name, c.email, c.phone, c.age, c.gender, c.status, c.id, c.height
-        FROM clients c
-        WHERE c.trainer_id = ?
-        ORDER BY c.name ASC
-    ''', (session['user_id'],)).fetchall()
-
-    # Get latest weight log for each client
-    clients_with_weight = []
-    for client in clients:
-        latest_weight = conn.execute('''
-            SELECT weight
-            FROM weight_logs
-            WHERE client_id = ?
-            ORDER BY date DESC
-            LIMIT 1
-        ''', (client['id'],)).fetchone()
-
-        clients_with_weight.append({
-            'name': client['name'],
-            'email': client['email'],
-            'phone': client['phone'],
-            'age': client['age'],
-            'gender': client['gender'],
-            'weight': latest_weight['weight'] if latest_weight else None,
-            'height': client['height'],
-            'status': client['status']
-        })
-
+    wb = build_all_clients_workbook(conn, session['user_id'])
     conn.close()
 
-    if not clients_with_weight:
+    if wb is None:
         flash('No clients found to export')
         return redirect(url_for('exports'))
 
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'All Clients'
-
-    # Add headers
-    headers = ['Name', 'Email', 'Phone', 'Age', 'Gender', 'Weight (lbs)', 'Height', 'Status']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True)
-
-    for row_num, client in enumerate(clients_with_weight, 2):
-        ws.cell(row=row_num, column=1, value=client['name'])
-        ws.cell(row=row_num, column=2, value=client['email'])
-        ws.cell(row=row_num, column=3, value=client['phone'])
-        ws.cell(row=row_num, column=4, value=client['age'])
-        ws.cell(row=row_num, column=5, value=client['gender'])
-        ws.cell(row=row_num, column=6, value=client['weight'])
-        ws.cell(row=row_num, column=7, value=client['height'])
-        ws.cell(row=row_num, column=8, value=client['status'])
-
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 25
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 10
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 15
-    ws.column_dimensions['G'].width = 12
-    ws.column_dimensions['H'].width = 12
-
-    # Save to bytes
-    excel_buffer = io.BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
-
     return send_file(
-        excel_buffer,
+        save_workbook(wb),
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
         download_name=f'all_clients_{datetime.now().strftime("%Y%m%d")}.xlsx'
@@ -2669,17 +2176,12 @@ def create_template():
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (template_id, session['user_id'], client_id, template_name, workout_type, datetime.now()))
 
-        # Add exercises to template
-        for exercise in exercises:
-            exercise_id = str(uuid.uuid4())
-            conn.execute('''
-                INSERT INTO template_exercises (id, template_id, exercise_name, sets_data, notes, exercise_order)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (exercise_id, template_id, exercise['name'],
-                  json.dumps(exercise['sets']), exercise.get('notes', ''), exercise['order']))
+        # Version 1, a snapshot of every exercise
+        save_template_version(conn, template_id, exercises)
 
         conn.commit()
         conn.close()
+        invalidate_templates(session['user_id'])
         return jsonify({'success': True, 'template_id': template_id})
     except Exception as e:
         conn.close()
@@ -2689,37 +2191,88 @@ def create_template():
 @app.route('/api/templates/<template_id>', methods=['GET'])
 @login_required
 def get_template(template_id):
+    """One template with its exercises, from the trainer's cached catalogue
+    (template_catalog.py). Answers 304 when the browser already has it."""
     conn = get_db()
-    template = conn.execute('''
-        SELECT * FROM workout_templates
-        WHERE id = ? AND trainer_id = ?
-    ''', (template_id, session['user_id'])).fetchone()
+    catalog = trainer_templates(conn, session['user_id'])
+    conn.close()
+    if template_id not in catalog['by_id']:
+        return jsonify({'error': 'Template not found'}), 404
+
+    template, etag = catalog['by_id'][template_id]
+    unchanged = not_modified(request, etag, None)
+    if unchanged:
+        return unchanged
+    return with_validators(jsonify(template), etag, None)
 
+
+@app.route('/api/templates/<template_id>/assign', methods=['POST'])
+@login_required
+def assign_template(template_id):
+    """Log a template as the same workout for many clients at once (group
+    classes). JSON: {client_ids: [...], date, tags, override}.
+
+    Every client is checked against this trainer in one query, and every
+    client's workout goes in in one transaction, so either all of them are
+    assigned or none is. As when logging one workout, a client who already
+    has a workout of this type that day is a conflict unless `override` is
+    set. The 409 lists each such client and nothing is written. Resend with
+    `override`, or without those clients. The workouts record the template
+    version they were assigned from.
+    """
+    data = request.get_json(silent=True) or {}
+    workout_date = data.get('date')
+    client_ids = list(dict.fromkeys(data.get('client_ids') or []))
+    override = data.get('override', False)
+    if not workout_date or not client_ids:
+        return jsonify({'error': 'Missing date or clients'}), 400
+    if len(client_ids) > BULK_ASSIGN_MAX_CLIENTS:
+        return jsonify({'error': f'Assign to at most {BULK_ASSIGN_MAX_CLIENTS} clients at a time'}), 400
+
+    conn = get_db()
+    template = conn.execute('SELECT * FROM workout_templates WHERE id = ? AND trainer_id = ?',
+                            (template_id, session['user_id'])).fetchone()
     if not template:
         conn.close()
         return jsonify({'error': 'Template not found'}), 404
 
-    exercises = conn.execute('''
-        SELECT exercise_name, sets_data, notes, exercise_order
-        FROM template_exercises
-        WHERE template_id = ?
-        ORDER BY exercise_order
-    ''', (template_id,)).fetchall()
+    placeholders = ', '.join('?' for _ in client_ids)
+    names = {row['id']: row['name'] for row in conn.execute(
+        f'SELECT id, name FROM clients WHERE trainer_id = ? AND id IN ({placeholders})',
+        (session['user_id'], *client_ids))}
+    missing = [client_id for client_id in client_ids if client_id not in names]
+    if missing:
+        conn.close()
+        return jsonify({'error': 'Client not found', 'client_ids': missing}), 404
+    if template['client_id'] and client_ids != [template['client_id']]:
+        conn.close()
+        return jsonify({'error': "This template belongs to one client; use a universal template"}), 400
 
-    conn.close()
+    workout_type = workout_type_from(template['workout_type'])
+    try:
+        exercises = exercises_from_json(version_exercises(conn, template['version_id']), workout_type)
+    except ValueError:
+        conn.close()
+        return jsonify({'error': 'Template sets must be numbers'}), 400
+    if not exercises:
+        conn.close()
+        return jsonify({'error': 'Template has no exercises'}), 400
 
-    return jsonify({
-        'id': template['id'],
-        'name': template['name'],
-        'client_id': template['client_id'] if 'client_id' in template.keys() else None,
-        'workout_type': template['workout_type'] if 'workout_type' in template.keys() else 'weightlifting',
-        'exercises': [{
-            'name': ex['exercise_name'],
-            'sets': json.loads(ex['sets_data']) if ex['sets_data'] else [],
-            'notes': ex['notes'],
-            'order': ex['exercise_order']
-        } for ex in exercises]
-    })
+    if not override:
+        taken = clients_with_workout(conn, client_ids, workout_date, workout_type)
+        if taken:
+            conn.close()
+            return jsonify({
+                'conflict': True,
+                'conflicts': [{'client_id': client_id, 'name': names[client_id]}
+                              for client_id in client_ids if client_id in taken],
+            }), 409
+
+    insert_workouts(conn, client_ids, session['user_id'], workout_date, workout_type,
+                    data.get('tags', ''), exercises, template['version_id'])
+    conn.commit()
+    conn.close()
+    return jsonify({'success': True, 'assigned': len(client_ids)})
 
 
 @app.route('/api/templates/<template_id>', methods=['DELETE'])
@@ -2736,11 +2289,12 @@ def delete_template(template_id):
         return jsonify({'error': 'Template not found'}), 404
 
     try:
-        conn.execute('DELETE FROM template_exercises WHERE template_id = ?', (template_id,))
+        delete_template_versions(conn, template_id)
         conn.execute('DELETE FROM workout_templates WHERE id = ? AND trainer_id = ?',
                      (template_id, session['user_id']))
         conn.commit()
         conn.close()
+        invalidate_templates(session['user_id'])
         return jsonify({'success': True})
     except Exception as e:
         conn.close()
@@ -2784,20 +2338,12 @@ def update_template(template_id):
             WHERE id = ? AND trainer_id = ?
         ''', (template_name, client_id, datetime.now(), template_id, session['user_id']))
 
-        # Delete existing exercises
-        conn.execute('DELETE FROM template_exercises WHERE template_id = ?', (template_id,))
-
-        # Add updated exercises
-        for exercise in exercises:
-            exercise_id = str(uuid.uuid4())
-            conn.execute('''
-                INSERT INTO template_exercises (id, template_id, exercise_name, sets_data, notes, exercise_order)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (exercise_id, template_id, exercise['name'],
-                  json.dumps(exercise['sets']), exercise.get('notes', ''), exercise['order']))
+        # A new version holding only the exercises that changed, if any did
+        save_template_version(conn, template_id, exercises)
 
         conn.commit()
         conn.close()
+        invalidate_templates(session['user_id'])
         return jsonify({'success': True})
     except Exception as e:
         conn.close()
@@ -2820,37 +2366,26 @@ def list_templates():
     if workout_type not in ('weightlifting', 'cardio'):
         workout_type = None
     conn = get_db()
+    catalog = trainer_templates(conn, session['user_id'])
+    conn.close()
 
-    if client_id:
-        query = '''
-            SELECT id, name, client_id, workout_type
-            FROM workout_templates
-            WHERE trainer_id = ? AND (client_id IS NULL OR client_id = ?)
-        '''
-        params = [session['user_id'], client_id]
-    else:
-        query = '''
-            SELECT id, name, client_id, workout_type
-            FROM workout_templates
-            WHERE trainer_id = ? AND client_id IS NULL
-        '''
-        params = [session['user_id']]
-
-    if workout_type:
-        query += ' AND workout_type = ?'
-        params.append(workout_type)
+    templates, etag = template_listing(catalog, client_id, workout_type)
+    unchanged = not_modified(request, etag, None)
+    if unchanged:
+        return unchanged
+    return with_validators(jsonify(templates), etag, None)
 
-    query += ' ORDER BY client_id IS NULL, name COLLATE NOCASE' if client_id else ' ORDER BY name COLLATE NOCASE'
 
-    templates = conn.execute(query, params).fetchall()
-    conn.close()
+NUTRITION_LOGS_SQL = '''
+    SELECT id, date, diet, estimated_calories, estimated_sodium, estimated_saturated_fat, notes
+    FROM nutrition_logs
+    WHERE client_id = ?
+'''
 
-    return jsonify([{
-        'id': t['id'],
-        'name': t['name'],
-        'is_client_specific': bool(t['client_id']),
-        'workout_type': t['workout_type'] if 'workout_type' in t.keys() else 'weightlifting'
-    } for t in templates])
+NUTRITION_SERIES_SQL = '''
+    SELECT date, estimated_calories, estimated_protein, estimated_sodium, estimated_saturated_fat
+    FROM nutrition_logs WHERE client_id = ? ORDER BY date
+'''
 
 
 @app.route('/clients/<client_id>/nutrition-logs')
@@ -2864,20 +2399,26 @@ def client_nutrition_logs(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    nutrition_history_rows = conn.execute('''
-        SELECT id, date, diet, estimated_calories, estimated_sodium, estimated_saturated_fat, notes
-        FROM nutrition_logs
-        WHERE client_id = ?
-        ORDER BY date DESC
-    ''', (client_id,)).fetchall()
+    nutrition_history_rows, next_cursor = keyset_page(conn, NUTRITION_LOGS_SQL, (client_id,), LOG_PAGE_ORDER,
+                                                      request.args.get('cursor'))
 
     nutrition_history = [dict(row) for row in nutrition_history_rows]
 
+    if wants_next_page():
+        conn.close()
+        return next_page_response('dashboard/clients/_nutrition_rows.html', next_cursor,
+                                  nutrition_history=nutrition_history)
+
+    # Every entry for the chart, plotted columns only.
+    nutrition_series = [dict(row) for row in conn.execute(NUTRITION_SERIES_SQL, (client_id,))]
+
     conn.close()
 
     return render_template('dashboard/clients/nutrition_logs.html',
                            client=client,
-                           nutrition_history=nutrition_history)
+                           nutrition_history=nutrition_history,
+                           nutrition_series=nutrition_series,
+                           next_cursor=next_cursor)
 
 
 @app.route('/api/nutrition-log', methods=['POST'])
@@ -3017,6 +2558,15 @@ def delete_nutrition_log(nutrition_id):
         return jsonify({'error': str(e)}), 500
 
 
+SLEEP_LOGS_SQL = '''
+    SELECT id, date, hours, notes
+    FROM sleep_logs
+    WHERE client_id = ?
+'''
+
+SLEEP_SERIES_SQL = 'SELECT date, hours FROM sleep_logs WHERE client_id = ? ORDER BY date'
+
+
 @app.route('/clients/<client_id>/sleep-logs')
 @login_required
 def client_sleep_logs(client_id):
@@ -3028,12 +2578,8 @@ def client_sleep_logs(client_id):
         flash('Client not found')
         return redirect(url_for('clients'))
 
-    sleep_history_rows = conn.execute('''
-        SELECT id, date, hours, notes
-        FROM sleep_logs
-        WHERE client_id = ?
-        ORDER BY date DESC
-    ''', (client_id,)).fetchall()
+    sleep_history_rows, next_cursor = keyset_page(conn, SLEEP_LOGS_SQL, (client_id,), LOG_PAGE_ORDER,
+                                                  request.args.get('cursor'))
 
     app.logger.info(f"[v0] Fetching sleep logs for client {client_id}")
     app.logger.info(f"[v0] Found {len(sleep_history_rows)} sleep log entries")
@@ -3043,10 +2589,20 @@ def client_sleep_logs(client_id):
     for entry in sleep_history:
         app.logger.info(f"[v0] Sleep entry: id={entry.get('id')}, date={entry.get('date')}, hours={entry.get('hours')}")
 
+    if wants_next_page():
+        conn.close()
+        return next_page_response('dashboard/clients/_sleep_rows.html', next_cursor,
+                                  sleep_history=sleep_history)
+
+    # Every entry for the chart, plotted columns only.
+    sleep_series = [dict(row) for row in conn.execute(SLEEP_SERIES_SQL, (client_id,))]
+
     conn.close()
     return render_template('dashboard/clients/sleep_logs.html',
                            client=dict(client),
-                           sleep_history=sleep_history)
+                           sleep_history=sleep_history,
+                           sleep_series=sleep_series,
+                           next_cursor=next_cursor)
 
 
 @app.route('/api/sleep-log', methods=['POST'])
@@ -3319,44 +2875,30 @@ def import_sleep_logs():
 # ════════════════════════════════════════════════════════
 # CLIENT PORTAL — routes live in clients.py
 # ════════════════════════════════════════════════════════
-from clients import (
-    register_client_routes,
-    init_client_accounts_table,
-    backfill_client_access_codes,
-    init_activity_log_table,
-    init_nutrition_protein_column,
-)
+from clients import register_client_routes, backfill_client_access_codes
+from migrations import run_migrations
 
 register_client_routes(app)
 
-# Ensure the activity_log table exists even under WSGI (PythonAnywhere never runs
-# the __main__ block). CREATE TABLE IF NOT EXISTS is idempotent, so this is safe.
-init_activity_log_table()
-# Ensure nutrition_logs has the estimated_protein column (idempotent migration).
-# This also runs at module level so it applies under WSGI and protects against
-# any database file being swapped/imported without the column.
-init_nutrition_protein_column()
-# Ensure workout_templates has the client_id column (universal vs client-specific).
-init_template_client_column()
-# Ensure workout_logs has the workout_type column (weightlifting vs cardio).
-init_workout_type_column()
-# Ensure workout_templates has the workout_type column too (weightlifting vs cardio templates).
-init_template_type_column()
-# Ensure the progress_photos and body_measurements tables exist.
-init_progress_photos_table()
-init_body_measurements_table()
+
+def init_app():
+    """Bring the schema up to date and load the in-process caches.
+
+    Once the database is current the migrations are a single
+    PRAGMA user_version read.
+    """
+    run_migrations()
+    register_exercise_index(app)
+    register_activity_log(app)
+
+
+# Runs at import so it also applies under WSGI (PythonAnywhere never runs
+# the __main__ block), but not in the export worker processes: those are
+# spawned, and a spawned child re-imports the parent's __main__ module.
+if multiprocessing.parent_process() is None:
+    init_app()
 
 
 if __name__ == '__main__':
-    from init_db import init_database
-    init_database()
-    init_client_accounts_table()
     backfill_client_access_codes()
-    init_activity_log_table()
-    init_nutrition_protein_column()
-    init_template_client_column()
-    init_workout_type_column()
-    init_template_type_column()
-    init_progress_photos_table()
-    init_body_measurements_table()
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,113 @@
+"""Sessions over a date range, for the calendar views and its JSON feed.
+
+Every calendar view (week, month, or an arbitrary start/end) is one range
+query over idx_sessions_trainer_date. The feed at /api/calendar/sessions
+returns the same rows as JSON and supports conditional requests.
+Recurring series are expanded into the range as it's read (recurrence.py).
+
+users.calendar_version is bumped by triggers (migrations.py) on every
+insert, update or delete of a trainer's sessions, and when one of their
+clients is renamed, since the feed shows client names, and on writes to
+their session series and series exceptions.
+users.calendar_changed_at records when that happened. A feed's ETag is
+built from the version and the range, and its Last-Modified is
+calendar_changed_at. An unchanged range is answered 304 after a
+primary-key lookup on users, without running the range query. (The newest
+sessions.updated_at alone would miss deletes, which leave no row behind.)
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from flask import make_response
+from werkzeug.exceptions import BadRequest
+from werkzeug.http import is_resource_modified
+
+from recurrence import trainer_occurrences
+
+# Longest range one request may ask for.
+MAX_RANGE_DAYS = 92
+
+SESSIONS_IN_RANGE_SQL = '''
+    SELECT s.id, s.client_id, c.name AS client_name, s.session_date, s.start_time, s.end_time,
+           s.session_type, s.status, s.notes, s.series_id
+    FROM sessions s
+    JOIN clients c ON s.client_id = c.id
+    WHERE s.trainer_id = ? AND s.session_date BETWEEN ? AND ?
+    ORDER BY s.session_date, s.start_time
+'''
+
+CALENDAR_VERSION_SQL = 'SELECT calendar_version, calendar_changed_at FROM users WHERE id = ?'
+
+
+def parse_range(start, end):
+    """(start, end) dates from ISO strings. Raises BadRequest if either is
+    missing or malformed, end is before start, or the range is too long."""
+    try:
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+    except (TypeError, ValueError):
+        raise BadRequest('start and end must be YYYY-MM-DD dates')
+    if end < start:
+        raise BadRequest('end is before start')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise BadRequest(f'Ranges are limited to {MAX_RANGE_DAYS} days')
+    return start, end
+
+
+def month_grid(month_start):
+    """First and last day of the Monday-to-Sunday weeks covering the month
+    that starts on `month_start`."""
+    next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    month_end = next_month - timedelta(days=1)
+    return (month_start - timedelta(days=month_start.weekday()),
+            month_end + timedelta(days=6 - month_end.weekday()))
+
+
+def sessions_in_range(conn, trainer_id, start, end):
+    """A trainer's sessions from start to end as dicts, booked sessions and
+    series occurrences together, ordered by date and start time."""
+    sessions = [dict(row) for row in conn.execute(
+        SESSIONS_IN_RANGE_SQL, (trainer_id, start.isoformat(), end.isoformat()))]
+    occurrences = trainer_occurrences(conn, trainer_id, start, end)
+    if occurrences:
+        sessions += occurrences
+        sessions.sort(key=lambda s: (s['session_date'], s['start_time']))
+    return sessions
+
+
+def sessions_by_day(conn, trainer_id, start, end):
+    """{'YYYY-MM-DD': [sessions]} for every day from start to end, days
+    without sessions included."""
+    days = {(start + timedelta(days=i)).isoformat(): [] for i in range((end - start).days + 1)}
+    for row in sessions_in_range(conn, trainer_id, start, end):
+        days.setdefault(row['session_date'], []).append(row)
+    return days
+
+
+def calendar_validators(conn, trainer_id, start, end):
+    """(etag, last_modified) for a trainer's sessions over a range."""
+    row = conn.execute(CALENDAR_VERSION_SQL, (trainer_id,)).fetchone()
+    version = row['calendar_version'] if row else 0
+    etag = hashlib.sha1(f'{trainer_id}:{version}:{start}:{end}'.encode()).hexdigest()
+    last_modified = None
+    if row and row['calendar_changed_at']:
+        last_modified = datetime.strptime(row['calendar_changed_at'], '%Y-%m-%d %H:%M:%S') \
+            .replace(tzinfo=timezone.utc)
+    return etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 for `request` if it already has this version, else None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = make_response('', 304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    """Set the validators, and make the browser revalidate every use."""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,32 @@
+"""Latest-metric columns denormalized onto clients.
+
+clients.latest_weight and clients.latest_weight_date hold the client's
+most recent weight_logs entry, so the clients list and the client
+directory export read them straight off the row. They used to run a
+latest-weight subquery (or a separate query) for every client.
+
+Every route that writes or deletes weight_logs calls
+refresh_latest_weight() for the client it touched, in the same
+transaction. The recompute is a single indexed lookup, so editing or
+deleting an older entry is handled the same way as logging a new one.
+"""
+
+
+REFRESH_LATEST_WEIGHT_SQL = '''
+    UPDATE clients
+    SET (latest_weight, latest_weight_date) = (
+        SELECT weight, date FROM weight_logs
+        WHERE client_id = clients.id
+        ORDER BY date DESC
+        LIMIT 1
+    )
+    WHERE id = ?
+'''
+
+
+def refresh_latest_weight(conn, client_id):
+    """Recompute one client's latest_weight / latest_weight_date from weight_logs.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    conn.execute(REFRESH_LATEST_WEIGHT_SQL, (client_id,))
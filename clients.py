@@ -5,8 +5,8 @@ This module keeps endpoint names identical to when they lived in app.py
 url_for('client_login'), etc. keep working without any changes.
 
 Call register_client_routes(app) from app.py to attach all routes.
-The two table-setup helpers are module-level so app.py can import them
-for startup initialization.
+The portal's tables are created by migrations.py; backfill_client_access_codes
+stays module-level so app.py can run it at startup.
 """
 from flask import (
     render_template, request, redirect, url_for, flash, session, jsonify
@@ -14,48 +14,71 @@ from flask import (
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import uuid
-import json
 import os
 
 from db import get_db
+from records import exercise_key
+from workout_sets import load_sets
+from workouts import (workout_type_from, exercises_from_json, workout_exists, insert_workout,
+                      edit_workout, remove_workout, copy_workout)
+from client_metrics import refresh_latest_weight
 from auth_utils import login_required, client_login_required
+from pagination import keyset_page, wants_next_page, next_page_response
+from recurrence import merge_upcoming
+from activity import log_activity
+
+PORTAL_LATEST_WEIGHT_SQL = '''
+    SELECT weight, date FROM weight_logs
+    WHERE client_id = ? ORDER BY date DESC LIMIT 1
+'''
+
+PORTAL_RECENT_WORKOUTS_SQL = '''
+    SELECT workout_date, COUNT(*) as exercise_count
+    FROM workout_logs WHERE client_id = ?
+    GROUP BY workout_date ORDER BY workout_date DESC LIMIT 5
+'''
+
+PORTAL_UPCOMING_SQL = '''
+    SELECT session_date, start_time, end_time, session_type, status
+    FROM sessions
+    WHERE client_id = ? AND session_date >= ? AND status != 'cancelled'
+    ORDER BY session_date, start_time LIMIT 3
+'''
+
+PORTAL_LATEST_SLEEP_SQL = '''
+    SELECT hours, date FROM sleep_logs
+    WHERE client_id = ? ORDER BY date DESC LIMIT 1
+'''
+
+PORTAL_WORKOUTS_SQL = '''
+    SELECT workout_date, workout_type, COUNT(*) as exercise_count
+    FROM workout_logs WHERE client_id = ?
+'''
+PORTAL_WORKOUTS_ORDER = [('workout_date', 'workout_date', 'DESC'), ('workout_type', 'workout_type', 'ASC')]
+PORTAL_WORKOUTS_GROUP_BY = 'workout_date, workout_type'
+
+# {type}: the optional workout_type filter.
+PORTAL_WORKOUT_SQL = '''
+    SELECT id, exercise_name, notes, tags, workout_type
+    FROM workout_logs
+    WHERE client_id = ? AND workout_date = ?{type}
+    ORDER BY created_at
+'''
+
+# {exclude}: the optional exclude_date condition.
+PORTAL_EXERCISE_HISTORY_SQL = '''
+    SELECT id, exercise_name, notes, workout_date, workout_type
+    FROM workout_logs
+    WHERE client_id = ? AND workout_type = ?
+      AND exercise_key = ?{exclude}
+    ORDER BY workout_date DESC, created_at DESC
+    LIMIT 1
+'''
+
+PERM_WORKOUTS_SQL = 'SELECT perm_workouts FROM client_accounts WHERE client_id = ?'
 
 
 
-def init_client_accounts_table():
-    """Create client_accounts table if it doesn't exist. Call at startup."""
-    conn = get_db()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS client_accounts (
-            id            TEXT PRIMARY KEY,
-            client_id     TEXT NOT NULL,
-            access_code   TEXT NOT NULL UNIQUE,
-            password_hash TEXT,
-            is_active     INTEGER DEFAULT 1,
-            theme         TEXT DEFAULT 'light',
-            created_at    TIMESTAMP,
-            last_login    TIMESTAMP,
-            FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE CASCADE
-        )
-    ''')
-    # Safely add columns that may not exist in older DBs
-    migrations = [
-        "ALTER TABLE client_accounts ADD COLUMN theme TEXT DEFAULT 'light'",
-        "ALTER TABLE client_accounts ADD COLUMN perm_workouts INTEGER DEFAULT 1",
-        "ALTER TABLE client_accounts ADD COLUMN perm_weight INTEGER DEFAULT 1",
-        "ALTER TABLE client_accounts ADD COLUMN perm_nutrition INTEGER DEFAULT 1",
-        "ALTER TABLE client_accounts ADD COLUMN perm_sleep INTEGER DEFAULT 1",
-        "ALTER TABLE client_accounts ADD COLUMN perm_photos INTEGER DEFAULT 1",
-        "ALTER TABLE client_accounts ADD COLUMN perm_measurements INTEGER DEFAULT 1",
-    ]
-    for sql in migrations:
-        try:
-            conn.execute(sql)
-        except Exception:
-            pass  # Column already exists
-    conn.commit()
-    conn.close()
-
 def backfill_client_access_codes():
     """Auto-generate portal access codes for any existing client without one."""
     import random, string
@@ -89,80 +112,6 @@ def backfill_client_access_codes():
 
 
 
-def init_nutrition_protein_column():
-    """Add the estimated_protein column to nutrition_logs if it is missing.
-
-    Safe to run on every startup: the ALTER TABLE is wrapped so an
-    already-existing column (OperationalError) is simply ignored.
-    """
-    conn = get_db()
-    try:
-        conn.execute('ALTER TABLE nutrition_logs ADD COLUMN estimated_protein REAL')
-        conn.commit()
-        print('[nutrition] added estimated_protein column')
-    except Exception:
-        # Column already exists — nothing to do.
-        pass
-    finally:
-        conn.close()
-
-def init_activity_log_table():
-    """Create the activity_log table that records client portal actions.
-
-    Each row is one event the trainer should see in their activity stream:
-    a client creating/editing/deleting a workout, weight, sleep, or nutrition entry.
-    """
-    conn = get_db()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id           TEXT PRIMARY KEY,
-            trainer_id   TEXT NOT NULL,
-            client_id    TEXT NOT NULL,
-            client_name  TEXT,
-            category     TEXT NOT NULL,
-            action       TEXT NOT NULL,
-            detail       TEXT,
-            created_at   TIMESTAMP NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-
-def log_activity(conn, client_id, category, action, detail=''):
-    """Insert one activity-stream event using the caller's open connection so it
-    shares the same transaction (the calling route commits).
-
-    Looks up trainer_id + client name from the clients table so the trainer's
-    stream can be filtered and labelled cheaply at read time. Never raises —
-    activity logging must not break the underlying action.
-    """
-    try:
-        row = conn.execute(
-            'SELECT trainer_id, name FROM clients WHERE id = ?',
-            (client_id,)
-        ).fetchone()
-        if not row:
-            return
-        # Support both sqlite3.Row (by-name) and plain tuple rows.
-        try:
-            trainer_id = row['trainer_id']
-            client_name = row['name']
-        except (TypeError, IndexError):
-            trainer_id = row[0]
-            client_name = row[1]
-        if not trainer_id:
-            return
-        conn.execute('''
-            INSERT INTO activity_log
-            (id, trainer_id, client_id, client_name, category, action, detail, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (str(uuid.uuid4()), trainer_id, client_id, client_name,
-              category, action, detail, datetime.utcnow()))
-    except Exception as e:
-        print(f"[activity] log_activity failed: {e}")
-
-
 def register_client_routes(app):
     """Attach all client-portal routes to the given Flask app."""
 
@@ -516,31 +465,19 @@ def register_client_routes(app):
         ).fetchone()
 
         # Latest weight
-        latest_weight = conn.execute('''
-            SELECT weight, date FROM weight_logs
-            WHERE client_id = ? ORDER BY date DESC LIMIT 1
-        ''', (client_id,)).fetchone()
+        latest_weight = conn.execute(PORTAL_LATEST_WEIGHT_SQL, (client_id,)).fetchone()
 
         # Recent workouts
-        recent_workouts = conn.execute('''
-            SELECT workout_date, COUNT(*) as exercise_count
-            FROM workout_logs WHERE client_id = ?
-            GROUP BY workout_date ORDER BY workout_date DESC LIMIT 5
-        ''', (client_id,)).fetchall()
+        recent_workouts = conn.execute(PORTAL_RECENT_WORKOUTS_SQL, (client_id,)).fetchall()
 
         # Upcoming sessions
-        upcoming_sessions = conn.execute('''
-            SELECT session_date, start_time, end_time, session_type, status
-            FROM sessions
-            WHERE client_id = ? AND session_date >= date('now') AND status != 'cancelled'
-            ORDER BY session_date, start_time LIMIT 3
-        ''', (client_id,)).fetchall()
+        # Local date, the same clock merge_upcoming() expands series from.
+        today = datetime.now().date()
+        upcoming_sessions = conn.execute(PORTAL_UPCOMING_SQL, (client_id, today.isoformat())).fetchall()
+        upcoming_sessions = merge_upcoming(conn, upcoming_sessions, 3, client_id=client_id, today=today)
 
         # Latest sleep
-        latest_sleep = conn.execute('''
-            SELECT hours, date FROM sleep_logs
-            WHERE client_id = ? ORDER BY date DESC LIMIT 1
-        ''', (client_id,)).fetchone()
+        latest_sleep = conn.execute(PORTAL_LATEST_SLEEP_SQL, (client_id,)).fetchone()
 
         conn.close()
 
@@ -557,17 +494,16 @@ def register_client_routes(app):
         client_id = session['client_id']
         conn = get_db()
         client = conn.execute('SELECT * FROM clients WHERE id = ?', (client_id,)).fetchone()
-        workouts = conn.execute('''
-            SELECT workout_date, workout_type, COUNT(*) as exercise_count
-            FROM workout_logs WHERE client_id = ?
-            GROUP BY workout_date, workout_type ORDER BY workout_date DESC, workout_type
-        ''', (client_id,)).fetchall()
-        acct = conn.execute(
-            'SELECT perm_workouts FROM client_accounts WHERE client_id = ?', (client_id,)
-        ).fetchone()
+        workouts, next_cursor = keyset_page(conn, PORTAL_WORKOUTS_SQL, (client_id,), PORTAL_WORKOUTS_ORDER,
+                                            request.args.get('cursor'), group_by=PORTAL_WORKOUTS_GROUP_BY)
+        acct = conn.execute(PERM_WORKOUTS_SQL, (client_id,)).fetchone()
         can_edit = bool(acct and acct['perm_workouts'])
         conn.close()
-        return render_template('client/workouts.html', client=client, workouts=workouts, can_edit=can_edit)
+        if wants_next_page():
+            return next_page_response('client/_workout_rows.html', next_cursor,
+                                      workouts=workouts, can_edit=can_edit)
+        return render_template('client/workouts.html', client=client, workouts=workouts,
+                               can_edit=can_edit, next_cursor=next_cursor)
 
     @app.route('/client-portal/workouts/<date>')
     @client_login_required
@@ -578,29 +514,20 @@ def register_client_routes(app):
         # this date" (kept for backward compatibility with any older caller).
         workout_type = request.args.get('type')
         if workout_type in ('weightlifting', 'cardio'):
-            exercises = conn.execute('''
-                SELECT id, exercise_name, sets_data, notes, tags, workout_type
-                FROM workout_logs
-                WHERE client_id = ? AND workout_date = ? AND workout_type = ?
-                ORDER BY created_at
-            ''', (client_id, date, workout_type)).fetchall()
+            exercises = conn.execute(PORTAL_WORKOUT_SQL.format(type=' AND workout_type = ?'),
+                                     (client_id, date, workout_type)).fetchall()
         else:
-            exercises = conn.execute('''
-                SELECT id, exercise_name, sets_data, notes, tags, workout_type
-                FROM workout_logs
-                WHERE client_id = ? AND workout_date = ?
-                ORDER BY created_at
-            ''', (client_id, date)).fetchall()
+            exercises = conn.execute(PORTAL_WORKOUT_SQL.format(type=''), (client_id, date)).fetchall()
+        sets_by_log = load_sets(conn, exercises)
         conn.close()
 
         result = []
         for ex in exercises:
-            sets_data = json.loads(ex['sets_data']) if ex['sets_data'] else None
             result.append({
                 'id': ex['id'],
                 'exercise_name': ex['exercise_name'],
                 'notes': ex['notes'],
-                'sets_data': sets_data,
+                'sets_data': sets_by_log.get(ex['id']),
                 'tags': ex['tags'] or '',
                 'workout_type': ex['workout_type'] if 'workout_type' in ex.keys() else 'weightlifting'
             })
@@ -624,38 +551,27 @@ def register_client_routes(app):
             workout_type = 'weightlifting'
 
         conn = get_db()
-        params = [client_id, workout_type, name.lower()]
+        params = [client_id, workout_type, exercise_key(name)]
         exclude_clause = ''
         if exclude_date:
             exclude_clause = ' AND workout_date != ?'
             params.append(exclude_date)
 
-        row = conn.execute(f'''
-            SELECT exercise_name, sets_data, notes, workout_date
-            FROM workout_logs
-            WHERE client_id = ? AND workout_type = ?
-              AND LOWER(exercise_name) = ?{exclude_clause}
-            ORDER BY workout_date DESC, created_at DESC
-            LIMIT 1
-        ''', params).fetchone()
-        conn.close()
+        row = conn.execute(PORTAL_EXERCISE_HISTORY_SQL.format(exclude=exclude_clause), params).fetchone()
 
         if not row:
+            conn.close()
             return jsonify({'found': False}), 200
 
-        sets_data = None
-        if row['sets_data']:
-            try:
-                sets_data = json.loads(row['sets_data'])
-            except:
-                sets_data = None
+        sets_data = load_sets(conn, [row]).get(row['id'], [])
+        conn.close()
 
         return jsonify({
             'found': True,
             'exercise_name': row['exercise_name'],
             'workout_date': row['workout_date'],
             'notes': row['notes'] or '',
-            'sets_data': sets_data or []
+            'sets_data': sets_data
         })
 
     @app.route('/client-portal/api/workouts', methods=['POST'])
@@ -664,7 +580,7 @@ def register_client_routes(app):
         client_id = session['client_id']
         conn = get_db()
         try:
-            acct = conn.execute('SELECT perm_workouts FROM client_accounts WHERE client_id = ?', (client_id,)).fetchone()
+            acct = conn.execute(PERM_WORKOUTS_SQL, (client_id,)).fetchone()
             if not acct or not acct['perm_workouts']:
                 conn.close()
                 return jsonify({'error': 'Permission denied'}), 403
@@ -672,55 +588,21 @@ def register_client_routes(app):
             trainer_id = client_row['trainer_id'] if client_row else None
             data = request.get_json()
             workout_date = data.get('date')
-            exercises    = data.get('exercises', [])
-            workout_tags = data.get('tags', '')
             override     = data.get('override', False)
-            workout_type = data.get('workout_type', 'weightlifting')
-            if workout_type not in ('weightlifting', 'cardio'):
-                workout_type = 'weightlifting'
+            workout_type = workout_type_from(data.get('workout_type'))
+            try:
+                exercises = exercises_from_json(data.get('exercises'), workout_type)
+            except ValueError:
+                conn.close()
+                return jsonify({'error': 'Sets must be numbers'}), 400
             if not workout_date or not exercises:
                 conn.close()
                 return jsonify({'error': 'Missing date or exercises'}), 400
 
-            # Cardio workouts always carry a "Cardio" tag that can't be
-            # removed from the form — enforced here regardless of what was
-            # submitted, so the only way to get rid of it is deleting the
-            # whole workout.
-            if workout_type == 'cardio':
-                tag_list = [t.strip() for t in workout_tags.split(',') if t.strip()]
-                if 'Cardio' not in tag_list:
-                    tag_list.append('Cardio')
-                workout_tags = ','.join(tag_list)
-
-            if not override:
-                existing = conn.execute(
-                    'SELECT 1 FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ? LIMIT 1',
-                    (client_id, workout_date, workout_type)
-                ).fetchone()
-                if existing:
-                    conn.close()
-                    return jsonify({'conflict': True}), 409
-            for ex in exercises:
-                if workout_type == 'cardio':
-                    sets = ex.get('sets', []) or [{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-                    total_sets = len(sets)
-                    conn.execute('''
-                        INSERT INTO workout_logs
-                        (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, trainer_id, ex['name'], total_sets, None, None,
-                          ex.get('notes', ''), workout_date, json.dumps(sets), workout_tags, workout_type, datetime.now()))
-                else:
-                    sets = ex.get('sets', []) or [{'weight': None, 'reps': None}]
-                    total_sets = len(sets)
-                    avg_weight = (sum(s['weight'] for s in sets if s.get('weight')) / len([s for s in sets if s.get('weight')])) if any(s.get('weight') for s in sets) else None
-                    avg_reps   = (sum(s['reps'] for s in sets if s.get('reps')) // len([s for s in sets if s.get('reps')])) if any(s.get('reps') for s in sets) else None
-                    conn.execute('''
-                        INSERT INTO workout_logs
-                        (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, trainer_id, ex['name'], total_sets, avg_reps, avg_weight,
-                          ex.get('notes', ''), workout_date, json.dumps(sets), workout_tags, workout_type, datetime.now()))
+            if not override and workout_exists(conn, client_id, workout_date, workout_type):
+                conn.close()
+                return jsonify({'conflict': True}), 409
+            insert_workout(conn, client_id, trainer_id, workout_date, workout_type, data.get('tags', ''), exercises)
             log_activity(conn, client_id, 'workout', 'created', workout_date)
             conn.commit()
             conn.close()
@@ -736,7 +618,7 @@ def register_client_routes(app):
         client_id = session['client_id']
         conn = get_db()
         try:
-            acct = conn.execute('SELECT perm_workouts FROM client_accounts WHERE client_id = ?', (client_id,)).fetchone()
+            acct = conn.execute(PERM_WORKOUTS_SQL, (client_id,)).fetchone()
             if not acct or not acct['perm_workouts']:
                 conn.close()
                 return jsonify({'error': 'Permission denied'}), 403
@@ -744,47 +626,23 @@ def register_client_routes(app):
             trainer_id = client_row['trainer_id'] if client_row else None
             data = request.get_json()
             new_date  = data.get('date', date)
-            exercises = data.get('exercises', [])
-            workout_tags = data.get('tags', '')
-            workout_type = data.get('workout_type', 'weightlifting')
-            if workout_type not in ('weightlifting', 'cardio'):
-                workout_type = 'weightlifting'
-
-            if workout_type == 'cardio':
-                tag_list = [t.strip() for t in workout_tags.split(',') if t.strip()]
-                if 'Cardio' not in tag_list:
-                    tag_list.append('Cardio')
-                workout_tags = ','.join(tag_list)
-
-            # Delete only this workout's own (date, type) pair — a
+            workout_type = workout_type_from(data.get('workout_type'))
+            try:
+                exercises = exercises_from_json(data.get('exercises'), workout_type)
+            except ValueError:
+                conn.close()
+                return jsonify({'error': 'Sets must be numbers'}), 400
+
+            # Touches only this workout's own (date, type) pair — a
             # weightlifting and a cardio workout on the same date are
             # independent and must not affect each other when one is edited.
-            conn.execute('DELETE FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ?', (client_id, date, workout_type))
-            for ex in exercises:
-                if workout_type == 'cardio':
-                    sets = ex.get('sets', []) or [{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-                    total_sets = len(sets)
-                    conn.execute('''
-                        INSERT INTO workout_logs
-                        (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, trainer_id, ex['name'], total_sets, None, None,
-                          ex.get('notes', ''), new_date, json.dumps(sets), workout_tags, workout_type, datetime.now()))
-                else:
-                    sets = ex.get('sets', []) or [{'weight': None, 'reps': None}]
-                    total_sets = len(sets)
-                    avg_weight = (sum(s['weight'] for s in sets if s.get('weight')) / len([s for s in sets if s.get('weight')])) if any(s.get('weight') for s in sets) else None
-                    avg_reps   = (sum(s['reps'] for s in sets if s.get('reps')) // len([s for s in sets if s.get('reps')])) if any(s.get('reps') for s in sets) else None
-                    conn.execute('''
-                        INSERT INTO workout_logs
-                        (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (str(uuid.uuid4()), client_id, trainer_id, ex['name'], total_sets, avg_reps, avg_weight,
-                          ex.get('notes', ''), new_date, json.dumps(sets), workout_tags, workout_type, datetime.now()))
-            log_activity(conn, client_id, 'workout', 'updated', new_date)
+            changes = edit_workout(conn, client_id, trainer_id, date, new_date, workout_type,
+                                   data.get('tags', ''), exercises)
+            if changes:
+                log_activity(conn, client_id, 'workout', 'updated', new_date)
             conn.commit()
             conn.close()
-            return jsonify({'success': True})
+            return jsonify({'success': True, 'changes': changes})
         except Exception as e:
             conn.close()
             return jsonify({'error': str(e)}), 500
@@ -796,7 +654,7 @@ def register_client_routes(app):
         client_id = session['client_id']
         conn = get_db()
         try:
-            acct = conn.execute('SELECT perm_workouts FROM client_accounts WHERE client_id = ?', (client_id,)).fetchone()
+            acct = conn.execute(PERM_WORKOUTS_SQL, (client_id,)).fetchone()
             if not acct or not acct['perm_workouts']:
                 conn.close()
                 return jsonify({'error': 'Permission denied'}), 403
@@ -804,10 +662,8 @@ def register_client_routes(app):
             # on a date can never also wipe out a different workout type
             # logged the same day. Falls back to 'weightlifting' only for
             # any pre-existing caller that predates this parameter.
-            workout_type = request.args.get('type', 'weightlifting')
-            if workout_type not in ('weightlifting', 'cardio'):
-                workout_type = 'weightlifting'
-            conn.execute('DELETE FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ?', (client_id, date, workout_type))
+            workout_type = workout_type_from(request.args.get('type'))
+            remove_workout(conn, client_id, date, workout_type)
             log_activity(conn, client_id, 'workout', 'deleted', date)
             conn.commit()
             conn.close()
@@ -824,7 +680,7 @@ def register_client_routes(app):
         client_id = session['client_id']
         conn = get_db()
         try:
-            acct = conn.execute('SELECT perm_workouts FROM client_accounts WHERE client_id = ?', (client_id,)).fetchone()
+            acct = conn.execute(PERM_WORKOUTS_SQL, (client_id,)).fetchone()
             if not acct or not acct['perm_workouts']:
                 conn.close()
                 return jsonify({'error': 'Permission denied'}), 403
@@ -837,57 +693,22 @@ def register_client_routes(app):
             original_date = data.get('original_date')
             new_date = data.get('new_date')
             override = data.get('override', False)
-            workout_type = data.get('workout_type', 'weightlifting')
-            if workout_type not in ('weightlifting', 'cardio'):
-                workout_type = 'weightlifting'
+            workout_type = workout_type_from(data.get('workout_type'))
             if not original_date or not new_date:
                 conn.close()
                 return jsonify({'error': 'Missing date parameters'}), 400
 
-            if not override:
-                existing = conn.execute(
-                    'SELECT 1 FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ? LIMIT 1',
-                    (client_id, new_date, workout_type)
-                ).fetchone()
-                if existing:
-                    conn.close()
-                    return jsonify({'conflict': True}), 409
+            if not override and workout_exists(conn, client_id, new_date, workout_type):
+                conn.close()
+                return jsonify({'conflict': True}), 409
 
             # Same type only — a cardio "duplicate" button only ever
             # duplicates the cardio entry for that date, never an unrelated
             # weightlifting entry logged the same day.
-            exercises = conn.execute('''
-                SELECT exercise_name, sets_data, notes, tags
-                FROM workout_logs
-                WHERE client_id = ? AND workout_date = ? AND workout_type = ?
-                ORDER BY created_at
-            ''', (client_id, original_date, workout_type)).fetchall()
-
-            if not exercises:
+            if not copy_workout(conn, client_id, trainer_id, original_date, new_date, workout_type):
                 conn.close()
                 return jsonify({'error': 'No workout found for that date'}), 404
 
-            default_sets = ([{'distance': None, 'distance_unit': None, 'duration': None, 'duration_unit': None, 'speed': None, 'speed_unit': None, 'incline': None, 'notes': None}]
-                             if workout_type == 'cardio' else [{'weight': None, 'reps': None}])
-            for exercise in exercises:
-                sets_data = exercise['sets_data']
-                exercise_sets = json.loads(sets_data) if sets_data else default_sets
-                total_sets = len(exercise_sets)
-                if workout_type == 'cardio':
-                    avg_reps = None
-                    avg_weight = None
-                else:
-                    avg_reps = sum(s['reps'] for s in exercise_sets if s.get('reps')) // len(
-                        [s for s in exercise_sets if s.get('reps')]) if any(s.get('reps') for s in exercise_sets) else None
-                    avg_weight = sum(s['weight'] for s in exercise_sets if s.get('weight')) / len(
-                        [s for s in exercise_sets if s.get('weight')]) if any(s.get('weight') for s in exercise_sets) else None
-                conn.execute('''
-                    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, sets, reps, weight, notes, workout_date, sets_data, tags, workout_type, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (str(uuid.uuid4()), client_id, trainer_id, exercise['exercise_name'],
-                      total_sets, avg_reps, avg_weight, exercise['notes'], new_date, sets_data, exercise['tags'],
-                      workout_type, datetime.now()))
-
             log_activity(conn, client_id, 'workout', 'duplicated', new_date)
             conn.commit()
             conn.close()
@@ -937,6 +758,7 @@ def register_client_routes(app):
                       data.get('notes', ''), datetime.now()))
                 log_activity(conn, client_id, 'weight', 'created', data['date'])
 
+            refresh_latest_weight(conn, client_id)
             conn.commit()
             conn.close()
             return jsonify({'success': True, 'id': entry_id})
@@ -967,6 +789,7 @@ def register_client_routes(app):
             (data['date'], data['weight'], data.get('notes', ''), entry_id, client_id)
         )
         log_activity(conn, client_id, 'weight', 'updated', data['date'])
+        refresh_latest_weight(conn, client_id)
         conn.commit()
         conn.close()
         return jsonify({'success': True})
@@ -1348,6 +1171,7 @@ def register_client_routes(app):
             (entry_id, client_id)
         )
         log_activity(conn, client_id, 'weight', 'deleted', '')
+        refresh_latest_weight(conn, client_id)
         conn.commit()
         conn.close()
         return jsonify({'success': True})
@@ -0,0 +1,68 @@
+"""Double-booking checks for new and edited sessions.
+
+A trainer's sessions for a day are already stored in start-time order in
+idx_sessions_trainer_date (trainer_id, session_date, start_time). A check
+is one range read of that index for the days involved (plus the series
+occurrences expanded into them; see recurrence.py), and then, per
+proposed slot, a walk of that day's intervals that stops at the first one
+starting after the slot ends. No day is ever loaded beyond the one range
+query, however many sessions the trainer has overall.
+
+Cancelled sessions don't block a slot. Sessions that only touch (one ends
+at 09:00, the next starts at 09:00) don't conflict.
+
+A new series is checked over its first CONFLICT_HORIZON_DAYS. Later
+occurrences are too far out to have much booked against them yet. They
+are checked as they're edited, like any session.
+"""
+from datetime import date, timedelta
+
+from calendar_feed import MAX_RANGE_DAYS, sessions_in_range
+from recurrence import occurrence_dates
+
+CONFLICT_HORIZON_DAYS = MAX_RANGE_DAYS
+
+
+def _hhmm(value):
+    # Times are stored as 'HH:MM' but may carry seconds.
+    return (value or '')[:5]
+
+
+def find_conflicts(conn, trainer_id, slots, ignore_ids=()):
+    """Sessions of this trainer overlapping any of `slots`.
+
+    `slots` is a list of (session_date, start_time, end_time), dates as
+    date objects or ISO strings. `ignore_ids` are sessions that must not
+    count, e.g. the one being edited. Returns session dicts in date and
+    time order, each at most once.
+    """
+    slots = [(date.fromisoformat(d) if isinstance(d, str) else d, _hhmm(s), _hhmm(e))
+             for d, s, e in slots]
+    if not slots:
+        return []
+    ignore_ids = set(ignore_ids)
+
+    by_day = {}
+    for row in sessions_in_range(conn, trainer_id, min(d for d, _, _ in slots),
+                                 max(d for d, _, _ in slots)):
+        if row['status'] != 'cancelled' and row['id'] not in ignore_ids:
+            by_day.setdefault(row['session_date'], []).append(row)
+
+    conflicts = {}
+    for day, start, end in slots:
+        # sessions_in_range returns each day in start-time order.
+        for row in by_day.get(day.isoformat(), ()):
+            if _hhmm(row['start_time']) >= end:
+                break
+            if _hhmm(row['end_time']) > start:
+                conflicts[row['id']] = row
+    return sorted(conflicts.values(), key=lambda s: (s['session_date'], s['start_time']))
+
+
+def series_slots(series):
+    """Slots for a series' occurrences within the conflict horizon.
+    `series` needs start_date, until, rrule, start_time and end_time."""
+    first = date.fromisoformat(series['start_date'])
+    horizon = first + timedelta(days=CONFLICT_HORIZON_DAYS - 1)
+    return [(day, series['start_time'], series['end_time'])
+            for day in occurrence_dates(series, first, horizon)]
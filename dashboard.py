@@ -0,0 +1,137 @@
+"""Trainer dashboard numbers, from one query and a per-trainer cache.
+
+dashboard_summary() gets everything the dashboard shows in one round
+trip: client counts, today's and this week's session counts, the next
+five sessions and the latest activity. The two lists come back as JSON
+arrays. Recurring series are expanded for this week and the next five
+sessions only, and added in. The result is cached in-process per
+trainer, so most dashboard loads never touch the database.
+
+Every write that changes those numbers calls invalidate_dashboard() for
+the trainer it affects. Inside a request the entry is dropped again at
+teardown, after the route has committed. Otherwise a dashboard load
+between the call and the commit could re-cache the old numbers.
+
+Invalidation only reaches the process that did the write. DASHBOARD_TTL
+bounds how stale another WSGI worker's copy can get. A cached entry also
+never outlives the day it was computed for. Days are the server's local
+dates, as on the calendar.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import g, has_app_context
+
+from recurrence import trainer_occurrences, merge_upcoming
+
+DASHBOARD_TTL = 60
+
+_cache = {}
+# Bumped on every invalidation, so a load that raced with a write doesn't
+# cache what it read.
+_generations = {}
+_cache_lock = threading.Lock()
+
+SUMMARY_SQL = '''
+    SELECT
+        (SELECT COUNT(*) FROM clients WHERE trainer_id = ?) AS total_clients,
+        (SELECT COUNT(*) FROM clients WHERE trainer_id = ? AND status = 'active') AS active_clients,
+        (SELECT COUNT(*) FROM sessions
+         WHERE trainer_id = ? AND session_date = ? AND status != 'cancelled') AS today_session_count,
+        (SELECT COUNT(*) FROM sessions
+         WHERE trainer_id = ? AND session_date BETWEEN ? AND ? AND status != 'cancelled') AS week_session_count,
+        (SELECT json_group_array(json_object(
+                    'id', id, 'client_id', client_id, 'client_name', client_name,
+                    'session_date', session_date, 'start_time', start_time, 'end_time', end_time,
+                    'session_type', session_type, 'status', status, 'notes', notes))
+         FROM (SELECT s.id, s.client_id, c.name AS client_name, s.session_date, s.start_time,
+                      s.end_time, s.session_type, s.status, s.notes
+               FROM sessions s
+               JOIN clients c ON s.client_id = c.id
+               WHERE s.trainer_id = ? AND s.session_date >= ? AND s.status != 'cancelled'
+               ORDER BY s.session_date, s.start_time
+               LIMIT 5)) AS recent_sessions,
+        (SELECT json_group_array(json_object(
+                    'id', id, 'client_id', client_id, 'client_name', client_name, 'category', category,
+                    'action', action, 'detail', detail, 'created_at', created_at))
+         FROM (SELECT id, client_id, client_name, category, action, detail, created_at
+               FROM activity_log
+               WHERE trainer_id = ?
+               ORDER BY created_at DESC
+               LIMIT 8)) AS recent_activity
+'''
+
+
+def _load_summary(conn, trainer_id, today):
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    row = conn.execute(SUMMARY_SQL, (
+        trainer_id, trainer_id,
+        trainer_id, today.isoformat(),
+        trainer_id, week_start.isoformat(), week_end.isoformat(),
+        trainer_id, today.isoformat(),
+        trainer_id,
+    )).fetchone()
+    occurrences = trainer_occurrences(conn, trainer_id, week_start, week_end)
+    return {
+        'total_clients': row['total_clients'],
+        'active_clients': row['active_clients'],
+        'today_session_count': row['today_session_count']
+            + sum(1 for s in occurrences if s['session_date'] == today.isoformat()),
+        'week_session_count': row['week_session_count'] + len(occurrences),
+        'recent_sessions': merge_upcoming(conn, json.loads(row['recent_sessions']), 5,
+                                          trainer_id=trainer_id, today=today),
+        'recent_activity': json.loads(row['recent_activity']),
+    }
+
+
+def dashboard_summary(conn, trainer_id):
+    """The dashboard's template variables for this trainer, cached.
+
+    `conn` is only used on a cache miss.
+    """
+    # The server's local date, the same clock as the calendar views and
+    # merge_upcoming(). "Today" and "upcoming" both count from it, so they
+    # can't disagree around midnight the way a UTC date('now') would.
+    today = datetime.now().date()
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(trainer_id)
+        generation = _generations.get(trainer_id, 0)
+    if entry and entry[0] == today and entry[1] > now:
+        return entry[2]
+
+    summary = _load_summary(conn, trainer_id, today)
+    with _cache_lock:
+        if _generations.get(trainer_id, 0) == generation:
+            _cache[trainer_id] = (today, now + DASHBOARD_TTL, summary)
+    return summary
+
+
+def _evict(trainer_ids):
+    with _cache_lock:
+        for trainer_id in trainer_ids:
+            _cache.pop(trainer_id, None)
+            _generations[trainer_id] = _generations.get(trainer_id, 0) + 1
+
+
+def invalidate_dashboard(trainer_id):
+    """Drop a trainer's cached dashboard. Call from any write that changes it."""
+    _evict([trainer_id])
+    if has_app_context():
+        g.setdefault('_dashboard_stale', set()).add(trainer_id)
+
+
+def _drop_stale(exc=None):
+    """teardown_appcontext hook: drop again whatever this request invalidated."""
+    _evict(g.pop('_dashboard_stale', ()))
+
+
+def register_dashboard_cache(app):
+    """Set the TTL from app config (DASHBOARD_TTL, seconds) and install the
+    teardown hook."""
+    global DASHBOARD_TTL
+    DASHBOARD_TTL = app.config.get('DASHBOARD_TTL', DASHBOARD_TTL)
+    app.teardown_appcontext(_drop_stale)
@@ -1,11 +1,213 @@
-"""Database helpers for TrainerPro."""
+"""Database helpers for TrainerPro.
+
+Connections come from a small bounded pool instead of a fresh
+sqlite3.connect() per call. Inside a request (any app context, really)
+get_db() hands back the same connection every time it's called, and the
+teardown hook installed by register_db_teardown() returns it to the pool
+when the request ends — so a route that returns early without calling
+conn.close() no longer leaks a connection.
+
+Outside an app context (startup migrations, init_db, scripts) get_db()
+checks a connection out directly and conn.close() puts it back.
+
+Every new pooled connection gets PRAGMA_PROFILE applied once. WAL lets
+client-portal writes proceed without blocking trainer dashboard reads;
+`python db.py` prints the settings actually in effect.
+"""
+import os
 import sqlite3
+import threading
+from queue import LifoQueue, Empty
+from urllib.request import pathname2url
+
+from flask import g, has_app_context
 
 DB_PATH = 'trainer_app.db'
 
+# Upper bound on open connections per process. A request holds exactly one,
+# so this is also the most requests that can touch the database at once;
+# anything beyond that waits up to POOL_TIMEOUT seconds for a free slot.
+POOL_SIZE = 8
+POOL_TIMEOUT = 10
 
-def get_db():
-    """Return a SQLite connection with row access by column name."""
-    conn = sqlite3.connect(DB_PATH)
+# Applied once to each new pooled connection, in this order (journal_mode
+# first — it's the only one persisted in the database file itself).
+# Override individual keys through app.config['SQLITE_PRAGMAS'].
+PRAGMA_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # Safe with WAL; fsync only at checkpoints
+    'busy_timeout': 5000,        # ms to wait on a locked database
+    'cache_size': -16000,        # Negative = KiB, so ~16 MB of page cache
+    'mmap_size': 134217728,      # 128 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_pragmas(conn, profile=None):
+    """Apply a PRAGMA profile (defaults to PRAGMA_PROFILE) to one connection."""
+    for name, value in (profile or PRAGMA_PROFILE).items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def active_pragmas(conn=None):
+    """Return {pragma: current value} for every key in PRAGMA_PROFILE.
+
+    Reads from the given connection, or checks one out of the pool.
+    """
+    own = conn is None
+    if own:
+        conn = get_pool().acquire()
+    try:
+        return {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in PRAGMA_PROFILE}
+    finally:
+        if own:
+            conn.close()
+
+
+def connect_readonly(path=None):
+    """Open a standalone read-only connection, outside the pool.
+
+    For worker processes that only read, like the parallel export
+    builders. mode=ro makes any write fail; the PRAGMA profile is applied
+    minus journal_mode, which a read-only connection can't change.
+    """
+    uri = 'file:' + pathname2url(os.path.abspath(path or DB_PATH)) + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
     conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    apply_pragmas(conn, {name: value for name, value in PRAGMA_PROFILE.items() if name != 'journal_mode'})
+    return conn
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool.
+
+    Routes keep calling conn.close() exactly as they always have. For a
+    connection bound to the current app context that's a no-op (teardown
+    releases it); otherwise it returns the connection to the pool.
+    """
+    pool = None
+    request_bound = False
+    checked_out = False
+
+    def close(self):
+        if self.request_bound or self.pool is None:
+            return
+        self.pool.release(self)
+
+
+class ConnectionPool:
+    """Bounded LIFO pool of SQLite connections for one database file.
+
+    LIFO so the most recently used (warmest page cache) connection is handed
+    out first. Connections are opened lazily, up to `size` of them.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        # check_same_thread=False: a pooled connection is reused by whichever
+        # worker thread checks it out next, but only ever by one at a time.
+        conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        apply_pragmas(conn)
+        return conn
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f'connection pool exhausted ({self.size} connections in use)')
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        if not conn.checked_out:
+            return  # Already back in the pool (close() called twice)
+        conn.checked_out = False
+        conn.request_bound = False
+        try:
+            # Anything the caller didn't commit is discarded, same as what
+            # closing a plain connection used to do.
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection — drop it rather than hand it out again.
+            sqlite3.Connection.close(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it on first use.
+
+    A pool inherited across fork() (e.g. a pre-loading WSGI server) is
+    discarded, since SQLite connections must not be shared between
+    processes.
+    """
+    global _pool
+    if _pool is None or _pool.pid != os.getpid() or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid() or _pool.path != DB_PATH:
+                _pool = ConnectionPool(DB_PATH, size=POOL_SIZE, timeout=POOL_TIMEOUT)
+    return _pool
+
+
+def get_db():
+    """Return a SQLite connection with row access by column name.
+
+    Within an app context this is the request's own connection (the same
+    object on every call); it goes back to the pool at teardown.
+    """
+    if not has_app_context():
+        return get_pool().acquire()
+
+    conn = g.get('_db_conn')
+    if conn is None:
+        conn = get_pool().acquire()
+        conn.request_bound = True
+        g._db_conn = conn
+    return conn
+
+
+def close_db(exc=None):
+    """teardown_appcontext hook: return the request's connection to the pool."""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.pool.release(conn)
+
+
+def register_db_teardown(app):
+    """Configure the pool from app config and release connections at teardown.
+
+    Recognised keys: DB_POOL_SIZE, DB_POOL_TIMEOUT and SQLITE_PRAGMAS (a dict
+    merged over PRAGMA_PROFILE).
+    """
+    global POOL_SIZE, POOL_TIMEOUT
+    POOL_SIZE = app.config.get('DB_POOL_SIZE', POOL_SIZE)
+    POOL_TIMEOUT = app.config.get('DB_POOL_TIMEOUT', POOL_TIMEOUT)
+    PRAGMA_PROFILE.update(app.config.get('SQLITE_PRAGMAS', {}))
+    app.teardown_appcontext(close_db)
+
+
+if __name__ == '__main__':
+    for name, value in active_pragmas().items():
+        print(f'{name:>14} = {value}')
@@ -0,0 +1,241 @@
+"""In-process exercise autocomplete.
+
+Each trainer gets a prefix trie over the exercise catalogue plus every
+exercise name they've logged in workout_logs. Suggestions rank by how many
+times that trainer has logged the exercise, so their own staples come
+first, and catalogue entries they've never used come after. Answering a
+keystroke is a walk down the trie and a sort of what's under the node; the
+database is never touched.
+
+Exercises are keyed by records.exercise_key(), the same key
+workout_logs.exercise_key stores, so a recount matches exactly the rows
+the trie has under that key. Names are indexed from the start of every
+word, so "pre" finds "Bench Press". With several words typed, the first is looked up in the trie and
+the rest must each start some word of the name.
+
+load_exercise_index() fills everything at startup. After that, every
+route that writes or deletes workout_logs calls refresh_exercise_usage()
+with the names it touched, which recounts just those. As with the
+dashboard cache, inside a request that happens at teardown, after the
+route has committed. It also only reaches the process that did the write,
+so a trainer's usage is reloaded from the database once it's
+EXERCISE_INDEX_TTL seconds old.
+"""
+import re
+import threading
+import time
+
+from flask import g, has_app_context
+
+from db import get_db
+from records import exercise_key
+
+EXERCISE_INDEX_TTL = 5 * 60
+
+# Use counts per spelling of each exercise name; _usage() folds them.
+USAGE_SQL = '''
+    SELECT exercise_key, exercise_name, COUNT(*) AS uses
+    FROM workout_logs
+    WHERE trainer_id = ?{names}
+    GROUP BY exercise_key, exercise_name
+'''
+
+_WORD_START = re.compile(r'(?:^|(?<=[\s\-/(]))\w')
+
+_lock = threading.Lock()
+# key (records.exercise_key()) -> {'name', 'muscle_group', 'equipment'}
+_catalogue = {}
+# trainer_id -> _TrainerExercises
+_trainers = {}
+
+
+class _Node:
+    __slots__ = ('children', 'keys')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
+
+
+class _TrainerExercises:
+    """One trainer's trie, logged names and usage counts."""
+
+    def __init__(self, loaded_at):
+        self.root = _Node()
+        self.names = {}
+        self.uses = {}
+        self.loaded_at = loaded_at
+        for key in _catalogue:
+            self._index(key)
+
+    def _index(self, key):
+        for match in _WORD_START.finditer(key):
+            node = self.root
+            for char in key[match.start():]:
+                node = node.children.setdefault(char, _Node())
+                node.keys.add(key)
+
+    def _unindex(self, key):
+        for match in _WORD_START.finditer(key):
+            node = self.root
+            for char in key[match.start():]:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                node.keys.discard(key)
+
+    def set_usage(self, key, name, uses):
+        """Record `uses` logged entries of `key` (0 removes it, unless
+        it's in the catalogue)."""
+        if uses:
+            if key not in self.names and key not in _catalogue:
+                self._index(key)
+            self.names[key] = name
+            self.uses[key] = uses
+        else:
+            self.names.pop(key, None)
+            self.uses.pop(key, None)
+            if key not in _catalogue:
+                self._unindex(key)
+
+    def candidates(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.keys
+
+
+def _usage(rows):
+    """{key: (display name, uses)} from USAGE_SQL rows. Spellings
+    differing only in case count together, under the most used one."""
+    usage, best = {}, {}
+    for row in rows:
+        key = row['exercise_key']
+        if not key:
+            continue
+        name, uses = usage.get(key, (None, 0))
+        if row['uses'] > best.get(key, 0):
+            name, best[key] = row['exercise_name'].strip(), row['uses']
+        usage[key] = (name, uses + row['uses'])
+    return usage
+
+
+def _load_trainer(conn, trainer_id):
+    entry = _TrainerExercises(time.monotonic())
+    for key, (name, uses) in _usage(conn.execute(USAGE_SQL.format(names=''), (trainer_id,))).items():
+        entry.set_usage(key, name, uses)
+    return entry
+
+
+def load_exercise_index(conn):
+    """Load the catalogue and every trainer's logged exercises."""
+    catalogue = {exercise_key(row['name']): dict(row) for row in conn.execute(
+        'SELECT name, muscle_group, equipment FROM exercises')}
+    trainer_ids = [row['id'] for row in conn.execute('SELECT id FROM users')]
+    with _lock:
+        _catalogue.clear()
+        _catalogue.update(catalogue)
+        _trainers.clear()
+        for trainer_id in trainer_ids:
+            _trainers[trainer_id] = _load_trainer(conn, trainer_id)
+
+
+def _ensure_fresh(conn, trainer_id):
+    """(Re)load this trainer from `conn` if they're missing or stale."""
+    with _lock:
+        entry = _trainers.get(trainer_id)
+    if entry is None or time.monotonic() - entry.loaded_at > EXERCISE_INDEX_TTL:
+        entry = _load_trainer(conn, trainer_id)
+        with _lock:
+            _trainers[trainer_id] = entry
+
+
+def suggest_exercises(conn, trainer_id, text, limit=10):
+    """Up to `limit` exercises for what's been typed so far, most used by
+    this trainer first. With nothing typed, their most used overall.
+
+    `conn` is only used to reload a stale trainer.
+    """
+    words = exercise_key(text).split()
+    _ensure_fresh(conn, trainer_id)
+    with _lock:
+        entry = _trainers[trainer_id]
+        if words:
+            keys = [key for key in entry.candidates(words[0])
+                    if all(any(word.startswith(w) for word in key.split()) for w in words[1:])]
+        else:
+            keys = list(entry.names) + [key for key in _catalogue if key not in entry.names]
+        keys.sort(key=lambda k: (-entry.uses.get(k, 0), k))
+        results = []
+        for key in keys[:limit]:
+            catalogued = _catalogue.get(key, {})
+            results.append({
+                'name': catalogued.get('name') or entry.names[key],
+                'muscle_group': catalogued.get('muscle_group'),
+                'equipment': catalogued.get('equipment'),
+                'uses': entry.uses.get(key, 0),
+            })
+    return results
+
+
+def refresh_exercise_usage(conn, client_id, names):
+    """Recount the client's trainer's use of each exercise in `names`.
+
+    Call after writing or deleting workout_logs, inside the transaction.
+    Within a request the recount is queued and runs at teardown, once the
+    route has committed, so the shared index never holds a count from a
+    write that could still roll back. Otherwise it runs now, through
+    `conn`.
+    """
+    keys = {exercise_key(name) for name in names} - {''}
+    if not keys:
+        return
+    client = conn.execute('SELECT trainer_id FROM clients WHERE id = ?', (client_id,)).fetchone()
+    if not client:
+        return
+    if has_app_context():
+        g.setdefault('_exercise_usage', {}).setdefault(client['trainer_id'], set()).update(keys)
+    else:
+        _recount(conn, client['trainer_id'], keys)
+
+
+def _recount(conn, trainer_id, keys):
+    _ensure_fresh(conn, trainer_id)
+    placeholders = ', '.join('?' for _ in keys)
+    counts = _usage(conn.execute(USAGE_SQL.format(names=f' AND exercise_key IN ({placeholders})'),
+                                 [trainer_id, *keys]))
+    with _lock:
+        entry = _trainers[trainer_id]
+        for key in keys:
+            name, uses = counts.get(key, (None, 0))
+            entry.set_usage(key, name, uses)
+
+
+def _apply_queued(exc=None):
+    """teardown_appcontext hook: run the recounts this request queued,
+    against what it committed."""
+    queued = g.pop('_exercise_usage', None)
+    if not queued or exc is not None:
+        return
+    conn = get_db()
+    if conn.in_transaction:
+        return  # Never committed; releasing the connection rolls it back
+    for trainer_id, keys in queued.items():
+        _recount(conn, trainer_id, keys)
+
+
+def register_exercise_index(app):
+    """Set the reload interval from app config (EXERCISE_INDEX_TTL, seconds),
+    load the index and install the teardown hook. Call once the schema is
+    migrated, after register_db_teardown(): teardown hooks run in reverse,
+    so the request's connection is still open for _apply_queued()."""
+    global EXERCISE_INDEX_TTL
+    EXERCISE_INDEX_TTL = app.config.get('EXERCISE_INDEX_TTL', EXERCISE_INDEX_TTL)
+    app.teardown_appcontext(_apply_queued)
+    conn = get_db()
+    try:
+        load_exercise_index(conn)
+    finally:
+        conn.close()
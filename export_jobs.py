@@ -0,0 +1,219 @@
+"""Background export jobs.
+
+A multi-client export used to be generated inside the POST that asked for
+it, holding a WSGI worker (and often hitting its timeout) for the whole
+run. enqueue_export() now records the job in export_jobs, one
+export_job_clients row per client, and hands it to a small thread pool.
+The worker writes the zip to EXPORT_DIR, building the workbooks across
+EXPORT_PROCESSES processes, and marks each client done as it goes. Any
+process can answer job_status() from those tables, and the finished zip
+is sent from disk by the download route.
+
+Finished (or failed) jobs expire EXPORT_TTL seconds after they end.
+purge_expired_jobs() deletes their rows and files. It runs whenever a job
+is queued or its status or download is asked for, and daily from
+tools/purge_export_jobs.py, so the zips of a trainer who never exports
+again still go. It also fails jobs whose worker stopped updating them,
+e.g. because the process was restarted mid-export.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from db import get_db
+from exports import stream_client_exports
+
+log = logging.getLogger(__name__)
+
+EXPORT_DIR = 'export_files'
+EXPORT_TTL = 24 * 60 * 60
+# Exports running at once per process. Each holds one pooled connection.
+EXPORT_WORKERS = 2
+# Size of the worker-process pool the exports build their workbooks in,
+# started on first use and shared by every export in the process; 1
+# builds them on the job's own thread. Kept small: every WSGI worker
+# process that runs an export gets a pool of its own.
+EXPORT_PROCESSES = 2
+# A queued or running job not updated for this long is presumed dead.
+STALE_AFTER = 60 * 60
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return this process's worker pool, creating it on first use.
+
+    Threads don't survive fork(), so a pool inherited from a pre-loading
+    parent process is replaced.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(EXPORT_WORKERS, thread_name_prefix='export')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def artifact_path(job_id):
+    return os.path.join(EXPORT_DIR, f'{job_id}.zip')
+
+
+def enqueue_export(conn, trainer_id, client_ids, flags):
+    """Queue an export of `client_ids` (already checked to belong to this
+    trainer) and return the job id.
+
+    `flags` are build_client_export_workbook()'s export_* arguments.
+    Commits, so the worker can see the job as soon as it's submitted.
+    """
+    purge_expired_jobs(conn)
+
+    job_id = str(uuid.uuid4())
+    filename = f'client_exports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    conn.execute('''
+        INSERT INTO export_jobs (id, trainer_id, status, flags, filename, created_at, updated_at)
+        VALUES (?, ?, 'queued', ?, ?, datetime('now'), datetime('now'))
+    ''', (job_id, trainer_id, json.dumps([bool(f) for f in flags]), filename))
+    for position, client_id in enumerate(client_ids):
+        conn.execute('''
+            INSERT INTO export_job_clients (job_id, position, client_id, client_name, status)
+            SELECT ?, ?, id, name, 'pending' FROM clients WHERE id = ?
+        ''', (job_id, position, client_id))
+    conn.commit()
+
+    get_executor().submit(run_job, job_id)
+    return job_id
+
+
+def run_job(job_id):
+    """Generate one queued export. Runs on a worker thread with its own connection."""
+    conn = get_db()
+    part_path = artifact_path(job_id) + '.part'
+    try:
+        # Only claim it if it's still queued — it may have been purged or
+        # given up on as stale in the meantime.
+        claimed = conn.execute('''
+            UPDATE export_jobs SET status = 'running', updated_at = datetime('now')
+            WHERE id = ? AND status = 'queued'
+        ''', (job_id,)).rowcount
+        conn.commit()
+        if not claimed:
+            return
+
+        job = conn.execute('SELECT trainer_id, flags FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+        client_ids = [row['client_id'] for row in conn.execute('''
+            SELECT client_id FROM export_job_clients WHERE job_id = ? ORDER BY position
+        ''', (job_id,))]
+
+        def progress(client_id, status):
+            conn.execute('''
+                UPDATE export_job_clients SET status = ? WHERE job_id = ? AND client_id = ?
+            ''', (status, job_id, client_id))
+            conn.execute("UPDATE export_jobs SET updated_at = datetime('now') WHERE id = ?", (job_id,))
+            conn.commit()
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        with open(part_path, 'wb') as out:
+            for chunk in stream_client_exports(conn, client_ids, job['trainer_id'], *json.loads(job['flags']),
+                                               progress=progress, processes=EXPORT_PROCESSES):
+                out.write(chunk)
+        # Only a complete zip ever appears under the name the download route serves.
+        os.replace(part_path, artifact_path(job_id))
+
+        _finish(conn, job_id, 'done')
+    except Exception as e:
+        log.exception('Export job %s failed', job_id)
+        conn.rollback()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        _finish(conn, job_id, 'failed', str(e))
+    finally:
+        conn.close()
+
+
+def _finish(conn, job_id, status, error=None):
+    conn.execute('''
+        UPDATE export_jobs
+        SET status = ?, error = ?, updated_at = datetime('now'), finished_at = datetime('now'),
+            expires_at = datetime('now', ?)
+        WHERE id = ?
+    ''', (status, error, f'+{EXPORT_TTL} seconds', job_id))
+    conn.commit()
+
+
+def job_status(conn, job_id, trainer_id):
+    """The job's status and per-client progress as a dict, or None if it
+    doesn't exist, has expired or isn't this trainer's."""
+    job = conn.execute('''
+        SELECT id, status, error, created_at, finished_at, expires_at
+        FROM export_jobs
+        WHERE id = ? AND trainer_id = ? AND (expires_at IS NULL OR expires_at > datetime('now'))
+    ''', (job_id, trainer_id)).fetchone()
+    if not job:
+        return None
+
+    clients = [dict(row) for row in conn.execute('''
+        SELECT client_id, client_name, status
+        FROM export_job_clients
+        WHERE job_id = ?
+        ORDER BY position
+    ''', (job_id,))]
+    return {
+        **dict(job),
+        'total': len(clients),
+        'completed': sum(1 for c in clients if c['status'] in ('done', 'skipped')),
+        'clients': clients,
+    }
+
+
+def finished_artifact(conn, job_id, trainer_id):
+    """(disk_path, download_name) of a finished, unexpired job's zip, or None."""
+    job = conn.execute('''
+        SELECT filename FROM export_jobs
+        WHERE id = ? AND trainer_id = ? AND status = 'done' AND expires_at > datetime('now')
+    ''', (job_id, trainer_id)).fetchone()
+    if not job or not os.path.exists(artifact_path(job_id)):
+        return None
+    return artifact_path(job_id), job['filename']
+
+
+def purge_expired_jobs(conn):
+    """Delete expired jobs and their zips, and fail jobs that went stale.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    expired = [row['id'] for row in conn.execute(
+        "SELECT id FROM export_jobs WHERE expires_at <= datetime('now')")]
+    for job_id in expired:
+        try:
+            os.remove(artifact_path(job_id))
+        except FileNotFoundError:
+            pass
+        conn.execute('DELETE FROM export_job_clients WHERE job_id = ?', (job_id,))
+        conn.execute('DELETE FROM export_jobs WHERE id = ?', (job_id,))
+
+    conn.execute('''
+        UPDATE export_jobs
+        SET status = 'failed', error = 'Interrupted', finished_at = datetime('now'),
+            expires_at = datetime('now', ?)
+        WHERE status IN ('queued', 'running') AND updated_at <= datetime('now', ?)
+    ''', (f'+{EXPORT_TTL} seconds', f'-{STALE_AFTER} seconds'))
+
+
+def register_export_jobs(app):
+    """Configure the job queue from app config.
+
+    Recognised keys: EXPORT_DIR, EXPORT_TTL (seconds), EXPORT_WORKERS and
+    EXPORT_PROCESSES.
+    """
+    global EXPORT_DIR, EXPORT_TTL, EXPORT_WORKERS, EXPORT_PROCESSES
+    EXPORT_DIR = app.config.get('EXPORT_DIR', EXPORT_DIR)
+    EXPORT_TTL = int(app.config.get('EXPORT_TTL', EXPORT_TTL))
+    EXPORT_WORKERS = app.config.get('EXPORT_WORKERS', EXPORT_WORKERS)
+    EXPORT_PROCESSES = app.config.get('EXPORT_PROCESSES', EXPORT_PROCESSES)
@@ -0,0 +1,536 @@
+"""Client data exports.
+
+build_client_export_workbook() builds one client's workbook and
+build_all_clients_workbook() the trainer's client roster, both in
+openpyxl's write-only mode with shared named styles.
+stream_client_exports() turns a list of clients into a zip, generated
+chunk by chunk; export_jobs.py writes it to disk in the background.
+
+Nothing is ever held in memory for the whole export. Each workbook is
+saved to a temporary file and each photo is read from disk, and both are
+copied into the zip CHUNK_SIZE bytes at a time. Whatever the zip writer
+has produced is yielded after every chunk. Peak memory is therefore
+about one workbook being built per process, however many clients or
+photos are selected.
+"""
+import atexit
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle
+
+import db
+from workout_sets import load_sets
+
+CHUNK_SIZE = 64 * 1024
+
+
+def list_photo_files(conn, client_id):
+    """(filename, disk_path) for each of a client's progress photos still on disk.
+
+    Named by entry date, since a client can only have one photo per date.
+    """
+    photo_rows = conn.execute('''
+        SELECT date, photo_url
+        FROM progress_photos
+        WHERE client_id = ?
+        ORDER BY date ASC
+    ''', (client_id,)).fetchall()
+
+    photo_files = []
+    for row in photo_rows:
+        disk_path = os.path.join('static', row['photo_url'])
+        if not os.path.exists(disk_path):
+            continue  # File missing on disk — skip rather than fail the whole export
+        ext = os.path.splitext(row['photo_url'])[1] or '.jpg'
+        photo_files.append((f"{row['date']}{ext}", disk_path))
+    return photo_files
+
+
+# Named styles shared by every cell that uses them, instead of a new Font
+# object per header cell. Registered once per workbook by _new_workbook().
+STYLES = {
+    'Export Header': Font(bold=True),
+    'Export Date': Font(bold=True, size=12),
+    'Export Note': Font(italic=True),
+}
+
+MUSCLE_GROUPS = ['Chest', 'Back', 'Biceps', 'Triceps', 'Shoulders', 'Legs', 'Core']
+MEASUREMENT_COLS = ['neck', 'shoulders', 'chest', 'waist', 'hips', 'bicep', 'forearm', 'thigh', 'calf']
+
+WEIGHTLIFTING_SET_HEADERS = ['Set', 'Weight (lbs)', 'Reps', 'RPE']
+CARDIO_SET_HEADERS = ['Set', 'Distance', 'Duration', 'Speed', 'Incline', 'Set Notes']
+
+# Oldest first
+EXPORT_WORKOUTS_SQL = '''
+    SELECT id, workout_date, exercise_name, notes, tags, workout_type
+    FROM workout_logs
+    WHERE client_id = ?
+    ORDER BY workout_date ASC, created_at ASC
+'''
+
+ROSTER_SQL = '''
+    SELECT c.name, c.email, c.phone, c.age, c.gender, c.height, c.status, c.latest_weight
+    FROM clients c
+    WHERE c.trainer_id = ?
+    ORDER BY c.name ASC
+'''
+
+
+def _new_workbook():
+    """A write-only workbook with the export's named styles registered.
+
+    Write-only sheets stream rows out as they're appended instead of
+    keeping a Cell object for every value, which is several times faster
+    and keeps memory flat. Column widths have to be set before the first
+    append.
+    """
+    wb = Workbook(write_only=True)
+    for name, font in STYLES.items():
+        wb.add_named_style(NamedStyle(name=name, font=font))
+    return wb
+
+
+def _new_sheet(wb, title, widths):
+    ws = wb.create_sheet(title)
+    for letter, width in zip('ABCDEFGHIJKLMNOPQRSTUVWXYZ', widths):
+        ws.column_dimensions[letter].width = width
+    return ws
+
+
+def _styled(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _header_row(ws, headers):
+    ws.append([_styled(ws, h, 'Export Header') for h in headers])
+
+
+def _write_workout_sheet(ws, workouts, sets_by_log, show_tags=True):
+    """Workout rows grouped by date: a date heading, then per exercise its
+    name, a sets table (weightlifting or cardio layout) and any notes/tags,
+    with a blank row between dates."""
+    current_date = None
+
+    for workout in workouts:
+        is_cardio = workout['workout_type'] == 'cardio'
+
+        if current_date != workout['workout_date']:
+            if current_date:
+                ws.append([])
+            ws.append([_styled(ws, workout['workout_date'], 'Export Date')])
+            current_date = workout['workout_date']
+
+        ws.append([_styled(ws, workout['exercise_name'], 'Export Header')])
+
+        sets_data = sets_by_log.get(workout['id'], [])
+        if is_cardio:
+            _header_row(ws, CARDIO_SET_HEADERS)
+            for set_num, set_info in enumerate(sets_data, 1):
+                distance = set_info.get('distance')
+                duration = set_info.get('duration')
+                # Speed and incline are optional and only present on newer
+                # entries; older cardio sets leave these blank.
+                speed = set_info.get('speed')
+                incline = set_info.get('incline')
+                ws.append([
+                    f'Set {set_num}',
+                    f"{distance} {set_info.get('distance_unit') or ''}".strip() if distance is not None else '',
+                    f"{duration} {set_info.get('duration_unit') or ''}".strip() if duration is not None else '',
+                    f"{speed} {set_info.get('speed_unit') or 'mph'}".strip() if speed is not None else '',
+                    f'{incline}%' if incline is not None else '',
+                    set_info.get('notes') or '',
+                ])
+        else:
+            _header_row(ws, WEIGHTLIFTING_SET_HEADERS)
+            for set_num, set_info in enumerate(sets_data, 1):
+                # RPE is optional and only present on newer entries; older
+                # sets logged before RPE existed simply leave this blank.
+                ws.append([f'Set {set_num}', set_info.get('weight', ''), set_info.get('reps', ''),
+                           set_info.get('rpe') or ''])
+
+        if workout['notes']:
+            ws.append([_styled(ws, f"Notes: {workout['notes']}", 'Export Note')])
+
+        if show_tags and workout['tags']:
+            ws.append([f"Tags: {workout['tags']}"])
+
+
+def _group_by_date(workouts):
+    """Workouts regrouped so each date's entries are contiguous, dates ascending."""
+    by_date = {}
+    for workout in workouts:
+        by_date.setdefault(workout['workout_date'], []).append(workout)
+    return [w for date in sorted(by_date) for w in by_date[date]]
+
+
+# Wide enough for either layout: weight/reps/RPE or distance/duration/speed/incline/notes
+WORKOUT_WIDTHS = [25, 18, 18, 14, 12, 30]
+
+
+def build_client_export_workbook(conn, client_id, trainer_id, export_workouts, export_weight_logs,
+                                  export_nutrition_logs, export_sleep_logs, export_measurements=False,
+                                  export_photos=False):
+    """Build one client's export workbook, plus the list of their progress
+    photo files if requested.
+
+    Returns (client_name, workbook, photo_files) or None if the client
+    doesn't exist or doesn't belong to this trainer. The workbook is
+    write-only and not saved yet — the caller saves it (once) wherever it's
+    going. photo_files is a list of (filename, disk_path) tuples; the files
+    themselves are only read when they're copied into the export.
+    """
+    client = conn.execute('''
+        SELECT name FROM clients
+        WHERE id = ? AND trainer_id = ?
+    ''', (client_id, trainer_id)).fetchone()
+
+    if not client:
+        return None
+
+    wb = _new_workbook()
+
+    if export_workouts:
+        workouts = conn.execute(EXPORT_WORKOUTS_SQL, (client_id,)).fetchall()
+        sets_by_log = load_sets(conn, workouts)
+
+        _write_workout_sheet(_new_sheet(wb, 'Workout History', WORKOUT_WIDTHS), workouts, sets_by_log)
+
+        # One more sheet per muscle group tag that actually appears
+        for muscle_group in MUSCLE_GROUPS:
+            tagged = [w for w in workouts if w['tags'] and muscle_group in w['tags']]
+            if tagged:
+                _write_workout_sheet(_new_sheet(wb, muscle_group, WORKOUT_WIDTHS),
+                                     _group_by_date(tagged), sets_by_log, show_tags=False)
+
+        # Cardio gets its own sheet too, filtered by workout_type (a real
+        # column) rather than tag text, since every cardio workout is
+        # guaranteed to have that type set even if its tags ever changed.
+        cardio = [w for w in workouts if w['workout_type'] == 'cardio']
+        if cardio:
+            _write_workout_sheet(_new_sheet(wb, 'Cardio', WORKOUT_WIDTHS),
+                                 _group_by_date(cardio), sets_by_log, show_tags=False)
+
+    if export_weight_logs:
+        ws = _new_sheet(wb, 'Weight Logs', [15, 15])
+        _header_row(ws, ['Date', 'Weight (lbs)'])
+        for log in conn.execute('''
+            SELECT date, weight
+            FROM weight_logs
+            WHERE client_id = ?
+            ORDER BY date ASC
+        ''', (client_id,)):
+            ws.append([log['date'], log['weight']])
+
+    if export_nutrition_logs:
+        ws = _new_sheet(wb, 'Nutrition', [15, 30, 15, 15, 15, 40])
+        _header_row(ws, ['Date', 'Diet', 'Calories', 'Sodium', 'Sat Fat', 'Notes'])
+        for log in conn.execute('''
+            SELECT date, diet, estimated_calories, estimated_sodium, estimated_saturated_fat, notes
+            FROM nutrition_logs
+            WHERE client_id = ?
+            ORDER BY date ASC
+        ''', (client_id,)):
+            ws.append([
+                log['date'],
+                log['diet'],
+                log['estimated_calories'] if log['estimated_calories'] else '',
+                log['estimated_sodium'] if log['estimated_sodium'] else '',
+                log['estimated_saturated_fat'] if log['estimated_saturated_fat'] else '',
+                log['notes'],
+            ])
+
+    if export_sleep_logs:
+        ws = _new_sheet(wb, 'Sleep Logs', [15, 15, 40])
+        _header_row(ws, ['Date', 'Hours', 'Notes'])
+        for log in conn.execute('''
+            SELECT date, hours, notes
+            FROM sleep_logs
+            WHERE client_id = ?
+            ORDER BY date ASC
+        ''', (client_id,)):
+            ws.append([log['date'], log['hours'], log['notes'] if log['notes'] else ''])
+
+    if export_measurements:
+        ws = _new_sheet(wb, 'Measurements', [15] + [12] * len(MEASUREMENT_COLS) + [40])
+        _header_row(ws, ['Date'] + [c.capitalize() for c in MEASUREMENT_COLS] + ['Notes'])
+        for log in conn.execute(f'''
+            SELECT date, {", ".join(MEASUREMENT_COLS)}, notes
+            FROM body_measurements
+            WHERE client_id = ?
+            ORDER BY date ASC
+        ''', (client_id,)):
+            ws.append([log['date']]
+                      + [log[field] if log[field] is not None else '' for field in MEASUREMENT_COLS]
+                      + [log['notes'] or ''])
+
+    # Progress photos are exported separately as actual image files, not
+    # spreadsheet rows.
+    photo_files = list_photo_files(conn, client_id) if export_photos else []
+
+    # Clean filename
+    safe_name = "".join(c for c in client['name'] if c.isalnum() or c in (' ', '-', '_')).strip()
+    return (safe_name, wb, photo_files)
+
+
+def build_all_clients_workbook(conn, trainer_id):
+    """The one-sheet roster of every client with their latest weight.
+
+    Returns None when the trainer has no clients.
+    """
+    clients = conn.execute(ROSTER_SQL, (trainer_id,)).fetchall()
+
+    if not clients:
+        return None
+
+    wb = _new_workbook()
+    ws = _new_sheet(wb, 'All Clients', [20, 25, 15, 10, 12, 15, 12, 12])
+    _header_row(ws, ['Name', 'Email', 'Phone', 'Age', 'Gender', 'Weight (lbs)', 'Height', 'Status'])
+    for client in clients:
+        ws.append([client['name'], client['email'], client['phone'], client['age'], client['gender'],
+                   client['latest_weight'], client['height'], client['status']])
+    return wb
+
+
+def save_workbook(wb):
+    """Save a workbook to an anonymous temp file, rewound and ready to read."""
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
+
+
+class _StreamSink(io.RawIOBase):
+    """Write end for a ZipFile whose output goes out as a response body.
+
+    Not seekable, so zipfile writes a data descriptor after each entry
+    instead of seeking back to patch the local header. Bytes collect here
+    until drain() hands them to the generator.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _copy_into_zip(zip_file, sink, arcname, src):
+    """Copy a readable file into the zip entry `arcname`, yielding output as it goes."""
+    with zip_file.open(arcname, 'w') as dest:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            dest.write(chunk)
+            data = sink.drain()
+            if data:
+                yield data
+
+
+def _build_here(conn, client_ids, trainer_id, flags, progress):
+    """Build each client's workbook on `conn`, one at a time.
+
+    Yields (client_id, (safe_name, xlsx_file, photo_files)), or
+    (client_id, None) for a skipped client. The temp file is closed when
+    the consumer asks for the next client.
+    """
+    for client_id in client_ids:
+        progress(client_id, 'running')
+        built = build_client_export_workbook(conn, client_id, trainer_id, *flags)
+        if not built:
+            yield client_id, None
+            continue
+        safe_name, wb, photo_files = built
+        xlsx = save_workbook(wb)
+        del built, wb  # Saved — don't keep it in memory while it's copied
+        with xlsx:
+            yield client_id, (safe_name, xlsx, photo_files)
+
+
+# Per-process read-only connection for _build_to_file(), opened by _init_worker().
+_worker_conn = None
+
+# The export worker pool, shared by every export in this process and kept
+# between them. Keyed on what it was started with: (pid, db path, size).
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(db_path):
+    global _worker_conn
+    _worker_conn = db.connect_readonly(db_path)
+
+
+def _get_pool(processes):
+    """This process's worker pool, started on first use.
+
+    A pool inherited across fork() is unusable, and one opened on another
+    database or at another size is replaced.
+    """
+    global _pool, _pool_key
+    key = (os.getpid(), os.path.abspath(db.DB_PATH), processes)
+    with _pool_lock:
+        if _pool_key != key:
+            if _pool is not None and _pool_key[0] == os.getpid():
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # spawn rather than fork: this process has other threads
+            # (requests, export jobs) and pooled connections a forked child
+            # mustn't inherit.
+            _pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(key[1],))
+            _pool_key = key
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget `pool` (e.g. after a worker died and broke it), so the next
+    export starts a new one."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_key = None, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _shutdown_pool():
+    if _pool is not None and _pool_key[0] == os.getpid():
+        _pool.shutdown(cancel_futures=True)
+
+
+atexit.register(_shutdown_pool)
+
+
+def _build_to_file(client_id, trainer_id, flags):
+    """Worker process: build one client's workbook into a temp file.
+
+    Returns (safe_name, xlsx_path, photo_files), or None if the client is
+    skipped. The parent removes the file once it's in the zip.
+    """
+    built = build_client_export_workbook(_worker_conn, client_id, trainer_id, *flags)
+    if not built:
+        return None
+    safe_name, wb, photo_files = built
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+        wb.save(tmp)
+    return safe_name, tmp.name, photo_files
+
+
+def _discard_built(future):
+    """Done-callback for a build nobody will zip: remove its temp file."""
+    if not future.cancelled() and future.exception() is None and future.result():
+        os.remove(future.result()[1])
+
+
+def _build_in_processes(client_ids, trainer_id, flags, processes, progress):
+    """Build workbooks in this process's pool of `processes` worker
+    processes, yielding them in client_ids order, same as _build_here().
+
+    Each worker reads through its own read-only connection. At most
+    2 * processes of this export's clients are in flight or waiting to be
+    zipped, which bounds the temp files on disk however many clients are
+    selected.
+    """
+    pool = _get_pool(processes)
+    window = min(processes, len(client_ids)) * 2
+    remaining = iter(client_ids)
+    in_flight = deque()
+
+    def submit_next():
+        client_id = next(remaining, None)
+        if client_id is not None:
+            progress(client_id, 'running')
+            in_flight.append((client_id, pool.submit(_build_to_file, client_id, trainer_id, flags)))
+
+    try:
+        for _ in range(window):
+            submit_next()
+        while in_flight:
+            client_id, future = in_flight.popleft()
+            result = future.result()
+            submit_next()
+            if result is None:
+                yield client_id, None
+                continue
+            safe_name, xlsx_path, photo_files = result
+            try:
+                with open(xlsx_path, 'rb') as xlsx:
+                    yield client_id, (safe_name, xlsx, photo_files)
+            finally:
+                os.remove(xlsx_path)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Only reached with work left over if the export failed or was
+        # abandoned. The pool is shared, so cancel just this export's
+        # builds and drop whatever was (or still will be) built but never
+        # zipped.
+        for _, future in in_flight:
+            future.cancel()
+            future.add_done_callback(_discard_built)
+
+
+def stream_client_exports(conn, client_ids, trainer_id, *flags, progress=None, processes=1):
+    """Yield the bytes of a zip holding every client's export.
+
+    Each client gets their own folder: {name}/{name}.xlsx plus
+    {name}/photos/{date}.{ext} for each progress photo. `flags` are passed
+    straight through to build_client_export_workbook(). Clients that don't
+    belong to this trainer are skipped.
+
+    With processes > 1 the workbooks are built in that many worker
+    processes instead of on `conn`, since building them is CPU-bound and
+    every client is independent. They're still added to the zip in
+    client_ids order, so the output is the same either way.
+
+    If given, progress(client_id, status) is called as each client starts
+    ('running') and ends ('done', or 'skipped').
+    """
+    progress = progress or (lambda client_id, status: None)
+    if processes > 1 and len(client_ids) > 1:
+        built = _build_in_processes(client_ids, trainer_id, flags, processes, progress)
+    else:
+        built = _build_here(conn, client_ids, trainer_id, flags, progress)
+
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for client_id, export in built:
+            if export is None:
+                progress(client_id, 'skipped')
+                continue
+            safe_name, xlsx, photo_files = export
+
+            yield from _copy_into_zip(zip_file, sink, f'{safe_name}/{safe_name}.xlsx', xlsx)
+
+            for photo_filename, disk_path in photo_files:
+                try:
+                    src = open(disk_path, 'rb')
+                except OSError:
+                    continue  # Removed since the list was built — skip it
+                with src:
+                    yield from _copy_into_zip(zip_file, sink, f'{safe_name}/photos/{photo_filename}', src)
+            progress(client_id, 'done')
+    # Closing the ZipFile writes the central directory.
+    yield sink.drain()
@@ -0,0 +1,984 @@
+"""Versioned schema migrations for TrainerPro.
+
+Replaces the init_* helpers that used to run on every import of app.py,
+each opening its own connection and attempting an ALTER TABLE that almost
+always failed. PRAGMA user_version now records how many entries of
+MIGRATIONS have been applied; run_migrations() applies only the pending
+ones, all inside one transaction, and bumps the version in that same
+transaction. Once a database is current, startup costs a single
+`PRAGMA user_version` read.
+
+Databases that predate this module start at version 0 but already have
+most of this schema, so every step is written to be a no-op against
+objects that already exist (CREATE ... IF NOT EXISTS, add_column checks
+table_info first).
+
+To change the schema, append a new step to MIGRATIONS — never edit or
+reorder one that has shipped. For the same reason steps don't call into
+the application modules: a backfill is written out here in SQL, as it was
+when the step shipped, so changing records.py or search.py later can't
+change what an old step does to a fresh database.
+"""
+import uuid
+from datetime import datetime
+
+from db import get_db
+
+
+def add_column(conn, table, column, decl):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in existing:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+def create_base_schema(conn):
+    """Core tables, as originally created by init_db.py."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            business_name TEXT,
+            theme TEXT DEFAULT 'light',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_column(conn, 'users', 'theme', "TEXT DEFAULT 'light'")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clients (
+            id TEXT PRIMARY KEY,
+            trainer_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT,
+            phone TEXT,
+            age INTEGER,
+            gender TEXT,
+            weight REAL,
+            height REAL,
+            status TEXT DEFAULT 'active',
+            notes TEXT,
+            photo_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (trainer_id) REFERENCES users (id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            trainer_id TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            session_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            session_type TEXT DEFAULT 'training',
+            status TEXT DEFAULT 'scheduled',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (trainer_id) REFERENCES users (id),
+            FOREIGN KEY (client_id) REFERENCES clients (id)
+        )
+    ''')
+    add_column(conn, 'sessions', 'updated_at', 'TIMESTAMP')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS workout_logs (
+            id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            trainer_id TEXT NOT NULL,
+            exercise_name TEXT NOT NULL,
+            sets INTEGER,
+            reps INTEGER,
+            weight REAL,
+            notes TEXT,
+            workout_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            FOREIGN KEY (trainer_id) REFERENCES users (id)
+        )
+    ''')
+    add_column(conn, 'workout_logs', 'sets_data', 'TEXT')
+    add_column(conn, 'workout_logs', 'tags', 'TEXT')
+
+    # Exercise catalogue for autocomplete
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exercises (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            muscle_group TEXT,
+            equipment TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS weight_logs (
+            id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            weight REAL NOT NULL,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            UNIQUE(client_id, date)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS client_notes (
+            id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            trainer_id TEXT NOT NULL,
+            note_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            FOREIGN KEY (trainer_id) REFERENCES users (id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS workout_templates (
+            id TEXT PRIMARY KEY,
+            trainer_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (trainer_id) REFERENCES users (id)
+        )
+    ''')
+    add_column(conn, 'workout_templates', 'updated_at', 'TIMESTAMP')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS template_exercises (
+            id TEXT PRIMARY KEY,
+            template_id TEXT NOT NULL,
+            exercise_name TEXT NOT NULL,
+            sets_data TEXT NOT NULL,
+            notes TEXT,
+            exercise_order INTEGER NOT NULL,
+            FOREIGN KEY (template_id) REFERENCES workout_templates (id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS nutrition_logs (
+            id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            diet TEXT NOT NULL,
+            estimated_calories INTEGER,
+            estimated_sodium INTEGER,
+            estimated_saturated_fat INTEGER,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            UNIQUE(client_id, date)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sleep_logs (
+            id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            hours REAL NOT NULL,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            UNIQUE(client_id, date)
+        )
+    ''')
+
+    # Seed the exercise catalogue if it's empty
+    if conn.execute('SELECT COUNT(*) FROM exercises').fetchone()[0] == 0:
+        conn.executemany('''
+            INSERT INTO exercises (name, muscle_group, equipment)
+            VALUES (?, ?, ?)
+        ''', [
+            ('Bench Press', 'Chest', 'Barbell'),
+            ('Squat', 'Legs', 'Barbell'),
+            ('Deadlift', 'Back', 'Barbell'),
+            ('Pull-ups', 'Back', 'Bodyweight'),
+            ('Push-ups', 'Chest', 'Bodyweight'),
+            ('Shoulder Press', 'Shoulders', 'Dumbbell'),
+            ('Bicep Curls', 'Arms', 'Dumbbell'),
+            ('Tricep Dips', 'Arms', 'Bodyweight'),
+            ('Lunges', 'Legs', 'Bodyweight'),
+            ('Plank', 'Core', 'Bodyweight'),
+        ])
+
+
+def create_client_accounts_table(conn):
+    """Client portal logins plus the per-section permission flags."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS client_accounts (
+            id            TEXT PRIMARY KEY,
+            client_id     TEXT NOT NULL,
+            access_code   TEXT NOT NULL UNIQUE,
+            password_hash TEXT,
+            is_active     INTEGER DEFAULT 1,
+            theme         TEXT DEFAULT 'light',
+            created_at    TIMESTAMP,
+            last_login    TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE CASCADE
+        )
+    ''')
+    add_column(conn, 'client_accounts', 'theme', "TEXT DEFAULT 'light'")
+    for perm in ('workouts', 'weight', 'nutrition', 'sleep', 'photos', 'measurements'):
+        add_column(conn, 'client_accounts', f'perm_{perm}', 'INTEGER DEFAULT 1')
+
+
+def create_activity_log_table(conn):
+    """The activity_log table that records client portal actions.
+
+    Each row is one event the trainer should see in their activity stream:
+    a client creating/editing/deleting a workout, weight, sleep, or nutrition entry.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_log (
+            id           TEXT PRIMARY KEY,
+            trainer_id   TEXT NOT NULL,
+            client_id    TEXT NOT NULL,
+            client_name  TEXT,
+            category     TEXT NOT NULL,
+            action       TEXT NOT NULL,
+            detail       TEXT,
+            created_at   TIMESTAMP NOT NULL
+        )
+    ''')
+
+
+def add_nutrition_protein_column(conn):
+    """estimated_protein on nutrition_logs."""
+    add_column(conn, 'nutrition_logs', 'estimated_protein', 'REAL')
+
+
+def add_template_client_column(conn):
+    """Nullable client_id on workout_templates.
+
+    NULL  = universal template (any client).
+    value = template that belongs to one specific client.
+    """
+    add_column(conn, 'workout_templates', 'client_id', 'TEXT')
+
+
+def add_workout_type_column(conn):
+    """workout_type on workout_logs: 'weightlifting' or 'cardio'.
+
+    Existing rows (logged before this column existed) are backfilled to
+    'weightlifting' so they keep showing up exactly where they did before. A
+    weightlifting and a cardio workout can coexist on the same
+    (client_id, workout_date) without overriding or merging with each other —
+    every query that used to key on date alone keys on (date, workout_type).
+    """
+    add_column(conn, 'workout_logs', 'workout_type', "TEXT NOT NULL DEFAULT 'weightlifting'")
+
+
+def add_template_type_column(conn):
+    """workout_type on workout_templates.
+
+    Same idea as workout_logs' workout_type — existing templates are
+    weightlifting (sets are weight/reps), backfilled accordingly. Cardio
+    templates store distance/duration sets instead.
+    """
+    add_column(conn, 'workout_templates', 'workout_type', "TEXT NOT NULL DEFAULT 'weightlifting'")
+
+
+def create_progress_photos_table(conn):
+    """progress_photos, one row per dated photo entry.
+
+    Mirrors weight_logs: one entry per (client_id, date), photo_url points
+    into static/uploads same as client profile photos.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress_photos (
+            id          TEXT PRIMARY KEY,
+            client_id   TEXT NOT NULL,
+            date        TEXT NOT NULL,
+            photo_url   TEXT NOT NULL,
+            notes       TEXT,
+            created_at  TIMESTAMP NOT NULL,
+            updated_at  TIMESTAMP
+        )
+    ''')
+
+
+def create_body_measurements_table(conn):
+    """body_measurements, one row per dated entry.
+
+    Every measurement column is nullable — the only requirement enforced at
+    the route level is that at least one of them is filled in. Values are
+    stored in inches, matching this app's existing imperial convention
+    (weight is tracked in lbs throughout).
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS body_measurements (
+            id          TEXT PRIMARY KEY,
+            client_id   TEXT NOT NULL,
+            date        TEXT NOT NULL,
+            neck        REAL,
+            shoulders   REAL,
+            chest       REAL,
+            waist       REAL,
+            hips        REAL,
+            bicep       REAL,
+            forearm     REAL,
+            thigh       REAL,
+            calf        REAL,
+            notes       TEXT,
+            created_at  TIMESTAMP NOT NULL,
+            updated_at  TIMESTAMP
+        )
+    ''')
+
+
+QUERY_INDEXES = [
+    # Workout history, conflict checks, detail/duplicate/update/delete — all
+    # key on (client_id, workout_date, workout_type).
+    'CREATE INDEX IF NOT EXISTS idx_workout_logs_client_date_type '
+    'ON workout_logs (client_id, workout_date, workout_type)',
+    # exercise_history: case-insensitive name match, newest date first.
+    'CREATE INDEX IF NOT EXISTS idx_workout_logs_client_type_name '
+    'ON workout_logs (client_id, workout_type, LOWER(exercise_name), workout_date)',
+    # Calendar, dashboard and activity stream ranges.
+    'CREATE INDEX IF NOT EXISTS idx_sessions_trainer_date '
+    'ON sessions (trainer_id, session_date, start_time)',
+    # Client detail / portal upcoming sessions and session history.
+    'CREATE INDEX IF NOT EXISTS idx_sessions_client_date '
+    'ON sessions (client_id, session_date, start_time)',
+    'CREATE INDEX IF NOT EXISTS idx_activity_log_trainer_created '
+    'ON activity_log (trainer_id, created_at)',
+    # Every trainer-scoped client listing and count.
+    'CREATE INDEX IF NOT EXISTS idx_clients_trainer_status '
+    'ON clients (trainer_id, status)',
+    # Latest-weight / latest-sleep lookups are answered from the index alone.
+    'CREATE INDEX IF NOT EXISTS idx_weight_logs_client_date '
+    'ON weight_logs (client_id, date DESC, weight)',
+    'CREATE INDEX IF NOT EXISTS idx_sleep_logs_client_date '
+    'ON sleep_logs (client_id, date DESC, hours)',
+    'CREATE INDEX IF NOT EXISTS idx_client_notes_client_created '
+    'ON client_notes (client_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_progress_photos_client_date '
+    'ON progress_photos (client_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_body_measurements_client_date '
+    'ON body_measurements (client_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_workout_templates_trainer_client '
+    'ON workout_templates (trainer_id, client_id)',
+    'CREATE INDEX IF NOT EXISTS idx_template_exercises_template_order '
+    'ON template_exercises (template_id, exercise_order)',
+    'CREATE INDEX IF NOT EXISTS idx_client_accounts_client '
+    'ON client_accounts (client_id)',
+]
+
+
+def create_query_indexes(conn):
+    """Secondary indexes behind every hot WHERE / ORDER BY.
+
+    Apart from primary keys and UNIQUE constraints the schema had no
+    indexes at all, so each per-client or per-trainer query was a full
+    table scan. tools/check_query_plans.py fails if any of the routes'
+    queries still plan one.
+    """
+    for sql in QUERY_INDEXES:
+        conn.execute(sql)
+
+
+def create_workout_sets_table(conn):
+    """One typed row per set, replacing the JSON in workout_logs.sets_data.
+
+    Backfilled from the existing JSON with json_each(). Rows whose
+    sets_data isn't a JSON array get no sets. The blob itself is kept, so
+    nothing is lost if the backfill turns out wrong; a later step clears
+    it once reading from workout_sets has shipped.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS workout_sets (
+            workout_log_id TEXT NOT NULL,
+            set_number INTEGER NOT NULL,
+            weight REAL,
+            reps INTEGER,
+            rpe REAL,
+            distance REAL,
+            distance_unit TEXT,
+            duration REAL,
+            duration_unit TEXT,
+            speed REAL,
+            speed_unit TEXT,
+            incline REAL,
+            notes TEXT,
+            PRIMARY KEY (workout_log_id, set_number),
+            FOREIGN KEY (workout_log_id) REFERENCES workout_logs (id)
+        ) WITHOUT ROWID
+    ''')
+    # foreign_keys is off on these connections, so cascade by trigger.
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS workout_logs_delete_sets
+        AFTER DELETE ON workout_logs
+        BEGIN
+            DELETE FROM workout_sets WHERE workout_log_id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO workout_sets
+            (workout_log_id, set_number, weight, reps, rpe, distance, distance_unit,
+             duration, duration_unit, speed, speed_unit, incline, notes)
+        SELECT wl.id, s.key + 1,
+               json_extract(s.value, '$.weight'), json_extract(s.value, '$.reps'),
+               json_extract(s.value, '$.rpe'), json_extract(s.value, '$.distance'),
+               json_extract(s.value, '$.distance_unit'), json_extract(s.value, '$.duration'),
+               json_extract(s.value, '$.duration_unit'), json_extract(s.value, '$.speed'),
+               json_extract(s.value, '$.speed_unit'), json_extract(s.value, '$.incline'),
+               json_extract(s.value, '$.notes')
+        FROM workout_logs wl,
+             json_each(CASE WHEN json_valid(wl.sets_data) THEN wl.sets_data ELSE '[]' END) s
+        WHERE json_type(wl.sets_data) = 'array' AND s.type = 'object'
+    ''')
+
+
+# The personal records backfill: records.py's rules as they stood when
+# create_personal_records_tables shipped. Only numeric values count; ties
+# go to the earliest date. {key}: the SQL expression for an exercise's key.
+_BACKFILL_LIFTS = '''
+    SELECT wl.client_id, {key} AS exercise_key, wl.exercise_name,
+           ws.weight, ws.reps, wl.workout_date,
+           CASE WHEN ws.reps = 1 THEN ws.weight ELSE ws.weight * (1 + ws.reps / 30.0) END AS e1rm
+    FROM workout_logs wl
+    JOIN workout_sets ws ON ws.workout_log_id = wl.id
+    WHERE wl.workout_type = 'weightlifting'
+      AND typeof(ws.weight) IN ('integer', 'real') AND ws.weight > 0
+      AND typeof(ws.reps) IN ('integer', 'real') AND ws.reps > 0
+'''
+
+BACKFILL_LIFT_RECORDS_SQL = f'''
+    WITH lifts AS ({_BACKFILL_LIFTS}),
+    ranked AS (
+        SELECT *,
+               ROW_NUMBER() OVER (PARTITION BY client_id, exercise_key
+                                  ORDER BY weight DESC, reps DESC, workout_date) AS weight_rank,
+               ROW_NUMBER() OVER (PARTITION BY client_id, exercise_key
+                                  ORDER BY e1rm DESC, workout_date) AS e1rm_rank
+        FROM lifts
+    )
+    INSERT INTO personal_records
+        (client_id, workout_type, exercise_key, exercise_name,
+         best_weight, best_weight_reps, best_weight_date,
+         best_e1rm, best_e1rm_weight, best_e1rm_reps, best_e1rm_date, updated_at)
+    SELECT w.client_id, 'weightlifting', w.exercise_key, w.exercise_name,
+           w.weight, w.reps, w.workout_date,
+           ROUND(e.e1rm, 1), e.weight, e.reps, e.workout_date, ?
+    FROM ranked w
+    JOIN ranked e ON e.client_id = w.client_id AND e.exercise_key = w.exercise_key AND e.e1rm_rank = 1
+    WHERE w.weight_rank = 1
+'''
+
+# Bare columns alongside MAX() come from the row holding the max.
+BACKFILL_REP_RECORDS_SQL = f'''
+    WITH lifts AS ({_BACKFILL_LIFTS})
+    INSERT INTO rep_records (client_id, exercise_key, weight, reps, workout_date)
+    SELECT client_id, exercise_key, weight, MAX(reps), workout_date
+    FROM lifts
+    GROUP BY client_id, exercise_key, weight
+'''
+
+BACKFILL_PACE_RECORDS_SQL = '''
+    WITH paces AS (
+        SELECT wl.client_id, {key} AS exercise_key, wl.exercise_name,
+               (ws.duration * CASE ws.duration_unit WHEN 'sec' THEN 1 WHEN 'hr' THEN 3600 ELSE 60 END)
+               / (ws.distance * CASE ws.distance_unit WHEN 'km' THEN 1 WHEN 'm' THEN 0.001
+                                                      WHEN 'yd' THEN 0.0009144 ELSE 1.609344 END) AS pace,
+               ws.distance, ws.distance_unit, ws.duration, ws.duration_unit, wl.workout_date
+        FROM workout_logs wl
+        JOIN workout_sets ws ON ws.workout_log_id = wl.id
+        WHERE wl.workout_type = 'cardio'
+          AND typeof(ws.distance) IN ('integer', 'real') AND ws.distance > 0
+          AND typeof(ws.duration) IN ('integer', 'real') AND ws.duration > 0
+    ),
+    ranked AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY client_id, exercise_key
+                                     ORDER BY pace, workout_date) AS pace_rank
+        FROM paces
+    )
+    INSERT INTO personal_records
+        (client_id, workout_type, exercise_key, exercise_name,
+         best_pace, best_pace_distance, best_pace_distance_unit,
+         best_pace_duration, best_pace_duration_unit, best_pace_date, updated_at)
+    SELECT client_id, 'cardio', exercise_key, exercise_name,
+           ROUND(pace, 1), distance, COALESCE(distance_unit, 'mi'),
+           duration, COALESCE(duration_unit, 'min'), workout_date, ?
+    FROM ranked
+    WHERE pace_rank = 1
+'''
+
+
+def _backfill_records(conn, key):
+    now = datetime.now()
+    conn.execute(BACKFILL_LIFT_RECORDS_SQL.format(key=key), (now,))
+    conn.execute(BACKFILL_REP_RECORDS_SQL.format(key=key))
+    conn.execute(BACKFILL_PACE_RECORDS_SQL.format(key=key), (now,))
+
+
+def create_personal_records_tables(conn):
+    """Per-exercise PRs and rep maxes, maintained by records.refresh_records().
+
+    Filled from the sets already logged.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS personal_records (
+            client_id TEXT NOT NULL,
+            workout_type TEXT NOT NULL,
+            exercise_key TEXT NOT NULL,
+            exercise_name TEXT NOT NULL,
+            best_weight REAL,
+            best_weight_reps INTEGER,
+            best_weight_date DATE,
+            best_e1rm REAL,
+            best_e1rm_weight REAL,
+            best_e1rm_reps INTEGER,
+            best_e1rm_date DATE,
+            best_pace REAL,
+            best_pace_distance REAL,
+            best_pace_distance_unit TEXT,
+            best_pace_duration REAL,
+            best_pace_duration_unit TEXT,
+            best_pace_date DATE,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (client_id, workout_type, exercise_key),
+            FOREIGN KEY (client_id) REFERENCES clients (id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rep_records (
+            client_id TEXT NOT NULL,
+            exercise_key TEXT NOT NULL,
+            weight REAL NOT NULL,
+            reps INTEGER NOT NULL,
+            workout_date DATE,
+            PRIMARY KEY (client_id, exercise_key, weight),
+            FOREIGN KEY (client_id) REFERENCES clients (id)
+        ) WITHOUT ROWID
+    ''')
+    _backfill_records(conn, 'LOWER(wl.exercise_name)')
+
+
+def create_export_jobs_tables(conn):
+    """Background export jobs (see export_jobs.py) and their per-client progress."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            trainer_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            flags TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP,
+            expires_at TIMESTAMP,
+            FOREIGN KEY (trainer_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS export_job_clients (
+            job_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            client_id TEXT NOT NULL,
+            client_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            PRIMARY KEY (job_id, position),
+            FOREIGN KEY (job_id) REFERENCES export_jobs (id)
+        ) WITHOUT ROWID
+    ''')
+    # purge_expired_jobs() looks jobs up by expiry and by staleness.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_expires ON export_jobs (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_status_updated ON export_jobs (status, updated_at)')
+
+
+def add_client_latest_weight_columns(conn):
+    """clients.latest_weight / latest_weight_date, kept by client_metrics.py.
+
+    Backfilled for every client from weight_logs.
+    """
+    add_column(conn, 'clients', 'latest_weight', 'REAL')
+    add_column(conn, 'clients', 'latest_weight_date', 'DATE')
+    conn.execute('''
+        UPDATE clients
+        SET (latest_weight, latest_weight_date) = (
+            SELECT weight, date FROM weight_logs
+            WHERE client_id = clients.id
+            ORDER BY date DESC
+            LIMIT 1
+        )
+    ''')
+
+
+# (table, kind, id expression, trainer_id, client_id, title, body, columns
+# whose change re-indexes the row) for the search triggers.
+SEARCH_SOURCES = [
+    ('clients', 'client', '{row}.id', '{row}.trainer_id', '{row}.id', '{row}.name',
+     "COALESCE({row}.email, '') || ' ' || COALESCE({row}.phone, '') || ' ' || COALESCE({row}.notes, '')",
+     'name, email, phone, notes, trainer_id'),
+    ('client_notes', 'note', '{row}.id', '{row}.trainer_id', '{row}.client_id', "''",
+     '{row}.note_text', 'note_text'),
+    ('exercises', 'exercise', 'CAST({row}.id AS TEXT)', 'NULL', 'NULL', '{row}.name',
+     "COALESCE({row}.muscle_group, '') || ' ' || COALESCE({row}.equipment, '')",
+     'name, muscle_group, equipment'),
+]
+
+
+def create_search_index(conn):
+    """FTS5 search over clients, client notes and exercises (see search.py).
+
+    Kept current by insert/update/delete triggers on the three source
+    tables, then filled from what's already there (the same documents
+    search.rebuild_search_index() builds).
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_docs (
+            doc_id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            ref_id TEXT NOT NULL,
+            trainer_id TEXT,
+            client_id TEXT,
+            UNIQUE (kind, ref_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            kind, title, body,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    for table, kind, ref_id, trainer_id, client_id, title, body, watched in SEARCH_SOURCES:
+        new = {key: value.format(row='NEW') for key, value in
+               (('ref_id', ref_id), ('trainer_id', trainer_id), ('client_id', client_id),
+                ('title', title), ('body', body))}
+        old_ref = ref_id.format(row='OLD')
+        doc = f"(SELECT doc_id FROM search_docs WHERE kind = '{kind}' AND ref_id = {{ref}})"
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO search_docs (kind, ref_id, trainer_id, client_id)
+                VALUES ('{kind}', {new['ref_id']}, {new['trainer_id']}, {new['client_id']});
+                INSERT INTO search_index (rowid, kind, title, body)
+                VALUES (last_insert_rowid(), '{kind}', {new['title']}, {new['body']});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update
+            AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                UPDATE search_docs SET trainer_id = {new['trainer_id']}, client_id = {new['client_id']}
+                WHERE kind = '{kind}' AND ref_id = {new['ref_id']};
+                UPDATE search_index SET title = {new['title']}, body = {new['body']}
+                WHERE rowid = {doc.format(ref=new['ref_id'])};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = {doc.format(ref=old_ref)};
+                DELETE FROM search_docs WHERE kind = '{kind}' AND ref_id = {old_ref};
+            END
+        ''')
+    conn.execute('''
+        INSERT INTO search_docs (kind, ref_id, trainer_id, client_id)
+        SELECT 'client', id, trainer_id, id FROM clients
+        UNION ALL
+        SELECT 'note', id, trainer_id, client_id FROM client_notes
+        UNION ALL
+        SELECT 'exercise', CAST(id AS TEXT), NULL, NULL FROM exercises
+    ''')
+    conn.execute('''
+        INSERT INTO search_index (rowid, kind, title, body)
+        SELECT d.doc_id, d.kind, c.name,
+               COALESCE(c.email, '') || ' ' || COALESCE(c.phone, '') || ' ' || COALESCE(c.notes, '')
+        FROM search_docs d JOIN clients c ON c.id = d.ref_id
+        WHERE d.kind = 'client'
+        UNION ALL
+        SELECT d.doc_id, d.kind, '', n.note_text
+        FROM search_docs d JOIN client_notes n ON n.id = d.ref_id
+        WHERE d.kind = 'note'
+        UNION ALL
+        SELECT d.doc_id, d.kind, e.name,
+               COALESCE(e.muscle_group, '') || ' ' || COALESCE(e.equipment, '')
+        FROM search_docs d JOIN exercises e ON e.id = d.ref_id
+        WHERE d.kind = 'exercise'
+    ''')
+
+
+def create_exercise_usage_index(conn):
+    """Per-trainer exercise usage counts for exercise_index.py, read from
+    the index alone."""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_workout_logs_trainer_name
+        ON workout_logs (trainer_id, LOWER(exercise_name), exercise_name)
+    ''')
+
+
+def add_calendar_version(conn):
+    """users.calendar_version / calendar_changed_at, the validators for
+    the calendar feed (see calendar_feed.py). Bumped by trigger on any
+    change to a trainer's sessions or a rename of one of their clients.
+
+    calendar_changed_at is UTC, like the triggers' datetime('now'), and
+    starts at the time of this migration for every trainer with sessions.
+    (sessions' own created_at/updated_at are local time, so they can't
+    seed it.)
+    """
+    add_column(conn, 'users', 'calendar_version', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'users', 'calendar_changed_at', 'TIMESTAMP')
+    bump = '''
+        UPDATE users
+        SET calendar_version = calendar_version + 1, calendar_changed_at = datetime('now')
+        WHERE id = {row}.trainer_id;
+    '''
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS sessions_calendar_{event.lower()}
+            AFTER {event} ON sessions
+            BEGIN
+                {bump.format(row=row)}
+            END
+        ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS clients_calendar_rename
+        AFTER UPDATE OF name ON clients
+        BEGIN
+            {bump.format(row='NEW')}
+        END
+    ''')
+    conn.execute('''
+        UPDATE users SET calendar_changed_at = datetime('now')
+        WHERE EXISTS (SELECT 1 FROM sessions WHERE trainer_id = users.id)
+    ''')
+
+
+def create_session_series_tables(conn):
+    """Recurring sessions (see recurrence.py): session_series holds the
+    rule, session_series_exceptions the deleted occurrences, and
+    sessions.series_id / occurrence_date mark a materialized occurrence.
+    The unique index stops one occurrence being materialized twice.
+
+    Series and exception writes bump calendar_version like session writes
+    do, since they change what the calendar shows.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_series (
+            id TEXT PRIMARY KEY,
+            trainer_id TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            until DATE,
+            rrule TEXT NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            session_type TEXT DEFAULT 'training',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (trainer_id) REFERENCES users (id),
+            FOREIGN KEY (client_id) REFERENCES clients (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_session_series_trainer ON session_series (trainer_id, until)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_session_series_client ON session_series (client_id, until)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_series_exceptions (
+            series_id TEXT NOT NULL,
+            occurrence_date DATE NOT NULL,
+            PRIMARY KEY (series_id, occurrence_date)
+        ) WITHOUT ROWID
+    ''')
+    add_column(conn, 'sessions', 'series_id', 'TEXT')
+    add_column(conn, 'sessions', 'occurrence_date', 'DATE')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_series_occurrence
+        ON sessions (series_id, occurrence_date) WHERE series_id IS NOT NULL
+    ''')
+
+    bump = '''
+        UPDATE users
+        SET calendar_version = calendar_version + 1, calendar_changed_at = datetime('now')
+        WHERE id = {trainer};
+    '''
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS session_series_calendar_{event.lower()}
+            AFTER {event} ON session_series
+            BEGIN
+                {bump.format(trainer=f'{row}.trainer_id')}
+            END
+        ''')
+    for event, row in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS session_series_exceptions_calendar_{event.lower()}
+            AFTER {event} ON session_series_exceptions
+            BEGIN
+                {bump.format(trainer=f'(SELECT trainer_id FROM session_series WHERE id = {row}.series_id)')}
+            END
+        ''')
+
+
+def create_activity_daily_table(conn):
+    """activity_daily: activity_log events past retention, counted per
+    trainer, day, client, category and action (see activity.py)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            trainer_id   TEXT NOT NULL,
+            day          DATE NOT NULL,
+            client_id    TEXT NOT NULL,
+            category     TEXT NOT NULL,
+            action       TEXT NOT NULL,
+            client_name  TEXT,
+            events       INTEGER NOT NULL,
+            PRIMARY KEY (trainer_id, day, client_id, category, action)
+        ) WITHOUT ROWID
+    ''')
+
+
+def create_template_versions_table(conn):
+    """Immutable template versions (see template_versions.py).
+
+    template_exercises rows now belong to a version and carry a slot_id,
+    the exercise's identity across versions, and removed marks a
+    tombstone. workout_templates.version_id is the current version, and
+    workout_logs.template_version_id the version a workout came from.
+    Every existing template becomes version 1, a snapshot of the
+    exercises it has now.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS template_versions (
+            id TEXT PRIMARY KEY,
+            template_id TEXT NOT NULL,
+            parent_id TEXT,
+            version INTEGER NOT NULL,
+            depth INTEGER NOT NULL DEFAULT 0,
+            exercise_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (template_id) REFERENCES workout_templates (id),
+            UNIQUE (template_id, version)
+        )
+    ''')
+    add_column(conn, 'workout_templates', 'version_id', 'TEXT')
+    add_column(conn, 'template_exercises', 'version_id', 'TEXT')
+    add_column(conn, 'template_exercises', 'slot_id', 'TEXT')
+    add_column(conn, 'template_exercises', 'removed', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'workout_logs', 'template_version_id', 'TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_template_exercises_version ON template_exercises (version_id)')
+
+    templates = conn.execute('''
+        SELECT t.id, COALESCE(t.updated_at, t.created_at) AS changed_at,
+               (SELECT COUNT(*) FROM template_exercises WHERE template_id = t.id) AS exercise_count
+        FROM workout_templates t
+        WHERE t.version_id IS NULL
+    ''').fetchall()
+    for template in templates:
+        version_id = str(uuid.uuid4())
+        conn.execute('''
+            INSERT INTO template_versions (id, template_id, parent_id, version, depth, exercise_count, created_at)
+            VALUES (?, ?, NULL, 1, 0, ?, ?)
+        ''', (version_id, template['id'], template['exercise_count'], template['changed_at']))
+        conn.execute('UPDATE workout_templates SET version_id = ? WHERE id = ?', (version_id, template['id']))
+        conn.execute('''
+            UPDATE template_exercises SET version_id = ?, slot_id = id
+            WHERE template_id = ? AND version_id IS NULL
+        ''', (version_id, template['id']))
+
+
+def add_workout_exercise_key(conn):
+    """workout_logs.exercise_key, written by workouts.py with every row
+    (see records.exercise_key()), in place of LOWER(exercise_name).
+
+    SQLite's LOWER() only folds ASCII, so it disagreed with the keys
+    Python built for a name like "Überzug" and records for such exercises
+    were never kept. Backfilled with the rule as it stands here (trimmed,
+    str.lower()); personal records are then rebuilt on the new keys.
+    """
+    add_column(conn, 'workout_logs', 'exercise_key', 'TEXT')
+    rows = conn.execute('SELECT id, exercise_name FROM workout_logs').fetchall()
+    conn.executemany('UPDATE workout_logs SET exercise_key = ? WHERE id = ?',
+                     [((row['exercise_name'] or '').strip().lower(), row['id']) for row in rows])
+    conn.execute('DROP INDEX IF EXISTS idx_workout_logs_client_type_name')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_workout_logs_client_type_key
+        ON workout_logs (client_id, workout_type, exercise_key, workout_date)
+    ''')
+    conn.execute('DELETE FROM personal_records')
+    conn.execute('DELETE FROM rep_records')
+    _backfill_records(conn, 'wl.exercise_key')
+
+
+def create_exercise_key_usage_index(conn):
+    """idx_workout_logs_trainer_name again, on exercise_key instead of
+    LOWER(exercise_name), for exercise_index.py's usage counts."""
+    conn.execute('DROP INDEX IF EXISTS idx_workout_logs_trainer_name')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_workout_logs_trainer_key
+        ON workout_logs (trainer_id, exercise_key, exercise_name)
+    ''')
+
+
+# Ordered; a database at user_version N has had the first N applied.
+MIGRATIONS = [
+    create_base_schema,
+    create_client_accounts_table,
+    create_activity_log_table,
+    add_nutrition_protein_column,
+    add_template_client_column,
+    add_workout_type_column,
+    add_template_type_column,
+    create_progress_photos_table,
+    create_body_measurements_table,
+    create_query_indexes,
+    create_workout_sets_table,
+    create_personal_records_tables,
+    create_export_jobs_tables,
+    add_client_latest_weight_columns,
+    create_search_index,
+    create_exercise_usage_index,
+    add_calendar_version,
+    create_session_series_tables,
+    create_activity_daily_table,
+    create_template_versions_table,
+    add_workout_exercise_key,
+    create_exercise_key_usage_index,
+]
+
+
+def run_migrations():
+    """Bring the database up to len(MIGRATIONS). Returns the final version.
+
+    Pending steps run in a single IMMEDIATE transaction. The version is read
+    again after taking the write lock, so when several WSGI workers start at
+    once only the first one migrates and the rest see it already done.
+    """
+    target = len(MIGRATIONS)
+    conn = get_db()
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= target:
+            return version
+
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn)
+            print(f'[migrations] {number}: {step.__name__}')
+        conn.execute(f'PRAGMA user_version = {max(version, target)}')
+        conn.commit()
+        return max(version, target)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
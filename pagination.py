@@ -0,0 +1,108 @@
+"""Keyset ("cursor") pagination for long listings.
+
+A page is the next PAGE_SIZE rows after a cursor in the listing's ORDER
+BY. The cursor holds the ORDER BY values of the last row shown, always
+ending in a unique column (the row's id) so ties can't repeat or skip
+rows. It is packed into an opaque URL-safe token. Unlike OFFSET, a deep
+page costs the same as the first: the cursor becomes a WHERE condition
+that seeks straight to it through the index serving the ORDER BY.
+
+Listing routes render their first page into the template. With
+?format=json&cursor=... they return the next page instead, as rendered
+rows plus the following cursor, which static/js/load_more.js appends.
+"""
+import base64
+import json
+
+from flask import jsonify, render_template, request
+from werkzeug.exceptions import BadRequest
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """The list of values in a cursor token, or None for no cursor."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise BadRequest('Invalid cursor')
+    if not isinstance(values, list):
+        raise BadRequest('Invalid cursor')
+    return values
+
+
+def _after_cursor(order, values):
+    """WHERE condition for "rows after `values` in `order`", plus its params."""
+    directions = {direction for _, _, direction in order}
+    if len(directions) == 1:
+        # One direction throughout: a row-value comparison, which SQLite can
+        # turn into an index range.
+        op = '<' if directions == {'DESC'} else '>'
+        columns = ', '.join(expr for expr, _, _ in order)
+        return f'({columns}) {op} ({", ".join("?" for _ in order)})', list(values)
+
+    # Mixed directions: (a after x) OR (a = x AND b after y) OR ...
+    terms, params = [], []
+    for i, (expr, _, direction) in enumerate(order):
+        equal = [f'{e} = ?' for e, _, _ in order[:i]]
+        op = '<' if direction == 'DESC' else '>'
+        terms.append('(' + ' AND '.join(equal + [f'{expr} {op} ?']) + ')')
+        params += values[:i] + [values[i]]
+    return ' OR '.join(terms), params
+
+
+def page_sql(sql, order, after_cursor=False, group_by=None):
+    """The statement keyset_page() runs: `sql`, then the cursor condition
+    if `after_cursor`, `group_by`, the ORDER BY and a LIMIT ?."""
+    if after_cursor:
+        sql += f' AND ({_after_cursor(order, [None] * len(order))[0]})'
+    if group_by:
+        sql += f' GROUP BY {group_by}'
+    return sql + ' ORDER BY ' + ', '.join(f'{expr} {direction}' for expr, _, direction in order) + ' LIMIT ?'
+
+
+def keyset_page(conn, sql, params, order, cursor=None, group_by=None, limit=PAGE_SIZE):
+    """Fetch one page of `sql`, a SELECT ending in its WHERE clause.
+
+    `order` is a list of (expression, result_key, 'ASC' or 'DESC'). The
+    last entry must be unique per row, and result_key names the column
+    of the result holding that expression's value. `group_by` is added
+    after the cursor condition.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    params = list(params)
+    values = decode_cursor(cursor)
+    if values is not None:
+        if len(values) != len(order):
+            raise BadRequest('Invalid cursor')
+        params += _after_cursor(order, values)[1]
+
+    rows = conn.execute(page_sql(sql, order, values is not None, group_by), params + [limit + 1]).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][key] for _, key, _ in order])
+
+
+def wants_next_page():
+    """True for a load-more request rather than the listing page itself."""
+    return request.args.get('format') == 'json'
+
+
+def next_page_response(template, next_cursor, **context):
+    """JSON for a load-more request: the page's rows rendered by the
+    listing's row template, and the cursor for the page after.
+
+    `context` is what the row template expects, e.g. weight_history=rows.
+    """
+    return jsonify({
+        'html': render_template(template, **context),
+        'next_cursor': next_cursor,
+    })
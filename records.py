@@ -0,0 +1,244 @@
+"""Personal records per (client, workout_type, exercise).
+
+personal_records holds one row per exercise a client has logged:
+  - best weight (heaviest set with at least one rep)
+  - best estimated 1RM (Epley: weight * (1 + reps / 30))
+  - best cardio pace, normalised to seconds per km
+
+rep_records holds the most reps done at each weight, for "best reps at
+X lbs".
+
+Exercises are keyed by exercise_key(): the name trimmed and lowercased.
+workouts.py stores it on every workout_logs row, and SQL compares that
+column rather than LOWER(exercise_name), which only folds ASCII and so
+would never match a name like "Überzug". It's how exercise_history
+matches exercises and what idx_workout_logs_client_type_key indexes.
+Every route that writes or deletes workout_logs calls
+refresh_records() for the exercises it touched. That recomputes just
+those keys from workout_sets in SQL, so a deleted or edited set can lower
+a record as well as raise it, and reading a record is a primary-key
+lookup.
+
+Logging a new weightlifting workout only adds sets, which can raise a
+record but never lower one. add_lift_records() folds just the new sets
+into the stored rows, without reading the exercise's history.
+"""
+from datetime import datetime
+
+# Only numeric values count — the portal can send '' for an empty field,
+# and SQLite orders any text above every number.
+_NUMERIC = "typeof({col}) IN ('integer', 'real') AND {col} > 0"
+
+_KEY_SETS = '''
+    FROM workout_logs wl
+    JOIN workout_sets ws ON ws.workout_log_id = wl.id
+    WHERE wl.client_id = ? AND wl.workout_type = ? AND wl.exercise_key = ?
+'''
+
+_LIFT_FILTER = (' AND ' + _NUMERIC.format(col='ws.weight')
+                + ' AND ' + _NUMERIC.format(col='ws.reps'))
+
+EPLEY_SQL = 'CASE WHEN ws.reps = 1 THEN ws.weight ELSE ws.weight * (1 + ws.reps / 30.0) END'
+
+PACE_SQL = '''
+    (ws.duration * CASE ws.duration_unit WHEN 'sec' THEN 1 WHEN 'hr' THEN 3600 ELSE 60 END)
+    / (ws.distance * CASE ws.distance_unit WHEN 'km' THEN 1 WHEN 'm' THEN 0.001
+                                           WHEN 'yd' THEN 0.0009144 ELSE 1.609344 END)
+'''
+
+LOGGED_NAMES_SQL = '''
+    SELECT DISTINCT exercise_name FROM workout_logs
+    WHERE client_id = ? AND workout_date = ? AND workout_type = ?
+'''
+
+BEST_LIFT_SQL = f'''
+    SELECT wl.exercise_name, ws.weight, ws.reps, wl.workout_date {_KEY_SETS} {_LIFT_FILTER}
+    ORDER BY ws.weight DESC, ws.reps DESC, wl.workout_date LIMIT 1
+'''
+
+BEST_E1RM_SQL = f'''
+    SELECT {EPLEY_SQL} AS e1rm, ws.weight, ws.reps, wl.workout_date {_KEY_SETS} {_LIFT_FILTER}
+    ORDER BY e1rm DESC, wl.workout_date LIMIT 1
+'''
+
+# Bare columns alongside MAX() come from the row holding the max.
+REP_RECORDS_SQL = f'''
+    INSERT INTO rep_records (client_id, exercise_key, weight, reps, workout_date)
+    SELECT ?, ?, ws.weight, MAX(ws.reps), wl.workout_date {_KEY_SETS} {_LIFT_FILTER}
+    GROUP BY ws.weight
+'''
+
+BEST_PACE_SQL = f'''
+    SELECT wl.exercise_name, {PACE_SQL} AS pace, ws.distance, ws.distance_unit,
+           ws.duration, ws.duration_unit, wl.workout_date
+    {_KEY_SETS}
+      AND {_NUMERIC.format(col='ws.distance')} AND {_NUMERIC.format(col='ws.duration')}
+    ORDER BY pace, wl.workout_date LIMIT 1
+'''
+
+
+def exercise_key(name):
+    """The key `name` is stored and looked up under."""
+    return (name or '').strip().lower()
+
+
+def logged_exercise_names(conn, client_id, workout_date, workout_type):
+    """Names logged for one (date, type) workout — call before deleting it."""
+    rows = conn.execute(LOGGED_NAMES_SQL, (client_id, workout_date, workout_type)).fetchall()
+    return {row['exercise_name'] for row in rows}
+
+
+def refresh_records(conn, client_id, workout_type, names):
+    """Recompute the records of each exercise in `names` from workout_sets.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    for key in {exercise_key(name) for name in names}:
+        if workout_type == 'cardio':
+            _refresh_cardio(conn, client_id, key)
+        else:
+            _refresh_lifts(conn, client_id, key)
+
+
+def _refresh_lifts(conn, client_id, key):
+    params = (client_id, 'weightlifting', key)
+    best = conn.execute(BEST_LIFT_SQL, params).fetchone()
+
+    conn.execute('DELETE FROM rep_records WHERE client_id = ? AND exercise_key = ?', (client_id, key))
+    if best is None:
+        conn.execute('''
+            DELETE FROM personal_records
+            WHERE client_id = ? AND workout_type = 'weightlifting' AND exercise_key = ?
+        ''', (client_id, key))
+        return
+
+    e1rm = conn.execute(BEST_E1RM_SQL, params).fetchone()
+    conn.execute(REP_RECORDS_SQL, (client_id, key) + params)
+
+    conn.execute('''
+        INSERT OR REPLACE INTO personal_records
+            (client_id, workout_type, exercise_key, exercise_name,
+             best_weight, best_weight_reps, best_weight_date,
+             best_e1rm, best_e1rm_weight, best_e1rm_reps, best_e1rm_date, updated_at)
+        VALUES (?, 'weightlifting', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (client_id, key, best['exercise_name'],
+          best['weight'], best['reps'], best['workout_date'],
+          round(e1rm['e1rm'], 1), e1rm['weight'], e1rm['reps'], e1rm['workout_date'],
+          datetime.now()))
+
+
+def _epley(weight, reps):
+    # Same as EPLEY_SQL.
+    return weight if reps == 1 else weight * (1 + reps / 30.0)
+
+
+def add_lift_records(conn, client_id, workout_date, exercises):
+    """Raise weightlifting records with newly inserted sets.
+
+    `exercises` is [{'name', 'sets': [{'weight', 'reps', ...}]}] with
+    numbers already converted (see workouts.py). Only correct for sets that
+    were just added; after an edit or delete use refresh_records(). Ties go
+    to the earlier date, as in _refresh_lifts().
+    """
+    by_key = {}
+    for exercise in exercises:
+        lifts = [(s['weight'], s['reps']) for s in exercise['sets']
+                 if (s.get('weight') or 0) > 0 and (s.get('reps') or 0) > 0]
+        if lifts:
+            by_key.setdefault(exercise_key(exercise['name']), (exercise['name'], []))[1].extend(lifts)
+
+    for key, (name, lifts) in by_key.items():
+        weight, reps = max(lifts)
+        e1rm_weight, e1rm_reps = max(lifts, key=lambda lift: _epley(*lift))
+        best = {'exercise_name': name,
+                'best_weight': weight, 'best_weight_reps': reps, 'best_weight_date': workout_date,
+                'best_e1rm_weight': e1rm_weight, 'best_e1rm_reps': e1rm_reps, 'best_e1rm_date': workout_date}
+        current = conn.execute('''
+            SELECT * FROM personal_records
+            WHERE client_id = ? AND workout_type = 'weightlifting' AND exercise_key = ?
+        ''', (client_id, key)).fetchone()
+        if current:
+            old = (current['best_weight'], current['best_weight_reps'])
+            if old > (weight, reps) or (old == (weight, reps) and current['best_weight_date'] <= workout_date):
+                best.update(exercise_name=current['exercise_name'], best_weight=old[0],
+                            best_weight_reps=old[1], best_weight_date=current['best_weight_date'])
+            old_e1rm = _epley(current['best_e1rm_weight'], current['best_e1rm_reps'])
+            new_e1rm = _epley(e1rm_weight, e1rm_reps)
+            if old_e1rm > new_e1rm or (old_e1rm == new_e1rm and current['best_e1rm_date'] <= workout_date):
+                best.update(best_e1rm_weight=current['best_e1rm_weight'],
+                            best_e1rm_reps=current['best_e1rm_reps'], best_e1rm_date=current['best_e1rm_date'])
+
+        conn.execute('''
+            INSERT OR REPLACE INTO personal_records
+                (client_id, workout_type, exercise_key, exercise_name,
+                 best_weight, best_weight_reps, best_weight_date,
+                 best_e1rm, best_e1rm_weight, best_e1rm_reps, best_e1rm_date, updated_at)
+            VALUES (?, 'weightlifting', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (client_id, key, best['exercise_name'],
+              best['best_weight'], best['best_weight_reps'], best['best_weight_date'],
+              round(_epley(best['best_e1rm_weight'], best['best_e1rm_reps']), 1),
+              best['best_e1rm_weight'], best['best_e1rm_reps'], best['best_e1rm_date'],
+              datetime.now()))
+
+        rep_maxes = {}
+        for weight, reps in lifts:
+            rep_maxes[weight] = max(reps, rep_maxes.get(weight, 0))
+        conn.executemany('''
+            INSERT INTO rep_records (client_id, exercise_key, weight, reps, workout_date)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (client_id, exercise_key, weight) DO UPDATE
+            SET reps = excluded.reps, workout_date = excluded.workout_date
+            WHERE excluded.reps > rep_records.reps
+        ''', [(client_id, key, weight, reps, workout_date) for weight, reps in rep_maxes.items()])
+
+
+def _refresh_cardio(conn, client_id, key):
+    best = conn.execute(BEST_PACE_SQL, (client_id, 'cardio', key)).fetchone()
+
+    if best is None:
+        conn.execute('''
+            DELETE FROM personal_records
+            WHERE client_id = ? AND workout_type = 'cardio' AND exercise_key = ?
+        ''', (client_id, key))
+        return
+
+    conn.execute('''
+        INSERT OR REPLACE INTO personal_records
+            (client_id, workout_type, exercise_key, exercise_name,
+             best_pace, best_pace_distance, best_pace_distance_unit,
+             best_pace_duration, best_pace_duration_unit, best_pace_date, updated_at)
+        VALUES (?, 'cardio', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (client_id, key, best['exercise_name'], round(best['pace'], 1),
+          best['distance'], best['distance_unit'] or 'mi',
+          best['duration'], best['duration_unit'] or 'min',
+          best['workout_date'], datetime.now()))
+
+
+def record_to_dict(row):
+    """One personal_records row as JSON, without the columns that don't apply."""
+    data = {
+        'exercise_name': row['exercise_name'],
+        'workout_type': row['workout_type'],
+    }
+    if row['workout_type'] == 'cardio':
+        data['best_pace'] = {
+            'seconds_per_km': row['best_pace'],
+            'distance': row['best_pace_distance'],
+            'distance_unit': row['best_pace_distance_unit'],
+            'duration': row['best_pace_duration'],
+            'duration_unit': row['best_pace_duration_unit'],
+            'date': row['best_pace_date'],
+        }
+    else:
+        data['best_weight'] = {
+            'weight': row['best_weight'],
+            'reps': row['best_weight_reps'],
+            'date': row['best_weight_date'],
+        }
+        data['estimated_1rm'] = {
+            'value': row['best_e1rm'],
+            'weight': row['best_e1rm_weight'],
+            'reps': row['best_e1rm_reps'],
+            'date': row['best_e1rm_date'],
+        }
+    return data
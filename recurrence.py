@@ -0,0 +1,287 @@
+"""Recurring session series.
+
+A standing appointment ("Mon/Wed/Fri 7am until June") is one
+session_series row holding an RRULE-style rule, rather than a sessions
+row per appointment. Only the subset trainers need is supported:
+
+    FREQ=DAILY|WEEKLY;INTERVAL=n;BYDAY=MO,WE,FR
+
+with the end date kept in session_series.until (NULL = open-ended) so a
+window query can skip finished series.
+
+Occurrences are expanded lazily, for the window a page asks for. Each
+one is a session-shaped dict whose id is "<series id>:<YYYY-MM-DD>", so
+the calendar can treat it like any other session. An occurrence only
+becomes a sessions row when it stops being a plain copy of its series:
+completing, cancelling or editing it calls materialize(), which inserts
+that one row with series_id and occurrence_date set. Deleting an
+occurrence records the date in session_series_exceptions instead (and
+deletes its sessions row, if it had one). Either way, expansion skips
+that date from then on.
+"""
+import uuid
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+# Occurrence ids are "<series id>:<YYYY-MM-DD>"; session ids are UUIDs.
+_SEP = ':'
+
+SERIES_IN_RANGE_SQL = '''
+    SELECT ss.*, c.name AS client_name
+    FROM session_series ss
+    JOIN clients c ON ss.client_id = c.id
+    WHERE ss.trainer_id = ? AND ss.start_date <= ? AND (ss.until IS NULL OR ss.until >= ?)
+'''
+
+# Series still running on or after a date, for one client or trainer.
+UPCOMING_SERIES_SQL = '''
+    SELECT ss.*, c.name AS client_name
+    FROM session_series ss
+    JOIN clients c ON ss.client_id = c.id
+    WHERE ss.{owner} = ? AND (ss.until IS NULL OR ss.until >= ?)
+'''
+
+SKIP_SQL = 'INSERT OR IGNORE INTO session_series_exceptions (series_id, occurrence_date) VALUES (?, ?)'
+
+# {ids}: one ? per series; {bound}: the optional upper date bound.
+TAKEN_DATES_SQL = '''
+    SELECT series_id, occurrence_date FROM sessions
+    WHERE series_id IN ({ids}) AND occurrence_date >= ? {bound}
+    UNION ALL
+    SELECT series_id, occurrence_date FROM session_series_exceptions
+    WHERE series_id IN ({ids}) AND occurrence_date >= ? {bound}
+'''
+
+
+def parse_rrule(text):
+    """(freq, interval, weekdays) from a rule string; weekdays are 0=Monday."""
+    parts = dict(part.split('=', 1) for part in text.split(';') if '=' in part)
+    freq = parts.get('FREQ', 'WEEKLY')
+    if freq not in ('DAILY', 'WEEKLY'):
+        raise ValueError(f'Unsupported FREQ {freq!r}')
+    interval = max(1, int(parts.get('INTERVAL', 1)))
+    weekdays = sorted({WEEKDAYS.index(day) for day in parts.get('BYDAY', '').split(',') if day})
+    return freq, interval, weekdays
+
+
+def format_rrule(freq, interval, weekdays):
+    rule = f'FREQ={freq};INTERVAL={interval}'
+    if freq == 'WEEKLY':
+        rule += ';BYDAY=' + ','.join(WEEKDAYS[day] for day in sorted(weekdays))
+    return rule
+
+
+def occurrence_dates(series, start, end=None):
+    """Dates the series falls on from `start` to `end` (inclusive; None =
+    until the series ends, which may be never — take what you need)."""
+    freq, interval, weekdays = parse_rrule(series['rrule'])
+    first = date.fromisoformat(series['start_date'])
+    if series['until']:
+        until = date.fromisoformat(series['until'])
+        end = min(end, until) if end else until
+    day = max(start, first)
+    week_zero = first - timedelta(days=first.weekday())
+    while end is None or day <= end:
+        if freq == 'DAILY':
+            if (day - first).days % interval == 0:
+                yield day
+        elif ((day - week_zero).days // 7) % interval == 0 and day.weekday() in weekdays:
+            yield day
+        day += timedelta(days=1)
+
+
+def occurrence_id(series_id, day):
+    return f'{series_id}{_SEP}{day.isoformat() if isinstance(day, date) else day}'
+
+
+def split_occurrence_id(session_id):
+    """(series_id, date) for an occurrence id, or None for a session id."""
+    series_id, sep, day = session_id.rpartition(_SEP)
+    if not sep:
+        return None
+    try:
+        return series_id, date.fromisoformat(day)
+    except ValueError:
+        return None
+
+
+def _virtual(series, day):
+    return {
+        'id': occurrence_id(series['id'], day),
+        'trainer_id': series['trainer_id'],
+        'client_id': series['client_id'],
+        'client_name': series['client_name'] if 'client_name' in series.keys() else None,
+        'session_date': day.isoformat(),
+        'start_time': series['start_time'],
+        'end_time': series['end_time'],
+        'session_type': series['session_type'],
+        'status': 'scheduled',
+        'notes': series['notes'],
+        'series_id': series['id'],
+        'occurrence_date': day.isoformat(),
+    }
+
+
+def _taken_dates(conn, series_ids, start, end=None):
+    """{(series_id, 'YYYY-MM-DD')} of occurrences that are materialized or
+    deleted, so expansion must skip them."""
+    if not series_ids:
+        return set()
+    sql = TAKEN_DATES_SQL.format(ids=', '.join('?' for _ in series_ids),
+                                 bound='AND occurrence_date <= ?' if end else '')
+    params = [*series_ids, start.isoformat()] + ([end.isoformat()] if end else [])
+    rows = conn.execute(sql, params + params).fetchall()
+    return {(row['series_id'], row['occurrence_date']) for row in rows}
+
+
+def trainer_occurrences(conn, trainer_id, start, end):
+    """A trainer's series occurrences from start to end, as session dicts."""
+    series = conn.execute(SERIES_IN_RANGE_SQL,
+                          (trainer_id, end.isoformat(), start.isoformat())).fetchall()
+    taken = _taken_dates(conn, [s['id'] for s in series], start, end)
+    return [_virtual(s, day)
+            for s in series
+            for day in occurrence_dates(s, start, end)
+            if (s['id'], day.isoformat()) not in taken]
+
+
+def merge_upcoming(conn, rows, limit, client_id=None, trainer_id=None, today=None):
+    """`rows` (the next `limit` sessions from today, in order, for one
+    client or one trainer) with series occurrences merged in, still
+    `limit` long at most. Each series contributes at most `limit`
+    occurrences, so this never expands further ahead than it must."""
+    today = today or datetime.now().date()
+    owner, owner_id = ('client_id', client_id) if client_id else ('trainer_id', trainer_id)
+    series = conn.execute(UPCOMING_SERIES_SQL.format(owner=owner),
+                          (owner_id, today.isoformat())).fetchall()
+    if not series:
+        return rows
+    taken = _taken_dates(conn, [s['id'] for s in series], today)
+    upcoming = [dict(row) for row in rows]
+    for s in series:
+        dates = (day for day in occurrence_dates(s, today) if (s['id'], day.isoformat()) not in taken)
+        upcoming += [_virtual(s, day) for day in islice(dates, limit)]
+    upcoming.sort(key=lambda s: (s['session_date'], s['start_time']))
+    return upcoming[:limit]
+
+
+def get_series(conn, series_id, trainer_id):
+    return conn.execute('SELECT * FROM session_series WHERE id = ? AND trainer_id = ?',
+                        (series_id, trainer_id)).fetchone()
+
+
+def _live_occurrence(conn, session_id, trainer_id):
+    """(series, day) if `session_id` names an occurrence that's still
+    virtual, else None."""
+    parsed = split_occurrence_id(session_id)
+    if not parsed:
+        return None
+    series_id, day = parsed
+    series = get_series(conn, series_id, trainer_id)
+    if not series or next(occurrence_dates(series, day, day), None) != day:
+        return None
+    if (series_id, day.isoformat()) in _taken_dates(conn, [series_id], day, day):
+        return None
+    return series, day
+
+
+def virtual_session(conn, session_id, trainer_id):
+    """The occurrence `session_id` names as a session dict, or None."""
+    found = _live_occurrence(conn, session_id, trainer_id)
+    return _virtual(found[0], found[1]) if found else None
+
+
+def materialize(conn, session_id, trainer_id):
+    """Turn a virtual occurrence into a sessions row and return the row.
+
+    A session id is just looked up. Returns None if neither exists for
+    this trainer. Runs in the caller's transaction.
+    """
+    found = _live_occurrence(conn, session_id, trainer_id)
+    if found:
+        series, day = found
+        session_id = str(uuid.uuid4())
+        conn.execute('''
+            INSERT INTO sessions (id, trainer_id, client_id, session_date, start_time, end_time,
+                                  session_type, status, notes, created_at, series_id, occurrence_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'scheduled', ?, ?, ?, ?)
+        ''', (session_id, trainer_id, series['client_id'], day.isoformat(), series['start_time'],
+              series['end_time'], series['session_type'], series['notes'], datetime.now(),
+              series['id'], day.isoformat()))
+    return conn.execute('SELECT * FROM sessions WHERE id = ? AND trainer_id = ?',
+                        (session_id, trainer_id)).fetchone()
+
+
+def skip_occurrence(conn, session_id, trainer_id):
+    """Delete a virtual occurrence. False if it isn't one."""
+    found = _live_occurrence(conn, session_id, trainer_id)
+    if not found:
+        return False
+    series, day = found
+    conn.execute(SKIP_SQL, (series['id'], day.isoformat()))
+    return True
+
+
+def remove_session(conn, session):
+    """Delete a sessions row. A materialized occurrence is also recorded
+    as skipped, or its series would expand that date again."""
+    conn.execute('DELETE FROM sessions WHERE id = ?', (session['id'],))
+    if session['series_id'] and session['occurrence_date']:
+        conn.execute(SKIP_SQL, (session['series_id'], session['occurrence_date']))
+
+
+def series_rule(session_date, repeat):
+    """(rrule, until) for a series starting on `session_date`.
+
+    `repeat` is {'freq': 'daily'|'weekly', 'interval': n, 'weekdays':
+    [0-6], and at most one of 'until': 'YYYY-MM-DD' or 'count': n}.
+    Weekly with no weekdays repeats on session_date's weekday. A count is
+    turned into the date of the last occurrence. Raises ValueError on a
+    bad rule.
+    """
+    start = date.fromisoformat(session_date)
+    freq = str(repeat.get('freq', 'weekly')).upper()
+    weekdays = [int(day) for day in repeat.get('weekdays') or [start.weekday()]]
+    if any(day not in range(7) for day in weekdays):
+        raise ValueError('weekdays must be 0 (Monday) to 6 (Sunday)')
+    rule = format_rrule(freq, max(1, int(repeat.get('interval') or 1)), weekdays)
+    parse_rrule(rule)
+
+    until = repeat.get('until') or None
+    if until:
+        until = date.fromisoformat(until).isoformat()
+    elif repeat.get('count'):
+        count = int(repeat['count'])
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        dates = occurrence_dates({'rrule': rule, 'start_date': start.isoformat(), 'until': None}, start)
+        until = list(islice(dates, count))[-1].isoformat()
+    return rule, until
+
+
+def create_series(conn, trainer_id, client_id, session_date, start_time, end_time,
+                  session_type, notes, rule, until):
+    """Insert a series (rule and until from series_rule) and return its id."""
+    start = date.fromisoformat(session_date)
+    series_id = str(uuid.uuid4())
+    conn.execute('''
+        INSERT INTO session_series (id, trainer_id, client_id, start_date, until, rrule,
+                                    start_time, end_time, session_type, notes, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (series_id, trainer_id, client_id, start.isoformat(), until, rule,
+          start_time, end_time, session_type, notes, datetime.now()))
+    return series_id
+
+
+def end_series(conn, series, from_date):
+    """Stop `series` before `from_date`; if that's on or before its first
+    date the series is deleted outright. Occurrences already materialized
+    stay as ordinary sessions."""
+    if from_date <= date.fromisoformat(series['start_date']):
+        conn.execute('DELETE FROM session_series_exceptions WHERE series_id = ?', (series['id'],))
+        conn.execute('DELETE FROM session_series WHERE id = ?', (series['id'],))
+    else:
+        conn.execute('UPDATE session_series SET until = ?, updated_at = ? WHERE id = ?',
+                     ((from_date - timedelta(days=1)).isoformat(), datetime.now(), series['id']))
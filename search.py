@@ -0,0 +1,98 @@
+"""Full-text search over clients, client notes and the exercise catalogue.
+
+search_index is an FTS5 table with one row per searchable thing:
+  - client: title = name, body = email, phone and notes
+  - note: body = note_text (the client's name is joined in at query time,
+    so renaming a client doesn't leave stale note titles behind)
+  - exercise: title = name, body = muscle group and equipment
+
+search_docs maps each FTS rowid back to what it indexes and whose it is.
+Triggers on clients, client_notes and exercises (created in migrations.py)
+keep both tables in step with every write, so nothing in the routes has
+to remember to. The FTS table keeps 2- and 3-character prefix indexes,
+which makes the as-you-type prefix queries fast.
+"""
+import re
+
+# Title matches count ten times a body match; kind never scores.
+RANK = 'bm25(search_index, 0.0, 10.0, 1.0)'
+
+KINDS = ('client', 'note', 'exercise')
+
+SEARCH_SQL = f'''
+    SELECT d.kind, d.ref_id, d.client_id, c.name AS client_name, search_index.title,
+           snippet(search_index, 2, '', '', '…', 12) AS snippet
+    FROM search_index
+    JOIN search_docs d ON d.doc_id = search_index.rowid
+    LEFT JOIN clients c ON c.id = d.client_id
+    WHERE search_index MATCH ? AND (d.trainer_id = ? OR d.trainer_id IS NULL)
+    ORDER BY {RANK}
+    LIMIT ?
+'''
+
+# Ids of this trainer's clients matching a query, on their own row or one
+# of their notes — for filtering /clients.
+CLIENT_IDS_SQL = '''
+    SELECT d.client_id
+    FROM search_index
+    JOIN search_docs d ON d.doc_id = search_index.rowid
+    WHERE search_index MATCH ? AND d.trainer_id = ?
+'''
+
+
+def fts_query(text, kinds=None):
+    """An FTS5 MATCH expression for what a user typed, or None if it has
+    no searchable words.
+
+    Every word must match, each as a prefix, so "ben pr" finds "Bench
+    Press". Words are quoted, which keeps FTS5 operators and punctuation in
+    user input from being parsed as query syntax. `kinds` restricts the
+    match to those kinds of row.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    query = '{title body} : (' + ' '.join(f'"{word}"*' for word in words) + ')'
+    if kinds:
+        query = 'kind : (' + ' OR '.join(kinds) + ') AND ' + query
+    return query
+
+
+def search_all(conn, trainer_id, text, kinds=None, limit=20):
+    """Best matches for `text` among this trainer's clients and notes and
+    the exercise catalogue, as dicts, best first."""
+    query = fts_query(text, kinds)
+    if query is None:
+        return []
+    return [dict(row) for row in conn.execute(SEARCH_SQL, (query, trainer_id, limit))]
+
+
+def rebuild_search_index(conn):
+    """Re-index everything from the source tables. Runs inside the caller's
+    transaction."""
+    conn.execute('DELETE FROM search_index')
+    conn.execute('DELETE FROM search_docs')
+    conn.execute('''
+        INSERT INTO search_docs (kind, ref_id, trainer_id, client_id)
+        SELECT 'client', id, trainer_id, id FROM clients
+        UNION ALL
+        SELECT 'note', id, trainer_id, client_id FROM client_notes
+        UNION ALL
+        SELECT 'exercise', CAST(id AS TEXT), NULL, NULL FROM exercises
+    ''')
+    conn.execute('''
+        INSERT INTO search_index (rowid, kind, title, body)
+        SELECT d.doc_id, d.kind, c.name,
+               COALESCE(c.email, '') || ' ' || COALESCE(c.phone, '') || ' ' || COALESCE(c.notes, '')
+        FROM search_docs d JOIN clients c ON c.id = d.ref_id
+        WHERE d.kind = 'client'
+        UNION ALL
+        SELECT d.doc_id, d.kind, '', n.note_text
+        FROM search_docs d JOIN client_notes n ON n.id = d.ref_id
+        WHERE d.kind = 'note'
+        UNION ALL
+        SELECT d.doc_id, d.kind, e.name,
+               COALESCE(e.muscle_group, '') || ' ' || COALESCE(e.equipment, '')
+        FROM search_docs d JOIN exercises e ON e.id = d.ref_id
+        WHERE d.kind = 'exercise'
+    ''')
@@ -0,0 +1,47 @@
+// Live client activity over Server-Sent Events (see activity.py).
+//
+// Opens /api/activity/live and re-dispatches each event on document as
+// 'activity-live', with the activity_log row as `detail`. Pages that show
+// activity listen for it and insert the row themselves. EventSource
+// reconnects by itself (with Last-Event-ID) whenever the server ends a
+// stream, but gives up for good on an error status, such as the 503 sent
+// when the server has no stream to spare. Then a new one is opened after
+// RETRY_MS, carrying on from the last event seen.
+(function () {
+  if (!window.EventSource) return;
+  const RETRY_MS = 15000;  // activity.py's LIVE_POLL_SECONDS
+  let lastEventId = '';
+
+  function connect() {
+    const query = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : '';
+    const source = new EventSource(`/api/activity/live${query}`);
+    source.addEventListener('activity', e => {
+      lastEventId = e.lastEventId;
+      document.dispatchEvent(new CustomEvent('activity-live', { detail: JSON.parse(e.data) }));
+    });
+    source.addEventListener('error', () => {
+      if (source.readyState === EventSource.CLOSED) setTimeout(connect, RETRY_MS);
+    });
+  }
+  connect();
+})();
+
+const ACTIVITY_ICONS = {
+  workout: 'fa-dumbbell', weight: 'fa-weight-scale', sleep: 'fa-moon',
+  nutrition: 'fa-utensils', photos: 'fa-camera', measurements: 'fa-ruler',
+};
+
+// An element, with its text (not HTML) and class set.
+function activityEl(tag, className, text) {
+  const el = document.createElement(tag);
+  if (className) el.className = className;
+  if (text !== undefined) el.textContent = text;
+  return el;
+}
+
+// The category icon both activity lists show.
+function activityIcon(category) {
+  const box = activityEl('div', `activity-icon ${category}`);
+  box.appendChild(activityEl('i', `fas ${ACTIVITY_ICONS[category] || 'fa-circle-info'}`));
+  return box;
+}
@@ -0,0 +1,39 @@
+// "Load more" buttons for keyset-paginated listings (see pagination.py).
+//
+//   <button class="js-load-more" data-target="entryList" data-cursor="...">
+//
+// Fetches the current page's URL (filters and all) with
+// ?format=json&cursor=..., appends the returned rows to #entryList, then
+// moves the cursor on, or removes the button after the last page. The
+// target gets a 'rows-loaded' event so the page can decorate the new rows
+// (date formatting and the like) the same way it did the first page.
+document.addEventListener('click', async function (e) {
+  const btn = e.target.closest('.js-load-more');
+  if (!btn || btn.disabled) return;
+
+  const target = document.getElementById(btn.dataset.target);
+  const url = new URL(window.location.href);
+  url.searchParams.set('format', 'json');
+  url.searchParams.set('cursor', btn.dataset.cursor);
+
+  const label = btn.innerHTML;
+  btn.disabled = true;
+  btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Loading…';
+  try {
+    const r = await fetch(url);
+    if (!r.ok) throw new Error('Load failed');
+    const page = await r.json();
+    target.insertAdjacentHTML('beforeend', page.html);
+    target.dispatchEvent(new CustomEvent('rows-loaded', { bubbles: true }));
+    if (page.next_cursor) {
+      btn.dataset.cursor = page.next_cursor;
+    } else {
+      btn.remove();
+      return;
+    }
+  } catch (err) {
+    alert('Error loading more entries. Please try again.');
+  }
+  btn.disabled = false;
+  btn.innerHTML = label;
+});
@@ -0,0 +1,68 @@
+// Sidebar search box (templates/_search_box.html), backed by /api/search.
+//
+// Queries as the trainer types, at most one request in flight per box;
+// a response for anything but the latest input is dropped. Clients and
+// notes link to the client's page, exercises are listed for reference.
+(function () {
+  const ICONS = { client: 'fa-user', note: 'fa-sticky-note', exercise: 'fa-dumbbell' };
+
+  function renderResults(list, results) {
+    list.innerHTML = '';
+    if (!results.length) {
+      const empty = document.createElement('div');
+      empty.className = 'search-box-empty';
+      empty.textContent = 'No matches';
+      list.appendChild(empty);
+      return;
+    }
+    for (const r of results) {
+      const item = document.createElement(r.url ? 'a' : 'div');
+      item.className = 'search-box-item';
+      if (r.url) item.href = r.url;
+      const icon = document.createElement('i');
+      icon.className = `fas ${ICONS[r.kind] || 'fa-circle'}`;
+      const text = document.createElement('div');
+      const title = document.createElement('div');
+      title.className = 'search-box-title';
+      title.textContent = r.title || '';
+      const snippet = document.createElement('div');
+      snippet.className = 'search-box-snippet';
+      snippet.textContent = (r.snippet || '').trim();
+      text.append(title, snippet);
+      item.append(icon, text);
+      list.appendChild(item);
+    }
+  }
+
+  function attach(box) {
+    const input = box.querySelector('.search-box-input');
+    const list = box.querySelector('.search-box-results');
+    let timer = null;
+    let latest = '';
+
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      const q = input.value.trim();
+      latest = q;
+      if (!q) { list.hidden = true; return; }
+      timer = setTimeout(async () => {
+        try {
+          const r = await fetch(`/api/search?q=${encodeURIComponent(q)}`);
+          if (!r.ok) return;
+          const results = await r.json();
+          if (q !== latest) return;
+          renderResults(list, results);
+          list.hidden = false;
+        } catch (err) { /* leave the last results up */ }
+      }, 150);
+    });
+    input.addEventListener('keydown', e => {
+      if (e.key === 'Escape') { input.value = ''; latest = ''; list.hidden = true; }
+    });
+    document.addEventListener('click', e => {
+      if (!box.contains(e.target)) list.hidden = true;
+    });
+  }
+
+  document.querySelectorAll('.js-search-box').forEach(attach);
+})();
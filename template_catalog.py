@@ -0,0 +1,137 @@
+"""A trainer's workout templates, parsed once and cached per trainer.
+
+The import picker on the workout forms asks for /api/templates/list and
+then /api/templates/<id> every time it opens. Both are served from
+trainer_templates(): one query for all of a trainer's templates with
+their exercises resolved at the current version (template_versions.py),
+with every sets_data parsed, cached in-process per trainer.
+
+Each template's ETag is a hash of its JSON, and the catalogue's is a hash
+of all of them, so the validators are strong (same ETag, same bytes) and
+agree across workers that read the same rows. A picker that opens twice
+revalidates and gets a 304 without touching the database.
+
+create_template, update_template, delete_template and the template
+conversion in delete_client call invalidate_templates() for the trainer.
+As with the dashboard cache, the entry is dropped again at teardown, after
+the route has committed. Invalidation only reaches the process that did
+the write. TEMPLATE_CACHE_TTL bounds how stale another worker's copy can
+get.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from flask import g, has_app_context
+
+from template_versions import TRAINER_TEMPLATES_SQL
+
+TEMPLATE_CACHE_TTL = 5 * 60
+
+_cache = {}
+# Bumped on every invalidation, so a load that raced with a write doesn't
+# cache what it read.
+_generations = {}
+_cache_lock = threading.Lock()
+
+
+def _digest(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _load_catalog(conn, trainer_id):
+    templates = {}
+    for row in conn.execute(TRAINER_TEMPLATES_SQL, (trainer_id, trainer_id)):
+        template = templates.get(row['id'])
+        if template is None:
+            template = templates[row['id']] = {
+                'id': row['id'],
+                'name': row['name'],
+                'client_id': row['client_id'],
+                'workout_type': row['workout_type'] or 'weightlifting',
+                'version_id': row['version_id'],
+                'version': row['version'],
+                'exercises': [],
+            }
+        if row['exercise_name'] is not None:
+            template['exercises'].append({
+                'name': row['exercise_name'],
+                'sets': json.loads(row['sets_data']) if row['sets_data'] else [],
+                'notes': row['notes'],
+                'order': row['exercise_order'],
+            })
+    by_id = {template_id: (template, _digest(template)) for template_id, template in templates.items()}
+    return {
+        'templates': list(templates.values()),
+        'by_id': by_id,
+        'etag': hashlib.sha1(''.join(etag for _, etag in by_id.values()).encode()).hexdigest(),
+    }
+
+
+def trainer_templates(conn, trainer_id):
+    """This trainer's template catalogue, cached: {'templates': [...] in
+    name order, 'by_id': {id: (template, etag)}, 'etag': ...}.
+
+    Treat it as read-only; it's shared by every request until invalidated.
+    `conn` is only used on a cache miss.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(trainer_id)
+        generation = _generations.get(trainer_id, 0)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    catalog = _load_catalog(conn, trainer_id)
+    with _cache_lock:
+        if _generations.get(trainer_id, 0) == generation:
+            _cache[trainer_id] = (now + TEMPLATE_CACHE_TTL, catalog)
+    return catalog
+
+
+def template_listing(catalog, client_id=None, workout_type=None):
+    """(rows, etag) for the import dropdown: universal templates, plus
+    `client_id`'s own ahead of them when given, optionally of one
+    workout_type."""
+    templates = [t for t in catalog['templates']
+                 if (t['client_id'] is None or (client_id and t['client_id'] == client_id))
+                 and (not workout_type or t['workout_type'] == workout_type)]
+    if client_id:
+        templates.sort(key=lambda t: t['client_id'] is None)
+    rows = [{
+        'id': t['id'],
+        'name': t['name'],
+        'is_client_specific': bool(t['client_id']),
+        'workout_type': t['workout_type'],
+    } for t in templates]
+    etag = hashlib.sha1(f"{catalog['etag']}:{client_id or ''}:{workout_type or ''}".encode()).hexdigest()
+    return rows, etag
+
+
+def _evict(trainer_ids):
+    with _cache_lock:
+        for trainer_id in trainer_ids:
+            _cache.pop(trainer_id, None)
+            _generations[trainer_id] = _generations.get(trainer_id, 0) + 1
+
+
+def invalidate_templates(trainer_id):
+    """Drop a trainer's cached templates. Call from any write to their
+    workout_templates or template_exercises."""
+    _evict([trainer_id])
+    if has_app_context():
+        g.setdefault('_templates_stale', set()).add(trainer_id)
+
+
+def _drop_stale(exc=None):
+    """teardown_appcontext hook: drop again whatever this request invalidated."""
+    _evict(g.pop('_templates_stale', ()))
+
+
+def register_template_cache(app):
+    """Set the TTL from app config (TEMPLATE_CACHE_TTL, seconds) and install
+    the teardown hook."""
+    global TEMPLATE_CACHE_TTL
+    TEMPLATE_CACHE_TTL = app.config.get('TEMPLATE_CACHE_TTL', TEMPLATE_CACHE_TTL)
+    app.teardown_appcontext(_drop_stale)
@@ -0,0 +1,178 @@
+"""Workout templates as immutable versions that store only what changed.
+
+A template's exercises live in template_versions. Each save adds a
+version pointing at its parent (the version it was edited from) and
+holding template_exercises rows only for the exercises that changed:
+
+    slot_id   the exercise's identity across versions
+    removed   1 for a tombstone: the exercise was taken out here
+
+Resolving a version walks its chain back to the nearest snapshot and, per
+slot, keeps the row from the newest version that has one. That is one
+recursive query (VERSION_EXERCISES_SQL for one version,
+TRAINER_TEMPLATES_SQL for all of a trainer's templates at their current
+versions). Version 1 is always a snapshot with every exercise. So that
+chains stay short, every TEMPLATE_SNAPSHOT_DEPTH-th version is written as
+a full snapshot too; it still points at its parent, but resolution stops
+there.
+
+Versions are never changed once written, so a workout's
+template_version_id (set by the import picker and by bulk assignment)
+keeps meaning what the template said on the day it was used. Deleting a
+template deletes all its versions. The workouts keep their own copies of
+the exercises, and their template_version_id then points at nothing.
+
+The editors send the whole exercise list without ids. An exercise is
+matched to the slot of the same name (the first unclaimed one, for
+repeated names), so an unchanged exercise costs nothing on save. A
+renamed one becomes a tombstone plus a new slot.
+"""
+import json
+import uuid
+from datetime import datetime
+
+# Versions between full snapshots.
+TEMPLATE_SNAPSHOT_DEPTH = 20
+
+# chain: one version and its ancestors back to the nearest snapshot
+# (depth 0), nearest first. Per slot, the newest row wins.
+VERSION_EXERCISES_SQL = '''
+    WITH RECURSIVE chain (version_id, parent_id, depth, step) AS (
+        SELECT id, parent_id, depth, 0 FROM template_versions WHERE id = ?
+        UNION ALL
+        SELECT v.id, v.parent_id, v.depth, chain.step + 1
+        FROM chain JOIN template_versions v ON v.id = chain.parent_id
+        WHERE chain.depth > 0
+    )
+    SELECT slot_id, exercise_name, sets_data, notes, exercise_order
+    FROM (
+        SELECT e.slot_id, e.exercise_name, e.sets_data, e.notes, e.exercise_order, e.removed,
+               ROW_NUMBER() OVER (PARTITION BY e.slot_id ORDER BY chain.step) AS pick
+        FROM chain JOIN template_exercises e ON e.version_id = chain.version_id
+    )
+    WHERE pick = 1 AND NOT removed
+    ORDER BY exercise_order, slot_id
+'''
+
+# Every template of a trainer at its current version, each followed by
+# its exercises in order (none for an empty template).
+TRAINER_TEMPLATES_SQL = '''
+    WITH RECURSIVE chain (template_id, version_id, parent_id, depth, step) AS (
+        SELECT t.id, v.id, v.parent_id, v.depth, 0
+        FROM workout_templates t JOIN template_versions v ON v.id = t.version_id
+        WHERE t.trainer_id = ?
+        UNION ALL
+        SELECT chain.template_id, v.id, v.parent_id, v.depth, chain.step + 1
+        FROM chain JOIN template_versions v ON v.id = chain.parent_id
+        WHERE chain.depth > 0
+    ),
+    resolved AS (
+        SELECT chain.template_id, e.slot_id, e.exercise_name, e.sets_data, e.notes, e.exercise_order, e.removed,
+               ROW_NUMBER() OVER (PARTITION BY chain.template_id, e.slot_id ORDER BY chain.step) AS pick
+        FROM chain JOIN template_exercises e ON e.version_id = chain.version_id
+    )
+    SELECT t.id, t.name, t.client_id, t.workout_type, t.version_id, v.version,
+           r.exercise_name, r.sets_data, r.notes, r.exercise_order
+    FROM workout_templates t
+    JOIN template_versions v ON v.id = t.version_id
+    LEFT JOIN resolved r ON r.template_id = t.id AND r.pick = 1 AND NOT r.removed
+    WHERE t.trainer_id = ?
+    ORDER BY t.name COLLATE NOCASE, t.id, r.exercise_order, r.slot_id
+'''
+
+HEAD_VERSION_SQL = '''
+    SELECT v.id, v.version, v.depth
+    FROM workout_templates t JOIN template_versions v ON v.id = t.version_id
+    WHERE t.id = ?
+'''
+
+TRAINER_VERSION_SQL = '''
+    SELECT v.template_id FROM template_versions v
+    JOIN workout_templates t ON t.id = v.template_id
+    WHERE v.id = ? AND t.trainer_id = ?
+'''
+
+INSERT_EXERCISE_SQL = '''
+    INSERT INTO template_exercises (id, template_id, version_id, slot_id, exercise_name, sets_data, notes,
+                                    exercise_order, removed)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def version_exercises(conn, version_id):
+    """A version's exercises, resolved: [{'slot_id', 'name', 'sets',
+    'notes', 'order'}] in order."""
+    return [{
+        'slot_id': row['slot_id'],
+        'name': row['exercise_name'],
+        'sets': json.loads(row['sets_data']) if row['sets_data'] else [],
+        'notes': row['notes'],
+        'order': row['exercise_order'],
+    } for row in conn.execute(VERSION_EXERCISES_SQL, (version_id,))]
+
+
+def trainer_template_version(conn, trainer_id, version_id):
+    """The template_id `version_id` belongs to, if it's one of this
+    trainer's template versions, else None."""
+    row = conn.execute(TRAINER_VERSION_SQL, (version_id, trainer_id)).fetchone()
+    return row['template_id'] if row else None
+
+
+def _claim_slots(current, exercises):
+    """Pair each submitted exercise with the current slot it edits, or None
+    for a new one. Returns (pairs, current exercises left unclaimed)."""
+    by_name = {}
+    for exercise in current:
+        by_name.setdefault(exercise['name'], []).append(exercise)
+    pairs = [(exercise, by_name[exercise['name']].pop(0) if by_name.get(exercise['name']) else None)
+             for exercise in exercises]
+    return pairs, [exercise for left in by_name.values() for exercise in left]
+
+
+def _changed(old, exercise):
+    return (old is None or old['sets'] != exercise['sets']
+            or (old['notes'] or '') != (exercise.get('notes') or '')
+            or old['order'] != exercise['order'])
+
+
+def save_template_version(conn, template_id, exercises):
+    """Make `exercises` ([{'name', 'sets', 'notes', 'order'}], as the
+    editors send them) the template's current version.
+
+    Writes a version holding only the exercises that differ from the
+    current one, plus tombstones for those left out, or a full snapshot
+    for a template's first version and every TEMPLATE_SNAPSHOT_DEPTH-th.
+    Returns the new version's id, or None if nothing changed. Runs in the
+    caller's transaction.
+    """
+    head = conn.execute(HEAD_VERSION_SQL, (template_id,)).fetchone()
+    current = version_exercises(conn, head['id']) if head else []
+    pairs, removed = _claim_slots(current, exercises)
+    if head and not removed and not any(_changed(old, exercise) for exercise, old in pairs):
+        return None
+
+    depth = head['depth'] + 1 if head else 0
+    if depth >= TEMPLATE_SNAPSHOT_DEPTH:
+        depth = 0
+    version_id = str(uuid.uuid4())
+    conn.execute('''
+        INSERT INTO template_versions (id, template_id, parent_id, version, depth, exercise_count, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (version_id, template_id, head['id'] if head else None, head['version'] + 1 if head else 1,
+          depth, len(exercises), datetime.now()))
+
+    rows = [(str(uuid.uuid4()), template_id, version_id, old['slot_id'] if old else str(uuid.uuid4()),
+             exercise['name'], json.dumps(exercise['sets']), exercise.get('notes', ''), exercise['order'], 0)
+            for exercise, old in pairs if depth == 0 or _changed(old, exercise)]
+    if depth:
+        rows += [(str(uuid.uuid4()), template_id, version_id, old['slot_id'], old['name'], '[]', None,
+                  old['order'], 1) for old in removed]
+    conn.executemany(INSERT_EXERCISE_SQL, rows)
+    conn.execute('UPDATE workout_templates SET version_id = ? WHERE id = ?', (version_id, template_id))
+    return version_id
+
+
+def delete_template_versions(conn, template_id):
+    """Delete every version of a template and their exercises."""
+    conn.execute('DELETE FROM template_exercises WHERE template_id = ?', (template_id,))
+    conn.execute('DELETE FROM template_versions WHERE template_id = ?', (template_id,))
@@ -0,0 +1,41 @@
+"""Runs the app against a fresh database in a temp directory:
+
+    python -m pytest tests
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # app.py migrates whatever db.DB_PATH names when it's first imported.
+    db.DB_PATH = str(tmp_path_factory.mktemp('db') / 'trainer_app.db')
+    import app as trainer_app
+    trainer_app.app.config['TESTING'] = True
+    return trainer_app.app
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a new trainer with one client, whose id
+    is on the test client as .client_id."""
+    trainer_id, client_id = str(uuid.uuid4()), str(uuid.uuid4())
+    conn = db.get_pool().acquire()
+    conn.execute("INSERT INTO users (id, name, email, password_hash) VALUES (?, 'Trainer', ?, 'x')",
+                 (trainer_id, f'{trainer_id}@example.com'))
+    conn.execute("INSERT INTO clients (id, trainer_id, name) VALUES (?, ?, 'Client')", (client_id, trainer_id))
+    conn.commit()
+    conn.close()
+
+    test_client = app.test_client()
+    with test_client.session_transaction() as s:
+        s['user_id'] = trainer_id
+    test_client.client_id = client_id
+    return test_client
@@ -0,0 +1,17 @@
+"""Live activity streams are capped per process."""
+import activity
+
+
+def test_streams_past_the_cap_get_503(client, monkeypatch):
+    monkeypatch.setattr(activity, 'LIVE_MAX_STREAMS', 1)
+
+    first = client.get('/api/activity/live', buffered=False)
+    assert first.status_code == 200
+    refused = client.get('/api/activity/live')
+    assert refused.status_code == 503
+    assert refused.get_data(as_text=True).startswith('retry: ')
+
+    first.close()
+    again = client.get('/api/activity/live', buffered=False)
+    assert again.status_code == 200
+    again.close()
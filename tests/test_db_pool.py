@@ -0,0 +1,35 @@
+"""The connection pool takes its size and timeout from app config."""
+import sqlite3
+import time
+
+import pytest
+from flask import Flask
+
+import db
+
+
+@pytest.fixture
+def configured(tmp_path, monkeypatch):
+    """Configure db for a 1-connection pool with a 0.2s timeout, and put
+    the module back afterwards."""
+    for name in ('DB_PATH', 'POOL_SIZE', 'POOL_TIMEOUT', '_pool'):
+        monkeypatch.setattr(db, name, getattr(db, name))
+    db.DB_PATH = str(tmp_path / 'pool.db')
+    app = Flask(__name__)
+    app.config.update(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=0.2)
+    db.register_db_teardown(app)
+
+
+def test_exhausted_pool_gives_up_after_configured_timeout(configured):
+    pool = db.get_pool()
+    assert (pool.size, pool.timeout) == (1, 0.2)
+
+    conn = pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(sqlite3.OperationalError, match='exhausted'):
+        pool.acquire()
+    waited = time.monotonic() - started
+    assert 0.2 <= waited < 2
+
+    conn.close()
+    pool.acquire().close()
@@ -0,0 +1,13 @@
+"""Autocomplete usage counts for names that aren't plain ASCII."""
+
+
+def test_usage_counts_non_ascii_spellings_together(client):
+    for workout_date, name in (('2031-05-01', 'Überzug'), ('2031-05-08', 'ÜBERZUG')):
+        response = client.post(f'/clients/{client.client_id}/workouts', data={
+            'date': workout_date, 'workout_type': 'weightlifting', 'exercise_name[]': name,
+            'exercise_0_weight[]': '40', 'exercise_0_reps[]': '10', 'exercise_0_rpe[]': '',
+        })
+        assert response.status_code == 200, response.get_json()
+
+    [suggestion] = client.get('/api/exercises/search', query_string={'q': 'über'}).get_json()
+    assert suggestion['uses'] == 2
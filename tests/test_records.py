@@ -0,0 +1,29 @@
+"""Personal records and exercise history for names that aren't plain ASCII."""
+import pytest
+
+
+def log_lift(client, workout_date, name, weight):
+    response = client.post(f'/clients/{client.client_id}/workouts', data={
+        'date': workout_date, 'workout_type': 'weightlifting', 'exercise_name[]': name,
+        'exercise_0_weight[]': str(weight), 'exercise_0_reps[]': '5', 'exercise_0_rpe[]': '',
+    })
+    assert response.status_code == 200, response.get_json()
+
+
+def record(client, name):
+    return client.get(f'/api/clients/{client.client_id}/records', query_string={'name': name}).get_json()
+
+
+@pytest.mark.parametrize('name', ['Überzug', 'Développé couché'])
+def test_records_follow_non_ascii_names(client, name):
+    log_lift(client, '2031-04-01', name.upper(), 100)
+    log_lift(client, '2031-04-08', name, 120)
+    assert record(client, name.lower())['best_weight']['weight'] == 120
+
+    # Deleting the heavier workout recomputes the record from what's left.
+    assert client.delete(f'/api/delete-workout/{client.client_id}/2031-04-08?type=weightlifting').status_code == 200
+    assert record(client, name)['best_weight']['weight'] == 100
+
+    history = client.get(f'/api/clients/{client.client_id}/exercise-history',
+                         query_string={'name': name.upper()}).get_json()
+    assert history['found'] and history['workout_date'] == '2031-04-01'
@@ -0,0 +1,39 @@
+"""Concurrent bookings of the same slot: only one gets it."""
+import sys
+import threading
+import time
+
+
+def test_simultaneous_bookings_of_one_slot(client, app, monkeypatch):
+    trainer_app = sys.modules[app.import_name]
+    find_conflicts = trainer_app.find_conflicts
+
+    def slow_find_conflicts(*args, **kwargs):
+        # Hold the gap between the check and the write open.
+        conflicts = find_conflicts(*args, **kwargs)
+        time.sleep(0.05)
+        return conflicts
+
+    monkeypatch.setattr(trainer_app, 'find_conflicts', slow_find_conflicts)
+    with client.session_transaction() as s:
+        trainer_id = s['user_id']
+    barrier = threading.Barrier(4)
+    codes = []
+
+    def book():
+        test_client = app.test_client()
+        with test_client.session_transaction() as s:
+            s['user_id'] = trainer_id
+        barrier.wait()
+        codes.append(test_client.post('/api/sessions', json={
+            'client_id': client.client_id, 'session_date': '2031-06-02', 'start_time': '07:00',
+            'end_time': '08:00',
+        }).status_code)
+
+    threads = [threading.Thread(target=book) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(codes) == [200, 409, 409, 409]
@@ -0,0 +1,38 @@
+"""Recurring series: an occurrence that's been deleted stays deleted."""
+import pytest
+
+FEED = '/api/calendar/sessions?start=2031-03-01&end=2031-03-31'
+
+
+def book_weekly(client, count):
+    """A weekly series starting Monday 2031-03-03. Returns its id."""
+    response = client.post('/api/sessions', json={
+        'client_id': client.client_id, 'session_date': '2031-03-03', 'start_time': '07:00',
+        'end_time': '08:00', 'repeat': {'freq': 'weekly', 'count': count},
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['series_id']
+
+
+def feed_dates(client):
+    return sorted(s['session_date'] for s in client.get(FEED).get_json()['sessions'])
+
+
+def test_deleting_a_virtual_occurrence_skips_it(client):
+    series_id = book_weekly(client, 3)
+
+    assert client.delete(f'/api/sessions/{series_id}:2031-03-10').status_code == 200
+
+    assert feed_dates(client) == ['2031-03-03', '2031-03-17']
+
+
+@pytest.mark.parametrize('action', ['complete', 'cancel'])
+def test_deleting_a_materialized_occurrence_keeps_it_deleted(client, action):
+    series_id = book_weekly(client, 3)
+    assert client.post(f'/api/sessions/{series_id}:2031-03-10/{action}').status_code == 200
+    [row] = [s for s in client.get(FEED).get_json()['sessions'] if s['session_date'] == '2031-03-10']
+    assert row['id'] != f'{series_id}:2031-03-10'  # now a sessions row
+
+    assert client.delete(f"/api/sessions/{row['id']}").status_code == 200
+
+    assert feed_dates(client) == ['2031-03-03', '2031-03-17']
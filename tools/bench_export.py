@@ -0,0 +1,176 @@
+"""Benchmark the per-client export workbook on five years of history.
+
+Builds a throwaway database holding one synthetic client with five years
+of workouts (weightlifting and cardio), daily weight, sleep and nutrition
+logs, and weekly measurements. It then times build_client_export_workbook()
+plus saving the result, and reports rows per second.
+
+    python tools/bench_export.py                  # current exports.py
+    python tools/bench_export.py --against REV    # also exports.py as of git REV
+    python tools/bench_export.py --zip 8          # 8-client zip, 1 vs N processes
+
+--against loads exports.py from that revision (anything since it was split
+out of app.py) and runs it against the same data, for a before/after
+comparison. --zip seeds that many clients instead and times
+stream_client_exports() building them in one process, then across
+--processes worker processes (default: one per core).
+"""
+import argparse
+import importlib.util
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from openpyxl import load_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+YEARS = 5
+LIFTS = ['Bench Press', 'Squat', 'Deadlift', 'Shoulder Press', 'Pull-ups', 'Bicep Curls']
+TAGS = ['Chest,Triceps', 'Legs', 'Back,Biceps', 'Shoulders,Core']
+
+
+def seed(conn, trainer_id, client_id, name='Bench Client'):
+    from records import exercise_key
+    from workout_sets import save_sets
+
+    rng = random.Random(42)
+    conn.execute("INSERT INTO clients (id, trainer_id, name) VALUES (?, ?, ?)", (client_id, trainer_id, name))
+
+    start = date.today() - timedelta(days=365 * YEARS)
+    for offset in range(365 * YEARS):
+        day = (start + timedelta(days=offset)).isoformat()
+        conn.execute('INSERT INTO weight_logs (id, client_id, date, weight) VALUES (?, ?, ?, ?)',
+                     (str(uuid.uuid4()), client_id, day, round(rng.uniform(170, 190), 1)))
+        conn.execute('INSERT INTO sleep_logs (id, client_id, date, hours, notes) VALUES (?, ?, ?, ?, ?)',
+                     (str(uuid.uuid4()), client_id, day, round(rng.uniform(5, 9), 1), ''))
+        conn.execute('''
+            INSERT INTO nutrition_logs (id, client_id, date, diet, estimated_calories, estimated_sodium,
+                                        estimated_saturated_fat, notes)
+            VALUES (?, ?, ?, 'Balanced', ?, ?, ?, '')
+        ''', (str(uuid.uuid4()), client_id, day, rng.randint(1800, 3000), rng.randint(1500, 3000), rng.randint(10, 30)))
+        if offset % 7 == 0:
+            conn.execute('''
+                INSERT INTO body_measurements (id, client_id, date, neck, chest, waist, hips, created_at)
+                VALUES (?, ?, ?, 15, 40, 32, 38, ?)
+            ''', (str(uuid.uuid4()), client_id, day, day))
+
+        if offset % 7 in (0, 2, 4, 5):
+            tags = TAGS[offset % len(TAGS)]
+            for name in rng.sample(LIFTS, 4):
+                sets = [{'weight': rng.choice(range(95, 315, 5)), 'reps': rng.randint(3, 12), 'rpe': rng.choice([None, 7, 8, 9])}
+                        for _ in range(4)]
+                log_id = str(uuid.uuid4())
+                conn.execute('''
+                    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, exercise_key, sets, notes,
+                                              workout_date, tags, workout_type)
+                    VALUES (?, ?, ?, ?, ?, 4, 'Felt good', ?, ?, 'weightlifting')
+                ''', (log_id, client_id, trainer_id, name, exercise_key(name), day, tags))
+                save_sets(conn, log_id, sets)
+        if offset % 7 == 3:
+            log_id = str(uuid.uuid4())
+            conn.execute('''
+                INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, exercise_key, sets, workout_date,
+                                          tags, workout_type)
+                VALUES (?, ?, ?, 'Run', 'run', 1, ?, 'Cardio', 'cardio')
+            ''', (log_id, client_id, trainer_id, day))
+            save_sets(conn, log_id, [{'distance': 3, 'distance_unit': 'mi', 'duration': rng.randint(22, 32),
+                                      'duration_unit': 'min', 'speed': 6, 'speed_unit': 'mph', 'incline': 1}])
+    conn.commit()
+
+
+def load_module(name, source):
+    spec = importlib.util.spec_from_loader(name, loader=None)
+    module = importlib.util.module_from_spec(spec)
+    exec(compile(source, f'{name}.py', 'exec'), module.__dict__)
+    return module
+
+
+def bench(module, conn, trainer_id, client_id, runs):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        _, wb, _ = module.build_client_export_workbook(conn, client_id, trainer_id, True, True, True, True, True)
+        buf = io.BytesIO()
+        wb.save(buf)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    buf.seek(0)
+    return count_rows(buf), best
+
+
+def bench_zip(module, conn, trainer_id, client_ids, processes):
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in module.stream_client_exports(
+        conn, client_ids, trainer_id, True, True, True, True, True, processes=processes))
+    return size, time.perf_counter() - started
+
+
+def count_rows(xlsx):
+    # Write-only files carry no <dimension>, so find each sheet's last row.
+    total = 0
+    for ws in load_workbook(xlsx, read_only=True).worksheets:
+        last = 0
+        for row in ws.iter_rows():
+            cells = [c for c in row if getattr(c, 'row', None)]
+            if cells:
+                last = cells[0].row
+        total += last
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--against', metavar='REV', help='also benchmark exports.py from this git revision')
+    parser.add_argument('--runs', type=int, default=3, help='take the best of this many runs (default 3)')
+    parser.add_argument('--zip', type=int, metavar='CLIENTS', help='time a zip of this many clients instead')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for --zip (default: one per core)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    import db
+    db.DB_PATH = os.path.join(tmpdir, 'bench.db')
+    from migrations import run_migrations
+    run_migrations()
+
+    conn = db.get_db()
+    trainer_id = str(uuid.uuid4())
+    conn.execute("INSERT INTO users (id, name, email, password_hash) VALUES (?, 'Bench', 'bench@example.com', 'x')",
+                 (trainer_id,))
+    client_ids = [str(uuid.uuid4()) for _ in range(args.zip or 1)]
+    for number, client_id in enumerate(client_ids, 1):
+        seed(conn, trainer_id, client_id, f'Bench Client {number}')
+
+    if args.zip:
+        import exports
+        for processes in (1, args.processes):
+            size, seconds = bench_zip(exports, conn, trainer_id, client_ids, processes)
+            print(f'{processes:>3} process(es): {len(client_ids)} clients, {size / 1e6:.1f} MB in {seconds:.2f}s')
+        conn.close()
+        return
+
+    engines = []
+    if args.against:
+        source = subprocess.run(['git', 'show', f'{args.against}:exports.py'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        engines.append((args.against, load_module('exports_baseline', source)))
+    import exports
+    engines.append(('current', exports))
+
+    for label, module in engines:
+        rows, seconds = bench(module, conn, trainer_id, client_ids[0], args.runs)
+        print(f'{label:>12}: {rows} rows in {seconds:.2f}s = {rows / seconds:,.0f} rows/s')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark saving one large workout: 20 exercises of 6 sets each.
+
+Builds a throwaway database with one client who already has a year of
+weightlifting history (so refreshing personal records has real work to
+do), then times writing the workout both ways:
+
+    row by row   what the routes did before workouts.py: one INSERT per
+                 exercise, an executemany of its sets, then recomputing
+                 each exercise's records from its history
+    workouts.py  insert_workout(): two executemany() calls for the whole
+                 workout, then raising records from the new sets alone
+
+Each run writes the workout in a transaction and rolls it back, so every
+run starts from the same database. Reports the best and median of --runs.
+
+    python tools/bench_workout_write.py [--exercises 20] [--sets 6] [--runs 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HISTORY_DAYS = 365
+
+
+def seed(conn, trainer_id, client_id, names):
+    from workouts import exercises_from_json, insert_workout
+
+    rng = random.Random(42)
+    conn.execute("INSERT INTO clients (id, trainer_id, name) VALUES (?, ?, 'Bench Client')", (client_id, trainer_id))
+    start = date.today() - timedelta(days=HISTORY_DAYS)
+    for offset in range(0, HISTORY_DAYS, 2):
+        items = [{'name': name, 'sets': [{'weight': rng.choice(range(45, 315, 5)), 'reps': rng.randint(3, 12)}
+                                         for _ in range(4)]}
+                 for name in rng.sample(names, 6)]
+        insert_workout(conn, client_id, trainer_id, (start + timedelta(days=offset)).isoformat(),
+                       'weightlifting', '', exercises_from_json(items, 'weightlifting'))
+    conn.commit()
+
+
+def row_by_row(conn, client_id, trainer_id, workout_date, exercises):
+    from exercise_index import refresh_exercise_usage
+    from records import exercise_key, refresh_records
+    from workout_sets import save_sets
+
+    for exercise in exercises:
+        sets = exercise['sets']
+        reps = [s['reps'] for s in sets if s['reps']]
+        weights = [s['weight'] for s in sets if s['weight']]
+        log_id = str(uuid.uuid4())
+        conn.execute('''
+            INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, exercise_key, sets, reps, weight, notes,
+                                      workout_date, tags, workout_type, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (log_id, client_id, trainer_id, exercise['name'], exercise_key(exercise['name']), len(sets),
+              sum(reps) // len(reps) if reps else None, sum(weights) / len(weights) if weights else None,
+              exercise['notes'], workout_date, '', 'weightlifting', datetime.now()))
+        save_sets(conn, log_id, sets)
+    names = [e['name'] for e in exercises]
+    refresh_records(conn, client_id, 'weightlifting', names)
+    refresh_exercise_usage(conn, client_id, names)
+
+
+def batched(conn, client_id, trainer_id, workout_date, exercises):
+    from workouts import insert_workout
+    insert_workout(conn, client_id, trainer_id, workout_date, 'weightlifting', '', exercises)
+
+
+def bench(write, conn, client_id, trainer_id, exercises, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        write(conn, client_id, trainer_id, date.today().isoformat(), exercises)
+        times.append(time.perf_counter() - started)
+        conn.rollback()
+    return min(times), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exercises', type=int, default=20, help='exercises in the workout (default 20)')
+    parser.add_argument('--sets', type=int, default=6, help='sets per exercise (default 6)')
+    parser.add_argument('--runs', type=int, default=50, help='timed runs of each (default 50)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    import db
+    db.DB_PATH = os.path.join(tmpdir, 'bench.db')
+    from migrations import run_migrations
+    run_migrations()
+
+    from workouts import exercises_from_json
+
+    conn = db.get_db()
+    trainer_id, client_id = str(uuid.uuid4()), str(uuid.uuid4())
+    conn.execute("INSERT INTO users (id, name, email, password_hash) VALUES (?, 'Bench', 'bench@example.com', 'x')",
+                 (trainer_id,))
+    names = [f'Exercise {n}' for n in range(1, args.exercises + 1)]
+    seed(conn, trainer_id, client_id, names)
+
+    rng = random.Random(7)
+    exercises = exercises_from_json([
+        {'name': name, 'notes': '', 'sets': [{'weight': rng.choice(range(45, 315, 5)), 'reps': rng.randint(3, 12),
+                                              'rpe': rng.choice([None, 7, 8, 9])} for _ in range(args.sets)]}
+        for name in names
+    ], 'weightlifting')
+
+    print(f'{args.exercises} exercises x {args.sets} sets, best / median of {args.runs}:')
+    for label, write in (('row by row', row_by_row), ('workouts.py', batched)):
+        best, median = bench(write, conn, client_id, trainer_id, exercises, args.runs)
+        print(f'{label:>12}: {best * 1000:.2f} ms / {median * 1000:.2f} ms')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
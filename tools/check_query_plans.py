@@ -0,0 +1,209 @@
+"""Fail if any hot route query plans a full table scan.
+
+Copies the database to a temp file, imports app.py against the copy (which
+runs the startup migrations in migrations.py), then runs
+EXPLAIN QUERY PLAN on the SQL each route issues, plus every statement in
+the schema's triggers. Any plan step that scans a whole table is reported
+and the script exits non-zero.
+
+    python tools/check_query_plans.py [path/to/trainer_app.db]
+
+The queries are the modules' own *_SQL constants, so the check follows the
+routes when their SQL changes. A new hot query should be a constant too,
+added here.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pagination import page_sql  # noqa: E402
+from dashboard import SUMMARY_SQL  # noqa: E402
+from search import CLIENT_IDS_SQL, SEARCH_SQL  # noqa: E402
+from calendar_feed import SESSIONS_IN_RANGE_SQL, CALENDAR_VERSION_SQL  # noqa: E402
+from recurrence import SERIES_IN_RANGE_SQL, UPCOMING_SERIES_SQL, TAKEN_DATES_SQL  # noqa: E402
+from activity import EVENTS_IN_RANGE_SQL, EVENTS_AFTER_SQL, ROLLUPS_IN_RANGE_SQL, OWNER_SQL  # noqa: E402
+from template_versions import (VERSION_EXERCISES_SQL, TRAINER_TEMPLATES_SQL, HEAD_VERSION_SQL,  # noqa: E402
+                               TRAINER_VERSION_SQL)
+from exercise_index import USAGE_SQL  # noqa: E402
+from client_metrics import REFRESH_LATEST_WEIGHT_SQL  # noqa: E402
+from workout_sets import LOAD_SETS_SQL  # noqa: E402
+from workouts import (WORKOUT_EXISTS_SQL, CLIENTS_WITH_WORKOUT_SQL, WORKOUT_ROWS_SQL,  # noqa: E402
+                      UPDATE_SET_SQL, DELETE_WORKOUT_SQL, COPY_LOGS_SQL, COPY_SETS_SQL)
+from records import LOGGED_NAMES_SQL, BEST_LIFT_SQL, BEST_E1RM_SQL, REP_RECORDS_SQL, BEST_PACE_SQL  # noqa: E402
+from exports import EXPORT_WORKOUTS_SQL, ROSTER_SQL  # noqa: E402
+
+# Stands in for an IN list of ids.
+IDS = '?, ?, ?'
+
+# (where it runs, SQL). Parameters are bound as NULL — only the plan matters.
+HOT_QUERIES = [
+    ('dashboard: summary', SUMMARY_SQL),
+    ('search box', SEARCH_SQL),
+    ('exercise index: load trainer', USAGE_SQL.format(names='')),
+    ('refresh_exercise_usage', USAGE_SQL.format(names=f' AND LOWER(exercise_name) IN ({IDS})')),
+    ('refresh_latest_weight', REFRESH_LATEST_WEIGHT_SQL),
+    ('workout sets: load_sets', LOAD_SETS_SQL.format(ids=IDS)),
+    ('workouts: workout_exists', WORKOUT_EXISTS_SQL),
+    ('workouts: clients_with_workout', CLIENTS_WITH_WORKOUT_SQL.format(ids=IDS)),
+    ('workouts: edit_workout rows', WORKOUT_ROWS_SQL),
+    ('workouts: edit_workout sets', UPDATE_SET_SQL),
+    ('workouts: remove_workout', DELETE_WORKOUT_SQL),
+    ('workouts: copy_workout logs', COPY_LOGS_SQL),
+    ('workouts: copy_workout sets', COPY_SETS_SQL),
+    ('records: logged names', LOGGED_NAMES_SQL),
+    ('records: best lift', BEST_LIFT_SQL),
+    ('records: best e1rm', BEST_E1RM_SQL),
+    ('records: rep maxes', REP_RECORDS_SQL),
+    ('records: best pace', BEST_PACE_SQL),
+    ('calendar: sessions in range', SESSIONS_IN_RANGE_SQL),
+    ('calendar feed: validators', CALENDAR_VERSION_SQL),
+    ('recurrence: series in range', SERIES_IN_RANGE_SQL),
+    ('recurrence: client series', UPCOMING_SERIES_SQL.format(owner='client_id')),
+    ('recurrence: trainer series', UPCOMING_SERIES_SQL.format(owner='trainer_id')),
+    ('recurrence: taken dates', TAKEN_DATES_SQL.format(ids=IDS, bound='AND occurrence_date <= ?')),
+    ('activity_stream: events', EVENTS_IN_RANGE_SQL),
+    ('activity_stream: rollups', ROLLUPS_IN_RANGE_SQL),
+    ('activity live stream: new events', EVENTS_AFTER_SQL),
+    ('log_activity: client owner', OWNER_SQL),
+    ('template_versions: version exercises', VERSION_EXERCISES_SQL),
+    ('template_versions: head', HEAD_VERSION_SQL),
+    ('template_versions: trainer version', TRAINER_VERSION_SQL),
+    ('template catalogue', TRAINER_TEMPLATES_SQL),
+    ('export: workouts', EXPORT_WORKOUTS_SQL),
+    ('export_all_clients', ROSTER_SQL),
+]
+
+
+def route_queries():
+    """(where it runs, SQL) for the queries app.py and clients.py run
+    inline. Imports app.py, so only call once db.DB_PATH is set."""
+    import app
+    import clients
+
+    client_orders = [app.CLIENTS_DEFAULT_ORDER, *app.CLIENT_SORT_ORDERS.values()]
+    return [
+        *((f'clients: listing page ({order[0][2]} {order[0][1]})', page_sql(app.CLIENTS_SQL, order, True))
+          for order in client_orders),
+        ('clients: search', page_sql(f'{app.CLIENTS_SQL} AND c.id IN ({CLIENT_IDS_SQL})',
+                                     app.CLIENTS_DEFAULT_ORDER)),
+        ('client_detail: upcoming sessions', app.UPCOMING_SESSIONS_SQL),
+        ('client_detail: recent workouts', app.RECENT_WORKOUTS_SQL),
+        ('client_detail: weight history', app.WEIGHT_HISTORY_SQL),
+        ('client_detail: latest weight', app.LATEST_WEIGHT_SQL),
+        ('client_detail: notes', app.RECENT_NOTES_SQL),
+        ('client_detail: portal account', app.PORTAL_ACCOUNT_SQL),
+        ('client_workouts: history', app.WORKOUT_HISTORY_SQL),
+        ('calendar: client dropdown', app.CLIENT_DROPDOWN_SQL),
+        ('session_history page', page_sql(app.SESSION_HISTORY_SQL, app.SESSION_HISTORY_ORDER, True)),
+        ('workout_detail', app.WORKOUT_DETAIL_SQL.format(type=' AND workout_type = ?')),
+        ('workout_detail: all types', app.WORKOUT_DETAIL_SQL.format(type='')),
+        ('exercise_history', app.EXERCISE_HISTORY_SQL.format(exclude=' AND workout_date != ?')),
+        ('exercise_records: all', app.ALL_RECORDS_SQL),
+        ('exercise_records: one exercise', app.RECORD_SQL),
+        ('exercise_records: rep maxes', app.REP_MAXES_SQL),
+        ('client_weight_logs page', page_sql(app.WEIGHT_LOGS_SQL, app.LOG_PAGE_ORDER, True)),
+        ('client_weight_logs: chart series', app.WEIGHT_SERIES_SQL),
+        ('client_progress_photos page', page_sql(app.PHOTOS_SQL, app.LOG_PAGE_ORDER, True)),
+        ('client_measurements page', page_sql(app.MEASUREMENTS_SQL, app.LOG_PAGE_ORDER, True)),
+        ('client_nutrition_logs page', page_sql(app.NUTRITION_LOGS_SQL, app.LOG_PAGE_ORDER, True)),
+        ('client_nutrition_logs: chart series', app.NUTRITION_SERIES_SQL),
+        ('client_sleep_logs page', page_sql(app.SLEEP_LOGS_SQL, app.LOG_PAGE_ORDER, True)),
+        ('client_sleep_logs: chart series', app.SLEEP_SERIES_SQL),
+        ('workout_templates: universal', app.UNIVERSAL_TEMPLATES_SQL),
+        ('workout_templates: client cards', app.TEMPLATE_CLIENTS_SQL),
+        ('workout_templates: one client', app.CLIENT_TEMPLATES_SQL),
+        ('portal: latest weight', clients.PORTAL_LATEST_WEIGHT_SQL),
+        ('portal: recent workouts', clients.PORTAL_RECENT_WORKOUTS_SQL),
+        ('portal: upcoming sessions', clients.PORTAL_UPCOMING_SQL),
+        ('portal: latest sleep', clients.PORTAL_LATEST_SLEEP_SQL),
+        ('portal: workouts page', page_sql(clients.PORTAL_WORKOUTS_SQL, clients.PORTAL_WORKOUTS_ORDER, True,
+                                           clients.PORTAL_WORKOUTS_GROUP_BY)),
+        ('portal: workout detail', clients.PORTAL_WORKOUT_SQL.format(type=' AND workout_type = ?')),
+        ('portal: exercise history', clients.PORTAL_EXERCISE_HISTORY_SQL.format(exclude=' AND workout_date != ?')),
+        ('portal: permissions', clients.PERM_WORKOUTS_SQL),
+    ]
+
+
+TRIGGER_BODY_RE = re.compile(r'\bBEGIN\b(.*)\bEND\s*$', re.S | re.I)
+ROW_REF_RE = re.compile(r'\b(?:OLD|NEW)\.\w+')
+
+
+def trigger_queries(conn):
+    """(trigger, statement) for each statement of every trigger in the
+    schema, with its OLD./NEW. references as parameters."""
+    queries = []
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"):
+        body = TRIGGER_BODY_RE.search(sql).group(1)
+        for statement in body.split(';'):
+            if statement.strip():
+                queries.append((f'trigger {name}', ROW_REF_RE.sub('?', statement)))
+    return queries
+
+
+# Whole-table scans that are expected: tiny seeded lookup tables.
+ALLOWED_SCANS = {
+    # The exercise index reads the ~10-row seeded catalogue once at startup.
+    'exercises',
+    # The recursive CTE in template_versions.py: a version chain (at most
+    # TEMPLATE_SNAPSHOT_DEPTH rows per template), not a table.
+    'chain',
+}
+
+SCAN_RE = re.compile(r'^SCAN (\w+)')
+# An FTS5 table "scanned" through its full-text index or by rowid: the
+# idxStr after the colon has an M for each MATCH constraint and an = for
+# rowid equality (the search triggers' updates and deletes).
+FTS_MATCH_RE = re.compile(r'VIRTUAL TABLE INDEX \d+:\S*[M=]')
+
+
+def full_scans(conn, sql):
+    """Return the plan lines of `sql` that scan a whole table."""
+    params = [None] * sql.count('?')
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    bad = []
+    for row in rows:
+        detail = row[3]
+        m = SCAN_RE.match(detail)
+        if m and m.group(1) != 'CONSTANT' and m.group(1) not in ALLOWED_SCANS \
+                and not FTS_MATCH_RE.search(detail):
+            bad.append(detail)
+    return bad
+
+
+def main(src):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'trainer_app.db')
+        shutil.copy(src, path)
+
+        import db
+        db.DB_PATH = path
+        queries = HOT_QUERIES + route_queries()  # runs the startup migrations against the copy
+
+        conn = sqlite3.connect(path)
+        queries += trigger_queries(conn)
+        failures = []
+        for name, sql in queries:
+            for detail in full_scans(conn, sql):
+                failures.append(f'{name}: {detail}')
+        conn.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if failures:
+        print('Full table scans found:')
+        for line in failures:
+            print(f'  {line}')
+        return 1
+    print(f'OK — {len(queries)} queries, no full table scans.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'trainer_app.db')))
@@ -0,0 +1,47 @@
+"""Roll old activity_log events up into activity_daily and apply retention.
+
+The app doesn't do this itself. Run it daily from cron (for example a
+PythonAnywhere scheduled task) to keep activity_log bounded:
+
+    python tools/compact_activity_log.py [--keep-days N] [--keep-rollup-days N|none]
+
+Defaults are activity.py's ACTIVITY_RETENTION_DAYS and
+ACTIVITY_ROLLUP_RETENTION_DAYS.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import activity  # noqa: E402
+from db import get_db  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keep-days', type=int, default=activity.ACTIVITY_RETENTION_DAYS,
+                        help='days of individual events to keep')
+    parser.add_argument('--keep-rollup-days', default=activity.ACTIVITY_ROLLUP_RETENTION_DAYS,
+                        help="days of daily rollups to keep, or 'none' to keep them all")
+    args = parser.parse_args()
+
+    activity.ACTIVITY_RETENTION_DAYS = args.keep_days
+    activity.ACTIVITY_ROLLUP_RETENTION_DAYS = (
+        None if str(args.keep_rollup_days).lower() == 'none' else int(args.keep_rollup_days))
+
+    os.chdir(ROOT)  # DB_PATH is relative to the app directory
+    run_migrations()
+    conn = get_db()
+    try:
+        compacted, dropped = activity.compact_activity_log(conn)
+    finally:
+        conn.close()
+    print(f'Compacted {compacted} events, dropped {dropped} rollups.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Delete expired export jobs and their zips, and fail stale ones.
+
+The app also does this whenever an export is queued, polled or
+downloaded. Run it daily from cron (for example a PythonAnywhere
+scheduled task) so zips don't outlive EXPORT_TTL when nobody exports
+again:
+
+    python tools/purge_export_jobs.py [--export-dir DIR]
+
+--export-dir defaults to export_jobs.py's EXPORT_DIR; pass the app's
+EXPORT_DIR if it's configured differently.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import export_jobs  # noqa: E402
+from db import get_db  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--export-dir', default=export_jobs.EXPORT_DIR,
+                        help='directory the export zips are written to')
+    args = parser.parse_args()
+
+    export_jobs.EXPORT_DIR = args.export_dir
+
+    os.chdir(ROOT)  # DB_PATH and EXPORT_DIR are relative to the app directory
+    run_migrations()
+    conn = get_db()
+    try:
+        before = conn.execute('SELECT COUNT(*) FROM export_jobs').fetchone()[0]
+        export_jobs.purge_expired_jobs(conn)
+        conn.commit()
+        after = conn.execute('SELECT COUNT(*) FROM export_jobs').fetchone()[0]
+    finally:
+        conn.close()
+    print(f'Purged {before - after} expired export jobs.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Per-set storage for workout_logs.
+
+Each set used to live in a JSON string on workout_logs.sets_data, which
+every reader had to json.loads row by row and no query could filter or
+aggregate on. Sets are now rows of workout_sets with one typed column per
+field, keyed by (workout_log_id, set_number). Deleting a workout_logs row
+deletes its sets via the workout_logs_delete_sets trigger.
+
+The pages and the client portal still consume the old shape — a list of
+{weight, reps, rpe} dicts for weightlifting, or the cardio fields for
+cardio — so load_sets() rebuilds exactly that from the rows.
+"""
+
+WEIGHTLIFTING_FIELDS = ('weight', 'reps', 'rpe')
+CARDIO_FIELDS = ('distance', 'distance_unit', 'duration', 'duration_unit',
+                 'speed', 'speed_unit', 'incline', 'notes')
+SET_COLUMNS = WEIGHTLIFTING_FIELDS + CARDIO_FIELDS
+
+# Stay well under SQLite's bound-parameter limit when loading by id.
+_LOAD_CHUNK = 500
+
+# {ids}: one ? per workout_logs id.
+LOAD_SETS_SQL = f'''
+    SELECT workout_log_id, {', '.join(SET_COLUMNS)}
+    FROM workout_sets
+    WHERE workout_log_id IN ({{ids}})
+    ORDER BY workout_log_id, set_number
+'''
+
+
+def save_sets(conn, workout_log_id, sets):
+    """Insert `sets` (list of dicts in the JSON shape) for one workout_logs row.
+
+    Unknown keys are ignored and missing ones stored as NULL, so either a
+    weightlifting or a cardio set dict can be passed straight through.
+    """
+    conn.executemany(f'''
+        INSERT INTO workout_sets (workout_log_id, set_number, {', '.join(SET_COLUMNS)})
+        VALUES (?, ?, {', '.join('?' for _ in SET_COLUMNS)})
+    ''', [
+        (workout_log_id, number, *(s.get(col) for col in SET_COLUMNS))
+        for number, s in enumerate(sets, 1)
+    ])
+
+
+def set_to_dict(row, workout_type):
+    """One workout_sets row as the dict the templates expect."""
+    fields = CARDIO_FIELDS if workout_type == 'cardio' else WEIGHTLIFTING_FIELDS
+    return {field: row[field] for field in fields}
+
+
+def load_sets(conn, logs):
+    """Return {workout_log_id: [set dict, ...]} for the given workout_logs rows.
+
+    `logs` must expose 'id' and 'workout_type'. Logs without any sets are
+    absent from the result, so callers can tell "no set data" from an
+    empty list.
+    """
+    types = {log['id']: log['workout_type'] for log in logs}
+    ids = list(types)
+    result = {}
+    for start in range(0, len(ids), _LOAD_CHUNK):
+        chunk = ids[start:start + _LOAD_CHUNK]
+        rows = conn.execute(LOAD_SETS_SQL.format(ids=', '.join('?' for _ in chunk)), chunk).fetchall()
+        for row in rows:
+            log_id = row['workout_log_id']
+            result.setdefault(log_id, []).append(set_to_dict(row, types[log_id]))
+    return result
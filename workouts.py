@@ -0,0 +1,416 @@
+"""Writing workouts: one path for every route that logs, edits or copies one.
+
+A workout is the workout_logs rows (one per exercise) sharing a client,
+date and workout_type, plus each row's workout_sets. The trainer's forms,
+the trainer's edit form and the client portal's JSON all arrive in
+different shapes. exercises_from_form() and exercises_from_json() turn
+either into the same list:
+
+    [{'id': None, 'name': 'Squat', 'notes': '', 'sets': [{'weight': 225.0, 'reps': 5, 'rpe': 8.0}, ...]}, ...]
+
+with blank exercises dropped, numbers converted, and a single empty set
+for an exercise submitted without any. Bad numbers raise ValueError.
+'id' is the workout_logs row an edit form loaded the exercise from.
+
+insert_workout() writes such a list with two executemany() calls, one
+for the workout_logs rows and one for all their sets. Each row's
+derived sets/reps/weight columns and its exercise_key
+(records.exercise_key()) are computed in the same pass that builds it.
+insert_workouts() does the same for one workout assigned to many
+clients at once, and copy_workout() is built on the same statements.
+Rows record the template version a workout was made from, if any
+(template_versions.py); edits and copies keep it.
+edit_workout() diffs an edited workout against its stored rows by id and
+applies only the inserts, updates and deletes needed. An edit that
+changes one set rewrites one workout_sets row, not the whole day, and
+rows keep their ids.
+
+All of them run in the caller's transaction, and they refresh personal
+records and the exercise index for the names they touched, so a route
+only has to commit. A new weightlifting workout raises records from its
+own sets (records.add_lift_records()); edits, deletes and copies
+recompute them from history, and only for exercises whose name, sets or
+date changed.
+
+created_at is stepped by a microsecond per exercise. Pages and
+duplicates order a workout's exercises by it, so the order entered is
+the order kept.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from exercise_index import refresh_exercise_usage
+from records import add_lift_records, exercise_key, logged_exercise_names, refresh_records
+from workout_sets import CARDIO_FIELDS, SET_COLUMNS, WEIGHTLIFTING_FIELDS, load_sets
+
+WORKOUT_TYPES = ('weightlifting', 'cardio')
+
+# Most clients one bulk template assignment may name.
+BULK_ASSIGN_MAX_CLIENTS = 200
+
+INSERT_LOG_SQL = '''
+    INSERT INTO workout_logs (id, client_id, trainer_id, exercise_name, exercise_key, sets, reps, weight, notes,
+                              workout_date, tags, workout_type, created_at, template_version_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_SET_SQL = f'''
+    INSERT INTO workout_sets (workout_log_id, set_number, {', '.join(SET_COLUMNS)})
+    VALUES (?, ?, {', '.join('?' for _ in SET_COLUMNS)})
+'''
+
+UPDATE_LOG_SQL = '''
+    UPDATE workout_logs
+    SET exercise_name = ?, exercise_key = ?, sets = ?, reps = ?, weight = ?, notes = ?, workout_date = ?, tags = ?, created_at = ?
+    WHERE id = ?
+'''
+
+UPDATE_SET_SQL = f'''
+    UPDATE workout_sets SET {', '.join(f'{col} = ?' for col in SET_COLUMNS)}
+    WHERE workout_log_id = ? AND set_number = ?
+'''
+
+WORKOUT_ROWS_SQL = '''
+    SELECT id, exercise_name, notes, tags, workout_type, created_at, template_version_id
+    FROM workout_logs
+    WHERE client_id = ? AND workout_date = ? AND workout_type = ?
+    ORDER BY created_at
+'''
+
+WORKOUT_EXISTS_SQL = '''
+    SELECT 1 FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ? LIMIT 1
+'''
+
+# {ids}: one ? per client.
+CLIENTS_WITH_WORKOUT_SQL = '''
+    SELECT DISTINCT client_id FROM workout_logs
+    WHERE client_id IN ({ids}) AND workout_date = ? AND workout_type = ?
+'''
+
+DELETE_WORKOUT_SQL = 'DELETE FROM workout_logs WHERE client_id = ? AND workout_date = ? AND workout_type = ?'
+
+COPY_LOGS_SQL = '''
+    SELECT id, exercise_name, sets, reps, weight, notes, tags, template_version_id
+    FROM workout_logs
+    WHERE client_id = ? AND workout_date = ? AND workout_type = ?
+    ORDER BY created_at
+'''
+
+COPY_SETS_SQL = f'''
+    INSERT INTO workout_sets (workout_log_id, set_number, {', '.join(SET_COLUMNS)})
+    SELECT ?, set_number, {', '.join(SET_COLUMNS)}
+    FROM workout_sets WHERE workout_log_id = ?
+'''
+
+# Per-set fields by type, and how each is converted. None = kept as text.
+_SET_FIELDS = {
+    'weightlifting': {'weight': float, 'reps': int, 'rpe': float},
+    'cardio': {'distance': float, 'distance_unit': None, 'duration': float, 'duration_unit': None,
+               'speed': float, 'speed_unit': None, 'incline': float, 'notes': None},
+}
+assert tuple(_SET_FIELDS['weightlifting']) == WEIGHTLIFTING_FIELDS
+assert tuple(_SET_FIELDS['cardio']) == CARDIO_FIELDS
+
+# The trainer form's per-set inputs: exercise_<i>_<name>[].
+_FORM_INPUTS = {
+    'weightlifting': {'weight': 'weight', 'reps': 'reps', 'rpe': 'rpe'},
+    'cardio': {'distance': 'distance', 'distance_unit': 'distance_unit', 'duration': 'duration',
+               'duration_unit': 'duration_unit', 'speed': 'speed', 'speed_unit': 'speed_unit',
+               'incline': 'incline', 'notes': 'set_notes'},
+}
+
+
+def workout_type_from(value):
+    """`value` if it's a known workout type, else 'weightlifting'."""
+    return value if value in WORKOUT_TYPES else 'weightlifting'
+
+
+def workout_tags(tags, workout_type):
+    """Normalized tags. Cardio workouts always carry a "Cardio" tag that
+    can't be removed from the form. It's added here whatever was submitted,
+    so the only way to get rid of it is deleting the workout."""
+    if workout_type != 'cardio':
+        return tags
+    tag_list = [t.strip() for t in (tags or '').split(',') if t.strip()]
+    if 'Cardio' not in tag_list:
+        tag_list.append('Cardio')
+    return ','.join(tag_list)
+
+
+def _set(values, workout_type):
+    """One set dict with every field of its type, converted; blanks → None."""
+    result = {}
+    for field, convert in _SET_FIELDS[workout_type].items():
+        value = values.get(field)
+        if value is None or value == '':
+            result[field] = None
+        elif convert is None:
+            result[field] = str(value)
+        elif convert is int:
+            result[field] = int(float(value))
+        else:
+            result[field] = convert(value)
+    return result
+
+
+def _exercise(log_id, name, notes, sets, workout_type):
+    return {
+        'id': log_id or None,
+        'name': name.strip(),
+        'notes': notes or '',
+        'sets': sets or [_set({}, workout_type)],
+    }
+
+
+def exercises_from_form(form, workout_type):
+    """Exercises from the trainer's workout form (exercise_name[],
+    exercise_notes[], exercise_<i>_<field>[], and on the edit form
+    exercise_id[])."""
+    inputs = _FORM_INPUTS[workout_type]
+    notes_list = form.getlist('exercise_notes[]')
+    ids = form.getlist('exercise_id[]')
+    exercises = []
+    for i, name in enumerate(form.getlist('exercise_name[]')):
+        if not name.strip():
+            continue
+        columns = {field: form.getlist(f'exercise_{i}_{key}[]') for field, key in inputs.items()}
+        if workout_type == 'cardio':
+            # A cardio row counts if it has a distance or a duration.
+            count = max(len(columns['distance']), len(columns['duration']), 1)
+        else:
+            count = len(columns['weight'])
+        sets = [_set({field: values[j] if j < len(values) else None for field, values in columns.items()},
+                     workout_type)
+                for j in range(count)]
+        exercises.append(_exercise(ids[i] if i < len(ids) else None, name,
+                                   notes_list[i] if i < len(notes_list) else '', sets, workout_type))
+    return exercises
+
+
+def exercises_from_json(items, workout_type):
+    """Exercises from the portal's JSON: [{'id', 'name', 'notes', 'sets': [...]}],
+    'id' only when editing."""
+    exercises = []
+    for item in items or []:
+        name = item.get('name') or ''
+        if not name.strip():
+            continue
+        sets = [_set(s, workout_type) for s in item.get('sets') or []]
+        exercises.append(_exercise(item.get('id'), name, item.get('notes'), sets, workout_type))
+    return exercises
+
+
+def _summary(sets):
+    """(sets, reps, weight) for workout_logs: the set count and the mean of
+    the non-empty reps (rounded down) and weights, in one pass."""
+    reps_total = reps_count = weight_total = weight_count = 0
+    for s in sets:
+        if s.get('reps'):
+            reps_total += s['reps']
+            reps_count += 1
+        if s.get('weight'):
+            weight_total += s['weight']
+            weight_count += 1
+    return (len(sets),
+            reps_total // reps_count if reps_count else None,
+            weight_total / weight_count if weight_count else None)
+
+
+def workout_exists(conn, client_id, workout_date, workout_type):
+    return conn.execute(WORKOUT_EXISTS_SQL, (client_id, workout_date, workout_type)).fetchone() is not None
+
+
+def clients_with_workout(conn, client_ids, workout_date, workout_type):
+    """The subset of `client_ids` that already have a `workout_type`
+    workout on `workout_date`."""
+    sql = CLIENTS_WITH_WORKOUT_SQL.format(ids=', '.join('?' for _ in client_ids))
+    return {row['client_id'] for row in conn.execute(sql, (*client_ids, workout_date, workout_type))}
+
+
+def _refresh(conn, client_id, workout_type, names):
+    refresh_records(conn, client_id, workout_type, names)
+    refresh_exercise_usage(conn, client_id, names)
+
+
+def _derived(sets, workout_type):
+    # workout_logs' sets/reps/weight columns for these sets.
+    return _summary(sets) if workout_type != 'cardio' else (len(sets), None, None)
+
+
+def _log_row(log_id, client_id, trainer_id, exercise, workout_date, workout_type, tags, created_at,
+             template_version_id):
+    return (log_id, client_id, trainer_id, exercise['name'], exercise_key(exercise['name']),
+            *_derived(exercise['sets'], workout_type), exercise['notes'], workout_date, tags, workout_type,
+            created_at, template_version_id)
+
+
+def _set_rows(log_id, sets):
+    return [(log_id, number, *(s.get(col) for col in SET_COLUMNS)) for number, s in enumerate(sets, 1)]
+
+
+def _write(conn, client_ids, trainer_id, workout_date, workout_type, tags, exercises, template_version_id):
+    now = datetime.now()
+    log_rows, set_rows = [], []
+    for client_id in client_ids:
+        for position, exercise in enumerate(exercises):
+            log_id = str(uuid.uuid4())
+            log_rows.append(_log_row(log_id, client_id, trainer_id, exercise, workout_date, workout_type, tags,
+                                     now + timedelta(microseconds=position), template_version_id))
+            set_rows.extend(_set_rows(log_id, exercise['sets']))
+    conn.executemany(INSERT_LOG_SQL, log_rows)
+    conn.executemany(INSERT_SET_SQL, set_rows)
+
+
+def insert_workout(conn, client_id, trainer_id, workout_date, workout_type, tags, exercises,
+                   template_version_id=None):
+    """Add `exercises` (from exercises_from_form/json) as a workout.
+    `template_version_id` records the template version it came from."""
+    insert_workouts(conn, [client_id], trainer_id, workout_date, workout_type, tags, exercises,
+                    template_version_id)
+
+
+def insert_workouts(conn, client_ids, trainer_id, workout_date, workout_type, tags, exercises,
+                    template_version_id=None):
+    """Add the same workout for each of `client_ids`, all clients of
+    `trainer_id`, in one batch of inserts."""
+    if not client_ids:
+        return
+    tags = workout_tags(tags, workout_type)
+    _write(conn, client_ids, trainer_id, workout_date, workout_type, tags, exercises, template_version_id)
+    names = {e['name'] for e in exercises}
+    for client_id in client_ids:
+        if workout_type == 'cardio':
+            refresh_records(conn, client_id, workout_type, names)
+        else:
+            add_lift_records(conn, client_id, workout_date, exercises)
+    # Usage is counted per trainer, so one refresh covers every client.
+    refresh_exercise_usage(conn, client_ids[0], names)
+
+
+def edit_workout(conn, client_id, trainer_id, workout_date, new_date, workout_type, tags, exercises):
+    """Make the client's `workout_type` workout on `workout_date` match
+    `exercises`, dated `new_date`, with as few row changes as possible.
+
+    Submitted exercises carrying the `id` of one of the workout's rows
+    update that row in place, and only if something differs; its sets are
+    compared set by set. Exercises without a known id are inserted, and
+    rows no exercise claims are deleted. Rows keep their created_at (and
+    so their place) unless the order changed ahead of them. Workouts of the
+    other type that day are left alone.
+
+    Returns one dict per row touched, in the submitted order with deletes
+    last: {'id', 'exercise_name', 'change': 'inserted' | 'updated' |
+    'deleted'}, plus 'fields' on updates naming what changed
+    (exercise_name, notes, tags, workout_date, created_at, sets).
+    """
+    tags = workout_tags(tags, workout_type)
+    existing = conn.execute(WORKOUT_ROWS_SQL, (client_id, workout_date, workout_type)).fetchall()
+    old_sets = load_sets(conn, existing)
+    unclaimed = {row['id']: row for row in existing}
+    # Exercises added in an edit are still part of the template's workout.
+    template_version_id = next((row['template_version_id'] for row in existing if row['template_version_id']),
+                               None)
+
+    now = datetime.now()
+    changes, record_names, usage_names = [], set(), set()
+    log_deletes, log_updates, log_inserts = [], [], []
+    set_deletes, set_updates, set_inserts = [], [], []
+    restamp, last = False, ''
+    for position, exercise in enumerate(exercises):
+        name, sets = exercise['name'], exercise['sets']
+        row = unclaimed.pop(exercise.get('id'), None)
+        # Once one row can't keep its place, it and everything after it
+        # get fresh created_at values, which sort after all the old ones.
+        if row is None or row['created_at'] is None or str(row['created_at']) <= last:
+            restamp = True
+        created_at = now + timedelta(microseconds=position) if restamp else row['created_at']
+        last = str(created_at)
+
+        if row is None:
+            log_id = str(uuid.uuid4())
+            log_inserts.append(_log_row(log_id, client_id, trainer_id, exercise, new_date, workout_type, tags,
+                                        created_at, template_version_id))
+            set_inserts.extend(_set_rows(log_id, sets))
+            changes.append({'id': log_id, 'exercise_name': name, 'change': 'inserted'})
+            record_names.add(name)
+            usage_names.add(name)
+            continue
+
+        fields = [field for field, old, new in (
+            ('exercise_name', row['exercise_name'], name),
+            ('notes', row['notes'] or '', exercise['notes']),
+            ('tags', row['tags'] or '', tags or ''),
+            ('workout_date', workout_date, new_date),
+        ) if old != new]
+        if restamp:
+            fields.append('created_at')
+        before = old_sets.get(row['id'], [])
+        for number in range(1, max(len(before), len(sets)) + 1):
+            old = before[number - 1] if number <= len(before) else None
+            new = sets[number - 1] if number <= len(sets) else None
+            if new is None:
+                set_deletes.append((row['id'], number))
+            elif old is None:
+                set_inserts.append((row['id'], number, *(new.get(col) for col in SET_COLUMNS)))
+            elif old != new:
+                set_updates.append((*(new.get(col) for col in SET_COLUMNS), row['id'], number))
+            else:
+                continue
+            if 'sets' not in fields:
+                fields.append('sets')
+        if not fields:
+            continue
+
+        log_updates.append((name, exercise_key(name), *_derived(sets, workout_type), exercise['notes'], new_date,
+                            tags, created_at, row['id']))
+        changes.append({'id': row['id'], 'exercise_name': name, 'change': 'updated', 'fields': fields})
+        if {'exercise_name', 'sets', 'workout_date'} & set(fields):
+            record_names.update((row['exercise_name'], name))
+        if 'exercise_name' in fields:
+            usage_names.update((row['exercise_name'], name))
+
+    for row in unclaimed.values():
+        log_deletes.append((row['id'],))
+        changes.append({'id': row['id'], 'exercise_name': row['exercise_name'], 'change': 'deleted'})
+        record_names.add(row['exercise_name'])
+        usage_names.add(row['exercise_name'])
+
+    conn.executemany('DELETE FROM workout_logs WHERE id = ?', log_deletes)
+    conn.executemany(UPDATE_LOG_SQL, log_updates)
+    conn.executemany(INSERT_LOG_SQL, log_inserts)
+    conn.executemany('DELETE FROM workout_sets WHERE workout_log_id = ? AND set_number = ?', set_deletes)
+    conn.executemany(UPDATE_SET_SQL, set_updates)
+    conn.executemany(INSERT_SET_SQL, set_inserts)
+    if record_names:
+        refresh_records(conn, client_id, workout_type, record_names)
+    if usage_names:
+        refresh_exercise_usage(conn, client_id, usage_names)
+    return changes
+
+
+def remove_workout(conn, client_id, workout_date, workout_type):
+    """Delete the client's `workout_type` workout on `workout_date`."""
+    affected = logged_exercise_names(conn, client_id, workout_date, workout_type)
+    conn.execute(DELETE_WORKOUT_SQL, (client_id, workout_date, workout_type))
+    _refresh(conn, client_id, workout_type, affected)
+
+
+def copy_workout(conn, client_id, trainer_id, original_date, new_date, workout_type):
+    """Copy the client's `workout_type` workout on `original_date` to
+    `new_date`, sets included. The summary sets/reps/weight columns carry
+    over unchanged. Returns the number of exercises copied (0 if there was
+    no such workout)."""
+    source = conn.execute(COPY_LOGS_SQL, (client_id, original_date, workout_type)).fetchall()
+    if not source:
+        return 0
+    now = datetime.now()
+    new_ids = [str(uuid.uuid4()) for _ in source]
+    conn.executemany(INSERT_LOG_SQL, [
+        (log_id, client_id, trainer_id, row['exercise_name'], exercise_key(row['exercise_name']), row['sets'],
+         row['reps'], row['weight'], row['notes'], new_date, row['tags'], workout_type,
+         now + timedelta(microseconds=position), row['template_version_id'])
+        for position, (log_id, row) in enumerate(zip(new_ids, source))
+    ])
+    conn.executemany(COPY_SETS_SQL, [(log_id, row['id']) for log_id, row in zip(new_ids, source)])
+    _refresh(conn, client_id, workout_type, {row['exercise_name'] for row in source})
+    return len(source)